@@ -0,0 +1,18 @@
+import timeit
+from typing import Callable
+
+"""
+Measures the time in seconds of a single call to `f`, taking the best of
+`repeat` rounds to discard scheduling noise.
+The number of calls per round is calibrated so each round lasts at least
+`min_time` seconds.
+"""
+def measure(f: Callable[[], object], repeat: int=5, min_time: float=0.2) -> float:
+    timer = timeit.Timer(f)
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time:
+            break
+        number *= 2 if t <= 0 else max(2, int(min_time / t) + 1)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
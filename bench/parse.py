@@ -0,0 +1,65 @@
+import random
+from typing import Union
+from eof.v1 import ContainerV1, Section, SectionKindV1, MAX_CODE_SIZE
+from bench import measure
+
+"""
+Copy of the previous `ContainerV1.parse`, which re-sliced the remaining
+input after every header and section, kept as the comparison baseline.
+"""
+def legacy_parse(input: Union[bytearray, str]) -> ContainerV1:
+    if not input:
+        raise Exception("invalid format")
+    c = ContainerV1()
+    if input[0:3] != bytearray.fromhex("ef0001"):
+        raise Exception("invalid format")
+    input = input[3:]
+    while input and input[0] != 0:
+        if len(input) < 3:
+            raise Exception("invalid format")
+        s = Section(input.pop(0))
+        s.size = int.from_bytes(input[:2], 'big')
+        input = input[2:]
+        c.add_section(s)
+    if not input or len(c.sections) == 0:
+        raise Exception("invalid format")
+    input.pop(0)
+    for s in c.sections:
+        if len(input) < s.size:
+            raise Exception("invalid format")
+        s.data = input[:s.size]
+        input = input[s.size:]
+    if len(input) > 0:
+        raise Exception("invalid format")
+    return c
+
+"""
+Builds a container of exactly `MAX_CODE_SIZE` bytes split in
+`section_count` sections.
+"""
+def max_size_container(section_count: int) -> bytearray:
+    r = random.Random(section_count)
+    c = ContainerV1()
+    overhead = 4 + 3 * section_count
+    body_size = (MAX_CODE_SIZE - overhead) // section_count
+    for i in range(section_count):
+        s = Section(SectionKindV1.CODE if i == 0 else SectionKindV1.DATA)
+        size = body_size
+        if i == section_count - 1:
+            size = MAX_CODE_SIZE - overhead - body_size * (section_count - 1)
+        s.data = r.randbytes(size)
+        c.add_section(s)
+    return c.build()
+
+def main():
+    print('{:>10} {:>14} {:>14} {:>9}'.format('sections', 'legacy (us)', 'parse (us)', 'speedup'))
+    for section_count in [2, 16, 256, 1024]:
+        code = max_size_container(section_count)
+        assert len(code) == MAX_CODE_SIZE
+        assert legacy_parse(bytearray(code)).build() == ContainerV1.parse(code).build()
+        legacy = measure(lambda: legacy_parse(bytearray(code)))
+        current = measure(lambda: ContainerV1.parse(code))
+        print('{:>10} {:>14.2f} {:>14.2f} {:>8.1f}x'.format(section_count, legacy * 1e6, current * 1e6, legacy / current))
+
+if __name__ == '__main__':
+    main()
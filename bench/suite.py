@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from bench import measure
+
+"""
+Benchmark suite of the container generation and compilation paths.
+
+`run` measures every benchmark and appends the results to a JSON history,
+and `compare` flags the benchmarks of the last run that are slower than in a
+previous one by more than a threshold:
+```
+python -m bench.suite run
+python -m bench.suite compare --threshold 0.1
+```
+"""
+
+DEFAULT_HISTORY = 'bench-history.json'
+DEFAULT_THRESHOLD = 0.1
+
+"""
+Code sizes of the generated containers, the largest one filling the
+container up to `MAX_CODE_SIZE` along with a data section of the same size.
+"""
+def container_sizes() -> List[Tuple[int, int]]:
+    from eof.v1 import MAX_CODE_SIZE
+    fit = (MAX_CODE_SIZE - 10) // 2
+    return [(1, 0), (256, 32), (4096, 1024), (fit, fit)]
+
+def sized_container(code_size: int, data_size: int):
+    from eof.v1 import generate_container
+    return generate_container(seed=1, code_size=code_size, data_size=data_size)
+
+def bench_generate(code_size: int, data_size: int) -> Callable[[], object]:
+    from eof.v1 import generate_container
+    return lambda: generate_container(seed=1, code_size=code_size, data_size=data_size)
+
+def bench_generate_opcodes(code_size: int, data_size: int) -> Callable[[], object]:
+    from eof.v1 import generate_container
+    return lambda: generate_container(seed=1, code_size=code_size, data_size=data_size, code_mode='opcodes')
+
+def bench_build(code_size: int, data_size: int) -> Callable[[], object]:
+    c = sized_container(code_size, data_size)
+    # Serialization itself, bypassing the cache of `build`
+    return c._build
+
+def bench_build_cached(code_size: int, data_size: int) -> Callable[[], object]:
+    return sized_container(code_size, data_size).build
+
+def bench_parse(code_size: int, data_size: int) -> Callable[[], object]:
+    from eof.v1 import ContainerV1
+    code = bytes(sized_container(code_size, data_size).build())
+    return lambda: ContainerV1.parse(code)
+
+def bench_validate(code_size: int, data_size: int) -> Callable[[], object]:
+    from eof.v1 import validate
+    code = bytes(sized_container(code_size, data_size).build())
+    return lambda: validate(code)
+
+def bench_legacy_initcode(code_size: int, data_size: int) -> Callable[[], object]:
+    from eof.v1 import generate_legacy_initcode
+    code = sized_container(code_size, data_size).build()
+    return lambda: generate_legacy_initcode(code)
+
+def bench_eof_initcode(code_size: int, data_size: int) -> Callable[[], object]:
+    from eof.v1 import generate_eof_container_initcode
+    code = sized_container(code_size, data_size).build()
+    return lambda: generate_eof_container_initcode(code)
+
+def bench_eof_initcode_batch(count: int) -> Callable[[], object]:
+    from eof.v1.initcode import EOF_INITCODE
+    codes = [sized_container(256, 32).build() for _ in range(count)]
+    buf = bytearray(sum(EOF_INITCODE.size(len(code)) for code in codes))
+    return lambda: EOF_INITCODE.build_batch(codes, buf)
+
+def bench_filler(create_method: str, directory: str) -> Callable[[], object]:
+    from eof.v1 import generate_legacy_initcode
+    from filler import generate_filler
+    c = sized_container(256, 32)
+    def f():
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            generate_filler(c, generate_legacy_initcode, create_method)
+        finally:
+            os.chdir(cwd)
+    return f
+
+"""
+Output of the fake compilers, whatever the input.
+"""
+FAKE_COMPILED_CODE = '6001600101600055'
+
+"""
+Writes fake `solc` and `lllc` executables to `directory`, which consume
+their input and print a fixed code in the format of the real compilers.
+"""
+def install_fake_compilers(directory: str):
+    scripts = {
+        'solc': "#!/bin/sh\ncat > /dev/null\nprintf 'Binary representation:\\n{}\\n'\n".format(FAKE_COMPILED_CODE),
+        'lllc': "#!/bin/sh\ncat > /dev/null\nprintf '{}'\n".format(FAKE_COMPILED_CODE),
+    }
+    for name, script in scripts.items():
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            f.write(script)
+        os.chmod(path, 0o755)
+
+"""
+Enables the compile cache in `cache_dir`, or disables it if None.
+"""
+def use_compile_cache(cache_dir: Optional[str]):
+    import compilers.cache
+    os.environ[compilers.cache.CACHE_DIR_ENV] = cache_dir or ''
+    compilers.cache.reset_cache()
+
+def bench_compile(source: str, cache_dir: Optional[str]) -> Callable[[], object]:
+    import compilers
+    use_compile_cache(cache_dir)
+    return lambda: compilers.compile(source)
+
+def bench_compile_from_dict(sections: int) -> Callable[[], object]:
+    from eof import compile_from_dict
+    use_compile_cache(None)
+    source = {
+        'version': 1,
+        'sections': [{'code': ':yul {{ sstore({}, 1) }}'.format(i)} if i == 0 else {'data': ':yul {{ sstore({}, 1) }}'.format(i)} for i in range(sections)],
+    }
+    return lambda: compile_from_dict(source)
+
+"""
+Returns the benchmarks, keyed by name, as functions returning the callable
+to be measured.
+"""
+def benchmarks(tmp_dir: str) -> Dict[str, Callable[[], Callable[[], object]]]:
+    cases = {}
+    for code_size, data_size in container_sizes():
+        suffix = '{}_{}'.format(code_size, data_size)
+        for name, f in [
+            ('generate_container', bench_generate),
+            ('generate_container_opcodes', bench_generate_opcodes),
+            ('build', bench_build),
+            ('build_cached', bench_build_cached),
+            ('parse', bench_parse),
+            ('validate', bench_validate),
+            ('legacy_initcode', bench_legacy_initcode),
+            ('eof_initcode', bench_eof_initcode),
+        ]:
+            cases['{}/{}'.format(name, suffix)] = (lambda f=f, c=code_size, d=data_size: f(c, d))
+    for create_method in ['tx', 'create', 'create2']:
+        cases['generate_filler/{}'.format(create_method)] = (lambda m=create_method: bench_filler(m, tmp_dir))
+    cache_dir = os.path.join(tmp_dir, 'cache')
+    for name, source in [('yul', ':yul { sstore(0, 1) }'), ('lll', '{ [[0]] (ADD 1 1) }')]:
+        cases['compile/{}'.format(name)] = (lambda s=source: bench_compile(s, None))
+        cases['compile/{}_cached'.format(name)] = (lambda s=source: bench_compile(s, cache_dir))
+    cases['eof_initcode_batch/64'] = (lambda: bench_eof_initcode_batch(64))
+    cases['compile_from_dict/8'] = (lambda: bench_compile_from_dict(8))
+    return cases
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+"""
+Runs the benchmarks whose name contains `filter`, returning the seconds per
+call of each one.
+"""
+def run(filter: Optional[str]=None, repeat: int=5, min_time: float=0.2) -> Dict[str, float]:
+    from compilers.cache import CACHE_DIR_ENV, reset_cache
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        install_fake_compilers(tmp_dir)
+        path = os.environ.get('PATH', '')
+        cache_env = os.environ.get(CACHE_DIR_ENV)
+        os.environ['PATH'] = tmp_dir + os.pathsep + path
+        try:
+            for name, setup in benchmarks(tmp_dir).items():
+                if filter is not None and filter not in name:
+                    continue
+                results[name] = measure(setup(), repeat=repeat, min_time=min_time)
+                print('{:<40} {:>14.2f} us'.format(name, results[name] * 1e6), file=sys.stderr)
+        finally:
+            os.environ['PATH'] = path
+            if cache_env is None:
+                os.environ.pop(CACHE_DIR_ENV, None)
+                reset_cache()
+            else:
+                use_compile_cache(cache_env)
+    return results
+
+def load_history(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def save_history(path: str, history: List[dict]):
+    with open(path, 'w') as f:
+        json.dump(history, f, indent=1)
+        f.write('\n')
+
+"""
+Compares two runs, returning `(name, baseline, current, change)` for every
+benchmark in both, where `change` is the relative increase of the time.
+"""
+def compare_runs(baseline: dict, current: dict) -> List[Tuple[str, float, float, float]]:
+    rows = []
+    for name, t in current['results'].items():
+        if name in baseline['results']:
+            b = baseline['results'][name]
+            rows.append((name, b, t, t / b - 1 if b > 0 else 0.0))
+    return rows
+
+def get_options(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="EOF fuzzer benchmarks")
+    subparsers = parser.add_subparsers(dest="subcommand_name", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmarks and append the results to the history.")
+    run.add_argument("-k", "--filter", help="Only run the benchmarks whose name contains this string.")
+    run.add_argument("--history", help="JSON history file. Default={}".format(DEFAULT_HISTORY), default=DEFAULT_HISTORY)
+    run.add_argument("--repeat", help="Rounds per benchmark, the best one is kept. Default=5", type=int, default=5)
+    run.add_argument("--min-time", help="Minimum seconds per round. Default=0.2", type=float, default=0.2)
+    run.add_argument("--no-save", help="Do not append the results to the history.", action='store_true')
+
+    compare = subparsers.add_parser("compare", help="Compare the last run of the history with a previous one, failing on regressions.")
+    compare.add_argument("--history", help="JSON history file. Default={}".format(DEFAULT_HISTORY), default=DEFAULT_HISTORY)
+    compare.add_argument("--baseline", help="Index in the history of the run to compare with. Default=-2 (the previous run)", type=int, default=-2)
+    compare.add_argument("--threshold", help="Relative slowdown flagged as a regression. Default={}".format(DEFAULT_THRESHOLD), type=float, default=DEFAULT_THRESHOLD)
+
+    return parser.parse_args(args)
+
+def exec_run(opts):
+    results = run(opts.filter, repeat=opts.repeat, min_time=opts.min_time)
+    if opts.no_save:
+        return
+    history = load_history(opts.history)
+    history.append({
+        'timestamp': int(time.time()),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'results': results,
+    })
+    save_history(opts.history, history)
+
+def exec_compare(opts) -> int:
+    history = load_history(opts.history)
+    if len(history) < 2:
+        raise Exception("at least two runs are needed in the history")
+    baseline, current = history[opts.baseline], history[-1]
+    regressions = 0
+    print('{:<40} {:>14} {:>14} {:>9}'.format('benchmark', 'baseline (us)', 'current (us)', 'change'))
+    for name, b, t, change in compare_runs(baseline, current):
+        flag = ''
+        if change > opts.threshold:
+            flag = ' REGRESSION'
+            regressions += 1
+        print('{:<40} {:>14.2f} {:>14.2f} {:>+8.1f}%{}'.format(name, b * 1e6, t * 1e6, change * 100, flag))
+    if regressions:
+        print("{} regressions over {:.0f}% (baseline {}, current {})".format(regressions, opts.threshold * 100, baseline.get('commit'), current.get('commit')), file=sys.stderr)
+    return 1 if regressions else 0
+
+def main():
+    opts = get_options()
+    if opts.subcommand_name == "run":
+        exec_run(opts)
+    elif opts.subcommand_name == "compare":
+        sys.exit(exec_compare(opts))
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,14 @@
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+from compilers.cache import cached_compile
+
+"""
+Maximum number of compiler processes that can run at the same time.
+"""
+MAX_COMPILER_PROCESSES = os.cpu_count() or 1
+
 def compile(s: str) -> bytearray:
     YUL_PREFIX = ":yul"
     RAW_PREFIX = ":raw"
@@ -7,7 +17,7 @@ def compile(s: str) -> bytearray:
     s = s.strip()
     if s.startswith(YUL_PREFIX):
         from compilers.yul import compile_yul
-        return compile_yul(s[len(YUL_PREFIX):].strip())
+        return cached_compile('solc', YUL_PREFIX, s[len(YUL_PREFIX):].strip(), compile_yul)
     elif s.startswith(RAW_PREFIX):
         from compilers.raw import compile_raw
         return compile_raw(s[len(RAW_PREFIX):].strip())
@@ -17,4 +27,34 @@ def compile(s: str) -> bytearray:
         raise Exception("abi not valid as code")
     else:
         from compilers.lll import compile_lll
-        return compile_lll(s)
\ No newline at end of file
+        return cached_compile('lllc', '', s, compile_lll)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+"""
+Returns the pool of threads that drive the compiler processes.
+The pool is created on first use and kept for the lifetime of the process,
+so the worker threads are reused across batches.
+"""
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_COMPILER_PROCESSES, thread_name_prefix='compiler')
+    return _executor
+
+"""
+Compiles every source in `sources`, running up to `MAX_COMPILER_PROCESSES`
+compilers concurrently.
+Identical sources are compiled only once.
+Returns the compiled code of each source, in the same order.
+"""
+def compile_many(sources: Iterable[str]) -> List[bytearray]:
+    sources = [s.strip() for s in sources]
+    unique = list(dict.fromkeys(sources))
+    if not unique:
+        return []
+    if len(unique) == 1:
+        compiled = {unique[0]: compile(unique[0])}
+    else:
+        compiled = dict(zip(unique, get_executor().map(compile, unique)))
+    return [bytearray(compiled[s]) for s in sources]
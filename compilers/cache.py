@@ -0,0 +1,238 @@
+"""
+Content-addressed on-disk cache of compiled code.
+
+Entries are keyed by a hash of the compiler binary, the source prefix and the
+normalized source, so warm runs never launch the compiler.
+The compiler binary is identified by its resolved path, size and modification
+time rather than by its reported version, which would require running it.
+Writes are atomic renames, so several processes can share the same cache, and
+the least recently used entries are evicted when the cache grows over its
+size limit.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+import metrics
+
+"""
+Environment variable that overrides the cache directory.
+Setting it to an empty string disables the cache.
+"""
+CACHE_DIR_ENV = 'EOFFUZZER_CACHE_DIR'
+
+"""
+Environment variable that overrides the maximum size of the cache, in bytes.
+"""
+CACHE_SIZE_ENV = 'EOFFUZZER_CACHE_SIZE'
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+"""
+Fraction of the maximum size that is kept after an eviction, so evictions do
+not happen on every write once the cache is full.
+"""
+EVICTION_TARGET = 0.9
+
+"""
+Normalizes a source so that changes in indentation or empty lines do not
+produce different cache entries.
+"""
+def normalize_source(code: str) -> str:
+    return '\n'.join(l.strip() for l in code.strip().splitlines() if l.strip())
+
+"""
+Identifies a compiler binary found in the PATH by its real path, size and
+modification time, without running it.
+Returns None if the binary is not found.
+"""
+def binary_fingerprint(binary: str) -> Optional[str]:
+    path = shutil.which(binary)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return '{}:{}:{}'.format(path, st.st_size, st.st_mtime_ns)
+
+class CompileCache(object):
+    path: str
+    max_size: int
+    hits: int
+    misses: int
+    writes: int
+    evictions: int
+    """
+    Approximate size of the entries on disk, computed on the first write.
+    """
+    size: Optional[int]=None
+
+    def __init__(self, path: str, max_size: int=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.size = None
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, str] = {}
+
+    """
+    Identifies the compiler binary without running it.
+    """
+    def fingerprint(self, binary: str) -> str:
+        if binary not in self._fingerprints:
+            fingerprint = binary_fingerprint(binary)
+            if fingerprint is None:
+                raise Exception("compiler not found: {}".format(binary))
+            self._fingerprints[binary] = fingerprint
+        return self._fingerprints[binary]
+
+    def key(self, binary: str, prefix: str, code: str) -> str:
+        h = hashlib.sha256()
+        for part in [self.fingerprint(binary), prefix, normalize_source(code)]:
+            h.update(part.encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytearray]:
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = bytearray(f.read())
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            # Refresh the modification time used for the LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytearray):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self.writes += 1
+            if self.size is None:
+                self.size = self.disk_size()
+            else:
+                self.size += len(data)
+            if self.size > self.max_size:
+                self.evict()
+
+    def disk_size(self) -> int:
+        size = 0
+        for entry in self.entries():
+            size += entry[2]
+        return size
+
+    """
+    Lists `(path, mtime, size)` of every entry in the cache.
+    """
+    def entries(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.startswith('.tmp-'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    # Evicted concurrently by another process
+                    continue
+                yield (path, st.st_mtime_ns, st.st_size)
+
+    """
+    Deletes the least recently used entries until the cache is below
+    `EVICTION_TARGET` of its maximum size.
+    """
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda e: e[1])
+        size = sum(e[2] for e in entries)
+        target = self.max_size * EVICTION_TARGET
+        for path, _, entry_size in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self.size = size
+
+    """
+    Returns the code compiled by `compiler` from `code`, looking it up in the
+    cache first.
+    """
+    def compile(self, binary: str, prefix: str, code: str, compiler: Callable[[str], bytearray]) -> bytearray:
+        key = self.key(binary, prefix, code)
+        data = self.get(key)
+        if data is None:
+            metrics.count('compile.cache.miss')
+            data = compiler(code)
+            self.put(key, data)
+        else:
+            metrics.count('compile.cache.hit', nbytes=len(data))
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+_cache: Optional[CompileCache] = None
+
+"""
+Returns the cache used by `compilers.compile`, or None if it is disabled.
+"""
+def get_cache() -> Optional[CompileCache]:
+    global _cache
+    if _cache is None:
+        path = os.environ.get(CACHE_DIR_ENV)
+        if path is None:
+            path = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'eoffuzzer')
+        if not path:
+            return None
+        max_size = int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE))
+        _cache = CompileCache(os.path.join(path, 'compile'), max_size)
+    return _cache
+
+"""
+Drops the cache returned by `get_cache`, so the next call configures it again
+from the environment.
+"""
+def reset_cache():
+    global _cache
+    _cache = None
+
+"""
+Compiles `code` with `compiler`, going through the cache when it is enabled.
+"""
+def cached_compile(binary: str, prefix: str, code: str, compiler: Callable[[str], bytearray]) -> bytearray:
+    cache = get_cache()
+    if cache is None:
+        return compiler(code)
+    return cache.compile(binary, prefix, code, compiler)
@@ -1,11 +1,13 @@
 from subprocess import Popen, PIPE
+from metrics import stage
 """
 Compiles lll code string using `lllc` compiler.
 """
 def compile_lll(code: str) -> bytearray:
     cmd = ['lllc']
-    p = Popen(cmd, stdout=PIPE, stdin=PIPE, stderr=PIPE)
-    binary_repr = p.communicate(input=code.encode())[0].decode('utf-8')
+    with stage('compile.lllc', len(code)):
+        p = Popen(cmd, stdout=PIPE, stdin=PIPE, stderr=PIPE)
+        binary_repr = p.communicate(input=code.encode())[0].decode('utf-8')
     if not binary_repr:
         raise Exception('invalid code')
     return bytearray.fromhex(binary_repr)
\ No newline at end of file
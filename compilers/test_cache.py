@@ -0,0 +1,113 @@
+import os
+import pytest
+import compilers.cache
+from compilers.cache import CACHE_DIR_ENV, CompileCache, cached_compile, get_cache, reset_cache
+
+"""
+Installs a fake compiler binary named `solc` in a directory of the PATH.
+"""
+@pytest.fixture
+def binary(tmp_path, monkeypatch):
+    directory = tmp_path / 'bin'
+    directory.mkdir()
+    path = directory / 'solc'
+    path.write_text('#!/bin/sh\n')
+    path.chmod(0o755)
+    monkeypatch.setenv('PATH', str(directory))
+    return path
+
+"""
+Restores the cache used by `compilers.compile` after the test.
+"""
+@pytest.fixture
+def cache_env(monkeypatch):
+    reset_cache()
+    yield monkeypatch
+    monkeypatch.undo()
+    reset_cache()
+
+class CountingCompiler(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, code: str) -> bytearray:
+        self.calls.append(code)
+        return bytearray(code.encode())
+
+def tmp_files(path: str):
+    return [name for _, _, files in os.walk(path) for name in files if name.startswith('.tmp-')]
+
+def test_cache_hit_and_miss(tmp_path, binary):
+    cache = CompileCache(str(tmp_path / 'cache'))
+    compiler = CountingCompiler()
+    assert cache.compile('solc', ':yul', '{ stop() }', compiler) == b'{ stop() }'
+    # Indentation and empty lines do not change the entry
+    assert cache.compile('solc', ':yul', '\n  { stop() }  \n\n', compiler) == b'{ stop() }'
+    assert cache.compile('solc', ':yul', '{ invalid() }', compiler) == b'{ invalid() }'
+    assert compiler.calls == ['{ stop() }', '{ invalid() }']
+    assert cache.stats() == {"hits": 1, "misses": 2, "writes": 2, "evictions": 0}
+    # Entries are shared with other instances, e.g. of other processes
+    other = CompileCache(cache.path)
+    assert other.compile('solc', ':yul', '{ stop() }', compiler) == b'{ stop() }'
+    assert len(compiler.calls) == 2
+    assert not tmp_files(cache.path)
+
+def test_cache_binary_invalidation(tmp_path, binary):
+    path = str(tmp_path / 'cache')
+    compiler = CountingCompiler()
+    CompileCache(path).compile('solc', ':yul', '{ stop() }', compiler)
+    # Same size, newer modification time
+    st = os.stat(binary)
+    os.utime(binary, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    CompileCache(path).compile('solc', ':yul', '{ stop() }', compiler)
+    # Different size
+    binary.write_text('#!/bin/sh\nexit 0\n')
+    CompileCache(path).compile('solc', ':yul', '{ stop() }', compiler)
+    assert len(compiler.calls) == 3
+    CompileCache(path).compile('solc', ':yul', '{ stop() }', compiler)
+    assert len(compiler.calls) == 3
+
+def test_cache_missing_binary(tmp_path, binary):
+    with pytest.raises(Exception, match="compiler not found"):
+        CompileCache(str(tmp_path / 'cache')).key('lllc', '', '{}')
+
+def test_cache_eviction(tmp_path, binary):
+    cache = CompileCache(str(tmp_path / 'cache'), max_size=1300)
+    keys = [cache.key('solc', '', str(i)) for i in range(5)]
+    for i, key in enumerate(keys[:4]):
+        cache.put(key, bytearray(300))
+        if i < 3:
+            os.utime(cache.entry_path(key), ns=(i * 10**9, i * 10**9))
+    # The first entry becomes the most recently used one
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[4], bytearray(300))
+    # Evicted down to 90% of the maximum size, oldest first
+    assert cache.stats()['evictions'] == 2
+    assert [cache.get(key) is not None for key in keys] == [True, False, False, True, True]
+    assert cache.disk_size() == cache.size == 900
+
+def test_cache_atomic_write(tmp_path, binary):
+    cache = CompileCache(str(tmp_path / 'cache'))
+    key = cache.key('solc', '', '{}')
+    cache.put(key, bytearray(b'\x01'))
+    # A failed write leaves the previous entry, and no temporary file
+    with pytest.raises(TypeError):
+        cache.put(key, object())
+    assert cache.get(key) == b'\x01'
+    assert not tmp_files(cache.path)
+
+def test_get_cache_environment(tmp_path, binary, cache_env):
+    cache_env.setenv(CACHE_DIR_ENV, str(tmp_path / 'env'))
+    cache = get_cache()
+    assert cache.path == str(tmp_path / 'env' / 'compile')
+    compiler = CountingCompiler()
+    cached_compile('solc', ':yul', '{ stop() }', compiler)
+    cached_compile('solc', ':yul', '{ stop() }', compiler)
+    assert len(compiler.calls) == 1
+    # An empty directory disables the cache
+    cache_env.setenv(CACHE_DIR_ENV, '')
+    assert get_cache() is cache
+    reset_cache()
+    assert get_cache() is None
+    cached_compile('solc', ':yul', '{ stop() }', compiler)
+    assert len(compiler.calls) == 2
@@ -0,0 +1,42 @@
+import threading
+import pytest
+import compilers
+from compilers import compile_many
+
+"""
+Replaces the compiler of every source by a stub, which fails on sources
+starting with `fail`, and records the sources it compiles.
+"""
+@pytest.fixture
+def stub_compiler(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+    def compile(s: str) -> bytearray:
+        with lock:
+            calls.append(s)
+        if s.startswith('fail'):
+            raise Exception("compilation failed: {}".format(s))
+        return bytearray(s.encode())
+    monkeypatch.setattr(compilers, 'compile', compile)
+    return calls
+
+def test_compile_many_order(stub_compiler):
+    sources = ['c{}'.format(i % 7) for i in range(50)] + ['  c3  ']
+    compiled = compile_many(sources)
+    assert compiled == [bytearray(s.strip().encode()) for s in sources]
+    # Identical sources are compiled once
+    assert sorted(stub_compiler) == ['c{}'.format(i) for i in range(7)]
+    # Every source gets its own copy
+    compiled[0][0] = 0
+    assert compiled[7] == b'c0'
+
+def test_compile_many_errors(stub_compiler):
+    with pytest.raises(Exception, match="compilation failed: fail1"):
+        compile_many(['c0', 'fail1', 'c2'])
+    with pytest.raises(Exception, match="compilation failed: fail"):
+        compile_many(['fail'])
+
+def test_compile_many_empty(stub_compiler, monkeypatch):
+    monkeypatch.setattr(compilers, 'get_executor', lambda: pytest.fail("executor used"))
+    assert compile_many([]) == []
+    assert stub_compiler == []
@@ -0,0 +1,365 @@
+import mmap
+import struct
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+from eof import Container
+
+"""
+Binary corpus of EOF containers.
+
+Layout of a corpus file, all integers little endian:
+- Header: `EOFC`, format version (u8), compression (u8), 2 reserved bytes.
+- Entries: every container is length prefixed (u32). Without compression
+  entries are written directly; otherwise they are grouped into blocks of
+  about `block_size` bytes, each written as its compressed length (u32)
+  followed by the compressed entries.
+- Index: one record per entry with its block, offset, length, seed,
+  invalidity types and flags, followed by the file offset and compressed
+  length of every block.
+- Footer: index offset (u64), number of entries (u64), number of blocks
+  (u32) and `EOFI`.
+
+The length prefixes allow recovering the containers, without their metadata,
+of a corpus whose index was never written, e.g. after a killed run: see
+`recover`.
+"""
+
+CORPUS_MAGIC = b'EOFC'
+CORPUS_INDEX_MAGIC = b'EOFI'
+CORPUS_VERSION = 1
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZMA = 2
+COMPRESSION_METHODS = {
+    None: COMPRESSION_NONE,
+    'zlib': COMPRESSION_ZLIB,
+    'lzma': COMPRESSION_LZMA,
+}
+
+"""
+Default size of the uncompressed data in a compressed block.
+"""
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+HEADER = struct.Struct('<4sBBxx')
+LENGTH = struct.Struct('<I')
+"""
+Block, offset within the block (the file for uncompressed corpora), length,
+seed, invalidity types and flags of an entry.
+"""
+INDEX_ENTRY = struct.Struct('<IQIQHB')
+INDEX_BLOCK = struct.Struct('<QI')
+FOOTER = struct.Struct('<QQI4s')
+
+FLAG_HAS_SEED = 1
+FLAG_HAS_INVALIDITY = 2
+FLAG_HAS_VALIDITY = 4
+FLAG_VALID = 8
+
+def _compress(compression: int, data: bytes) -> bytes:
+    if compression == COMPRESSION_ZLIB:
+        import zlib
+        return zlib.compress(data)
+    if compression == COMPRESSION_LZMA:
+        import lzma
+        return lzma.compress(data)
+    return data
+
+def _decompress(compression: int, data: bytes) -> bytes:
+    if compression == COMPRESSION_ZLIB:
+        import zlib
+        return zlib.decompress(data)
+    if compression == COMPRESSION_LZMA:
+        import lzma
+        return lzma.decompress(data)
+    return data
+
+class CorpusEntry(Container):
+    """
+    Container read from a corpus, with the metadata recorded for it.
+    It can be used wherever a generated container is expected, e.g. to build
+    a filler.
+    """
+    __slots__ = ('index', 'code', 'seed', 'inv_type', 'valid')
+    index: int
+    code: Union[bytes, memoryview]
+    seed: Optional[int]
+    inv_type: Optional[int]
+    valid: Optional[bool]
+
+    def __init__(self, index: int, code: Union[bytes, memoryview], seed: Optional[int]=None, inv_type: Optional[int]=None, valid: Optional[bool]=None):
+        self.index = index
+        self.code = code
+        self.seed = seed
+        self.inv_type = inv_type
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.code)
+
+    def build(self) -> bytearray:
+        return bytearray(self.code)
+
+    """
+    Returns the recorded validity, or validates the container if it was not
+    recorded.
+    """
+    def is_valid(self) -> bool:
+        if self.valid is not None:
+            return self.valid
+        if self.inv_type is not None:
+            return self.inv_type == 0
+        from eof.v1 import validate
+        return validate(self.code)[0] == 0
+
+    def get_name(self) -> str:
+        name = hex(self.seed)[2:] if self.seed is not None else 'corpus{}'.format(self.index)
+        return 'eofV1_{}_{}'.format(name, 'valid' if self.is_valid() else 'invalid')
+
+    def get_description(self) -> str:
+        from eof.v1 import InvalidityType
+        d = "Valid EOF V1 container" if self.is_valid() else "Invalid EOF V1 container"
+        if self.inv_type:
+            d += "".join("\n- Invalid due to {}".format(t.name) for t in InvalidityType if t in InvalidityType(self.inv_type))
+        return d
+
+    def get_seed(self) -> Optional[int]:
+        return self.seed
+
+class CorpusWriter(object):
+    """
+    Writes a corpus to a binary stream.
+    The stream is only appended to, so it does not need to be seekable.
+    The index is written by `close`.
+    """
+    compression: int
+    block_size: int
+    count: int
+
+    def __init__(self, out: BinaryIO, compression: Optional[str]=None, block_size: int=DEFAULT_BLOCK_SIZE):
+        if not compression in COMPRESSION_METHODS:
+            raise Exception("invalid compression: {}".format(compression))
+        self.compression = COMPRESSION_METHODS[compression]
+        self.block_size = block_size
+        self.count = 0
+        self._out = out
+        self._pos = 0
+        self._index = bytearray()
+        self._blocks = bytearray()
+        self._block = bytearray()
+        self._closed = False
+        self._write(HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION, self.compression))
+
+    def _write(self, data: bytes):
+        self._out.write(data)
+        self._pos += len(data)
+
+    """
+    Appends a container with its metadata.
+    """
+    def write(self, code: Union[bytes, bytearray, memoryview], seed: Optional[int]=None, inv_type: Optional[int]=None, valid: Optional[bool]=None):
+        flags = 0
+        if seed is not None:
+            flags |= FLAG_HAS_SEED
+        if inv_type is not None:
+            flags |= FLAG_HAS_INVALIDITY
+        if valid is not None:
+            flags |= FLAG_HAS_VALIDITY
+            if valid:
+                flags |= FLAG_VALID
+        prefix = LENGTH.pack(len(code))
+        if self.compression == COMPRESSION_NONE:
+            block = 0
+            offset = self._pos + len(prefix)
+            self._write(prefix)
+            self._write(code)
+        else:
+            block = len(self._blocks) // INDEX_BLOCK.size
+            offset = len(self._block) + len(prefix)
+            self._block += prefix
+            self._block += code
+        self._index += INDEX_ENTRY.pack(block, offset, len(code), seed or 0, inv_type or 0, flags)
+        self.count += 1
+        if len(self._block) >= self.block_size:
+            self._flush_block()
+
+    """
+    Appends a container produced by the fuzzer, recording its seed and
+    invalidity types.
+    """
+    def write_container(self, c: Container):
+        inv_type = getattr(c, 'inv_type', None)
+        self.write(c.build(), seed=c.get_seed(), inv_type=None if inv_type is None else int(inv_type), valid=c.is_valid())
+
+    """
+    Drops the entries written after the first `count` from the index, e.g.
+    those of an interrupted chunk. Their bytes are left unreferenced.
+    """
+    def discard(self, count: int):
+        if self._closed or count >= self.count:
+            return
+        del self._index[count * INDEX_ENTRY.size:]
+        self.count = count
+
+    def _flush_block(self):
+        if not self._block:
+            return
+        data = _compress(self.compression, bytes(self._block))
+        self._write(LENGTH.pack(len(data)))
+        self._blocks += INDEX_BLOCK.pack(self._pos, len(data))
+        self._write(data)
+        self._block = bytearray()
+
+    """
+    Writes the pending block, the index and the footer.
+    The stream itself is not closed.
+    """
+    def close(self):
+        if self._closed:
+            return
+        self._flush_block()
+        index_offset = self._pos
+        self._write(self._index)
+        self._write(self._blocks)
+        self._write(FOOTER.pack(index_offset, self.count, len(self._blocks) // INDEX_BLOCK.size, CORPUS_INDEX_MAGIC))
+        self._out.flush()
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class CorpusReader(object):
+    """
+    Memory-maps a corpus file for random access.
+    Containers of uncompressed corpora are `memoryview` slices of the file,
+    so they must be released before closing the reader.
+    Compressed blocks are decompressed on access, keeping the last one.
+    """
+    path: str
+    compression: int
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        if len(self._mmap) < HEADER.size + FOOTER.size:
+            self.close()
+            raise Exception("invalid corpus: {}".format(path))
+        magic, version, self.compression = HEADER.unpack_from(self._mmap, 0)
+        index_offset, self._count, blocks, index_magic = FOOTER.unpack_from(self._mmap, len(self._mmap) - FOOTER.size)
+        if magic != CORPUS_MAGIC or index_magic != CORPUS_INDEX_MAGIC or version != CORPUS_VERSION:
+            self.close()
+            raise Exception("invalid corpus: {}".format(path))
+        self._index_offset = index_offset
+        self._blocks_offset = index_offset + self._count * INDEX_ENTRY.size
+        self._block_count = blocks
+        self._cached_block: Optional[Tuple[int, memoryview]] = None
+
+    def __len__(self):
+        return self._count
+
+    def _block_view(self, block: int) -> memoryview:
+        if self.compression == COMPRESSION_NONE:
+            return self._view
+        if self._cached_block is None or self._cached_block[0] != block:
+            offset, length = INDEX_BLOCK.unpack_from(self._mmap, self._blocks_offset + block * INDEX_BLOCK.size)
+            data = _decompress(self.compression, self._mmap[offset:offset+length])
+            self._cached_block = (block, memoryview(data))
+        return self._cached_block[1]
+
+    """
+    Returns the entry at position `index`.
+    """
+    def entry(self, index: int) -> CorpusEntry:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("corpus index out of range")
+        block, offset, length, seed, inv_type, flags = INDEX_ENTRY.unpack_from(self._mmap, self._index_offset + index * INDEX_ENTRY.size)
+        return CorpusEntry(
+            index,
+            self._block_view(block)[offset:offset+length],
+            seed if flags & FLAG_HAS_SEED else None,
+            inv_type if flags & FLAG_HAS_INVALIDITY else None,
+            bool(flags & FLAG_VALID) if flags & FLAG_HAS_VALIDITY else None,
+        )
+
+    """
+    Returns the container at position `index`.
+    """
+    def __getitem__(self, index: int) -> memoryview:
+        return self.entry(index).code
+
+    def __iter__(self) -> Iterator[CorpusEntry]:
+        for i in range(self._count):
+            yield self.entry(i)
+
+    def close(self):
+        self._cached_block = None
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def _scan_entries(data: Union[bytes, memoryview], start: int, block: int, index: bytearray) -> int:
+    pos = start
+    while pos + LENGTH.size <= len(data):
+        (length,) = LENGTH.unpack_from(data, pos)
+        if pos + LENGTH.size + length > len(data):
+            break
+        index += INDEX_ENTRY.pack(block, pos + LENGTH.size, length, 0, 0, 0)
+        pos += LENGTH.size + length
+    return pos
+
+"""
+Writes the index of a corpus file whose index was never written, by scanning
+the length prefixes of its entries, and truncates the incomplete entry or
+block at its end.
+The recovered entries have no seed, invalidity types or validity recorded.
+A corpus which already has an index is left untouched.
+Returns the number of entries of the corpus.
+"""
+def recover(path: str) -> int:
+    with open(path, 'r+b') as f:
+        size = f.seek(0, 2)
+        if size < HEADER.size:
+            raise Exception("invalid corpus: {}".format(path))
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, version, compression = HEADER.unpack_from(data, 0)
+            if magic != CORPUS_MAGIC or version != CORPUS_VERSION:
+                raise Exception("invalid corpus: {}".format(path))
+            if size >= HEADER.size + FOOTER.size and data[size-4:size] == CORPUS_INDEX_MAGIC:
+                return FOOTER.unpack_from(data, size - FOOTER.size)[1]
+            index = bytearray()
+            blocks = bytearray()
+            if compression == COMPRESSION_NONE:
+                pos = _scan_entries(data, HEADER.size, 0, index)
+            else:
+                pos = HEADER.size
+                while pos + LENGTH.size <= size:
+                    (length,) = LENGTH.unpack_from(data, pos)
+                    start = pos + LENGTH.size
+                    if start + length > size:
+                        break
+                    try:
+                        block = _decompress(compression, data[start:start+length])
+                    except Exception:
+                        break
+                    _scan_entries(block, 0, len(blocks) // INDEX_BLOCK.size, index)
+                    blocks += INDEX_BLOCK.pack(start, length)
+                    pos = start + length
+        count = len(index) // INDEX_ENTRY.size
+        f.truncate(pos)
+        f.seek(pos)
+        f.write(index)
+        f.write(blocks)
+        f.write(FOOTER.pack(pos, count, len(blocks) // INDEX_BLOCK.size, CORPUS_INDEX_MAGIC))
+    return count
@@ -0,0 +1,82 @@
+import io
+import pytest
+from corpus import CorpusReader, CorpusWriter
+from eof.v1 import generate_container, select_invalidity_type
+
+def generated(count):
+    return [generate_container(seed=seed, code_size=seed + 1, inv_type=select_invalidity_type(seed, -1 if seed % 2 else None)) for seed in range(count)]
+
+@pytest.mark.parametrize("compression", [None, "zlib", "lzma"])
+def test_corpus_roundtrip(tmp_path, compression):
+    containers = generated(32)
+    path = tmp_path / "corpus.eofc"
+    with open(path, 'wb') as f, CorpusWriter(f, compression=compression, block_size=1024) as writer:
+        for c in containers:
+            writer.write_container(c)
+        writer.write(b'\xef\x00')
+    with CorpusReader(str(path)) as reader:
+        assert len(reader) == len(containers) + 1
+        # Random access
+        for i in reversed(range(len(containers))):
+            e = reader.entry(i)
+            assert e.code == containers[i].build()
+            assert e.seed == containers[i].get_seed()
+            assert e.inv_type == containers[i].inv_type
+            assert e.is_valid() == containers[i].is_valid()
+            assert e.get_name() == containers[i].get_name()
+        e = reader.entry(-1)
+        assert (bytes(e.code), e.seed, e.inv_type, e.valid) == (b'\xef\x00', None, None, None)
+        assert not e.is_valid()
+        assert [bytes(e.code) for e in reader] == [bytes(c.build()) for c in containers] + [b'\xef\x00']
+        del e
+
+def test_corpus_zero_copy(tmp_path):
+    path = tmp_path / "corpus.eofc"
+    with open(path, 'wb') as f, CorpusWriter(f) as writer:
+        writer.write(b'\xef\x00\x01')
+    reader = CorpusReader(str(path))
+    code = reader[0]
+    assert isinstance(code, memoryview)
+    with pytest.raises(BufferError):
+        reader.close()
+    code.release()
+    reader.close()
+
+def test_corpus_stream():
+    out = io.BytesIO()
+    writer = CorpusWriter(out, compression="zlib")
+    writer.write(b'\xef\x00\x01', seed=1, inv_type=0, valid=True)
+    writer.close()
+    assert out.getvalue().startswith(b'EOFC')
+    assert out.getvalue().endswith(b'EOFI')
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_corpus_discard(tmp_path, compression):
+    path = tmp_path / "corpus.eofc"
+    with open(path, 'wb') as f, CorpusWriter(f, compression=compression) as writer:
+        for i in range(5):
+            writer.write(bytes([0xef, 0x00, i]), seed=i)
+        writer.discard(3)
+        writer.discard(4)
+        writer.write(b'\xef\x00\xff', seed=9)
+    with CorpusReader(str(path)) as reader:
+        assert [(bytes(e.code), e.seed) for e in reader] == [(b'\xef\x00\x00', 0), (b'\xef\x00\x01', 1), (b'\xef\x00\x02', 2), (b'\xef\x00\xff', 9)]
+
+@pytest.mark.parametrize("compression", [None, "zlib"])
+def test_corpus_recover(tmp_path, compression):
+    from corpus import recover
+    codes = [bytes([0xef, 0x00, i]) * (i + 1) for i in range(40)]
+    path = tmp_path / "corpus.eofc"
+    with open(path, 'wb') as f:
+        writer = CorpusWriter(f, compression=compression, block_size=64)
+        for code in codes:
+            writer.write(code, seed=1)
+        # Killed before the index is written, in the middle of an entry
+        writer._flush_block()
+        f.write(b'\x10\x00\x00\x00\xef')
+    with pytest.raises(Exception):
+        CorpusReader(str(path))
+    assert recover(str(path)) == len(codes)
+    with CorpusReader(str(path)) as reader:
+        assert [(bytes(e.code), e.seed) for e in reader] == [(code, None) for code in codes]
+    assert recover(str(path)) == len(codes)
@@ -1,6 +1,8 @@
+import json
 from abc import ABC, abstractmethod
-from typing import Any, Dict
-from compilers import compile
+from typing import Any, Callable, Dict, List, Optional
+from compilers import compile, compile_many
+import metrics
 
 """
 Base abstract class for the container of any version.
@@ -26,17 +28,73 @@ class Container(ABC):
     def get_seed(self) -> int:
         pass
 
+"""
+Collects the code strings of every section in the dict, including those of
+nested sub-containers.
+"""
+def collect_sources(source_dict: Dict[str, Any]) -> List[str]:
+    version = source_dict.get('version', 1)
+    if version == 1:
+        from eof.v1 import collect_v1_sources
+        return collect_v1_sources(source_dict)
+    else:
+        raise Exception("invalid version")
+
+"""
+Returns a canonical representation of a source dict, which is the same for
+dicts with the same content whatever the order of their keys.
+"""
+def canonical_source(source_dict: Dict[str, Any]) -> str:
+    return json.dumps(source_dict, sort_keys=True, separators=(',', ':'), default=repr)
+
+"""
+Wraps `code_compiler` so every distinct code string is compiled only once.
+"""
+def memoize_code_compiler(code_compiler: Callable[[str], bytearray]) -> Callable[[str], bytearray]:
+    compiled = {}
+    def memoized(s: str) -> bytearray:
+        key = s.strip()
+        if not key in compiled:
+            compiled[key] = bytes(code_compiler(s))
+        return bytearray(compiled[key])
+    return memoized
+
 """
 Parses a dict by calling the appropriate compiler for the version of the EOF
+When no `code_compiler` is given, all the code in the dict, including the one
+in nested sub-containers, is compiled concurrently before the containers are
+assembled.
+Every distinct code string and sub-container is compiled once: identical
+sub-containers, found through their canonical representation in
+`containers`, reuse the same compiled container and its built bytes.
 """
-def compile_from_dict(source_dict: Dict[str, Any]) -> Container:
+def compile_from_dict(source_dict: Dict[str, Any], code_compiler: Optional[Callable[[str], bytearray]]=None, containers: Optional[Dict[str, Container]]=None) -> Container:
     # Default version is 1
     version = 1
     if 'version' in source_dict:
         version = source_dict['version']
 
+    if code_compiler is None:
+        sources = collect_sources(source_dict)
+        compiled = dict(zip([s.strip() for s in sources], compile_many(sources)))
+        code_compiler = lambda s: bytearray(compiled[s.strip()])
+    elif containers is None:
+        code_compiler = memoize_code_compiler(code_compiler)
+
+    if containers is None:
+        containers = {}
+
+    def container_compiler(d: Dict[str, Any]) -> Container:
+        key = canonical_source(d)
+        c = containers.get(key)
+        if c is None:
+            c = containers[key] = compile_from_dict(d, code_compiler, containers)
+        else:
+            metrics.count('compile.containers.reused')
+        return c
+
     if version == 1:
         from eof.v1 import compile_v1_from_dict
-        return compile_v1_from_dict(source_dict, compile_from_dict, compile)
+        return compile_v1_from_dict(source_dict, container_compiler, code_compiler)
     else:
-        raise Exception("invalid version")
\ No newline at end of file
+        raise Exception("invalid version")
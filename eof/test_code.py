@@ -0,0 +1,48 @@
+import random
+import pytest
+import eof.v1.code
+from eof.v1 import InvalidityType, generate_container, validate
+from eof.v1.code import HALTING_OPCODES, generate_code
+
+"""
+Splits code into `(offset, opcode, immediate size)` instructions, the last
+one possibly running past the end of the code.
+"""
+def instructions(code: bytes):
+    pos = 0
+    while pos < len(code):
+        op = code[pos]
+        n = op - 0x5f if 0x60 <= op <= 0x7f else 0
+        yield (pos, op, n)
+        pos += 1 + n
+
+@pytest.mark.parametrize("truncate_push", [False, True])
+def test_generate_code(truncate_push: bool):
+    r = random.Random(1)
+    for size in list(range(1, 40)) + [223, 224, 225, 319, 320, 321, 1000, 12283]:
+        code = bytes(generate_code(r, size, truncate_push=truncate_push))
+        assert len(code) == size
+        pos, op, n = list(instructions(code))[-1]
+        if truncate_push:
+            assert 0x60 <= op <= 0x7f
+            assert pos + 1 + n > size
+        else:
+            assert pos + 1 + n == size
+            assert op in HALTING_OPCODES
+
+def test_generate_code_small_path(monkeypatch):
+    for size in [1, 2, 50, 224, 225, 320, 321, 4000]:
+        for seed in range(4):
+            monkeypatch.setattr(eof.v1.code, 'SMALL_CODE_SIZE', 0)
+            vectorized = generate_code(random.Random(seed), size)
+            monkeypatch.setattr(eof.v1.code, 'SMALL_CODE_SIZE', 1 << 20)
+            small = generate_code(random.Random(seed), size)
+            assert vectorized == small
+
+@pytest.mark.parametrize("code_mode", ['opcodes', 'truncated-push'])
+def test_generate_container_code_mode(code_mode: str):
+    for seed in range(200):
+        inv_type = InvalidityType(seed % 2 and InvalidityType.INVALID_TRAILING_BYTES)
+        c = generate_container(seed=seed, inv_type=inv_type, code_mode=code_mode)
+        assert bool(validate(c.build())[0]) == bool(inv_type)
+        assert c.build() == generate_container(seed=seed, inv_type=inv_type, code_mode=code_mode).build()
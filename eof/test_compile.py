@@ -197,4 +197,66 @@ def test_compile_v1():
 
         result = compile_from_dict(compile_test["input"])
         print(result.build().hex())
-        assert result.build() == bytearray.fromhex(compile_test["expected-output"][2:])
\ No newline at end of file
+        assert result.build() == bytearray.fromhex(compile_test["expected-output"][2:])
+
+"""
+Enables the metrics with an empty registry, restoring the previous state
+afterwards.
+"""
+@pytest.fixture
+def metrics_registry():
+    import metrics
+    was_enabled = metrics.enabled()
+    metrics.enable()
+    registry = metrics.get_registry()
+    previous = registry.take()
+    yield registry
+    if was_enabled:
+        registry.take()
+        registry.merge(previous)
+    else:
+        metrics.disable()
+
+def test_compile_v1_reuses_sub_containers(metrics_registry):
+    from compilers.raw import compile_raw
+    sub = {"version": 1, "sections": [{"code": ":raw 0x6001"}, {"data": ":raw 0xaabb"}]}
+    source = {
+        "version": 1,
+        "sections": [
+            {"code": ":raw 0x00"},
+            {"data": sub},
+            # Same content with the keys in a different order
+            {"data": {"sections": sub["sections"], "version": 1}},
+            {"data": {"sections": [{"code": ":raw 0x00"}, {"data": sub}]}},
+        ],
+    }
+    calls = []
+    def code_compiler(s: str) -> bytearray:
+        calls.append(s)
+        return compile_raw(s.strip()[len(":raw"):].strip())
+
+    result = compile_from_dict(source, code_compiler)
+    reused = metrics_registry.take()['counters']['compile.containers.reused']['count']
+    assert sorted(calls) == [":raw 0x00", ":raw 0x6001", ":raw 0xaabb"]
+    assert reused == 2
+    sub_code = "ef000101000202000200" + "6001" + "aabb"
+    assert result.sections[1].data.hex() == sub_code
+    assert result.sections[2].data.hex() == sub_code
+    assert result.sections[3].data.hex().endswith(sub_code)
+    assert result.build() == compile_from_dict(source).build()
+
+def test_collect_sources_versions():
+    from eof import collect_sources
+    source = {
+        "sections": [
+            {"code": ":raw 0x00"},
+            {"data": {"version": 1, "sections": [{"code": ":raw 0x01"}, {"data": ":raw 0x02"}]}},
+        ]
+    }
+    assert collect_sources(source) == [":raw 0x00", ":raw 0x01", ":raw 0x02"]
+    # Sub-containers of unknown versions are rejected as when compiling them
+    source["sections"][1]["data"]["version"] = 2
+    with pytest.raises(Exception, match="invalid version"):
+        collect_sources(source)
+    with pytest.raises(Exception, match="invalid version"):
+        compile_from_dict(source, code_compiler=lambda s: bytearray(b'\x00'))
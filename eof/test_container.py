@@ -0,0 +1,84 @@
+import pytest
+from eof.v1 import ContainerV1, Section, SectionKindV1, MAX_CODE_SIZE, generate_container
+
+"""
+Builds the container from scratch, bypassing the cache.
+"""
+def uncached_build(c: ContainerV1) -> bytearray:
+    return c._build()
+
+def test_build_cache_invalidation():
+    c = ContainerV1()
+    cs = Section(SectionKindV1.CODE)
+    cs.set_body(bytearray(b'\x00' * 10))
+    ds = Section(SectionKindV1.DATA)
+    ds.data = bytearray(b'\x01' * 5)
+    c.add_section(cs)
+    c.add_section(ds)
+
+    mutations = [
+        lambda: cs.set_body(bytearray(b'\x02' * 3)),
+        lambda: ds.set_size(7),
+        lambda: setattr(cs, 'kind', 0x8f),
+        lambda: setattr(c, 'magic', 0x8f),
+        lambda: setattr(c, 'version', 2),
+        lambda: setattr(c, 'extra', bytearray(b'\xfe')),
+        lambda: c.sections.insert(0, c.sections.pop()),
+        lambda: c.add_section(Section(SectionKindV1.DATA)) or c.sections[-1].set_body(bytearray(b'\x04')),
+        lambda: setattr(c.sections[-1], 'data', bytearray(b'\x03' * 4)),
+        lambda: c.sections.remove(cs),
+        lambda: setattr(c, 'sections', [cs]),
+    ]
+    for mutation in mutations:
+        before = c.build()
+        mutation()
+        assert c.build() == uncached_build(c)
+        assert c.build() != before
+        assert len(c) == 4 + 3 * len(c.sections) + sum(len(s.data) for s in c.sections if s.data)
+        assert c.remaining_space() == max(0, MAX_CODE_SIZE - len(c) - 3)
+
+def data_section(data: bytes) -> Section:
+    s = Section(SectionKindV1.DATA)
+    s.data = bytearray(data)
+    return s
+
+"""
+Sections removed or replaced in any way no longer affect the container.
+"""
+@pytest.mark.parametrize("removal", [
+    lambda c: c.sections.pop(),
+    lambda c: c.sections.remove(c.sections[-1]),
+    lambda c: c.sections.clear(),
+    lambda c: c.sections.__delitem__(-1),
+    lambda c: c.sections.__setitem__(-1, data_section(b'\x01')),
+    lambda c: c.sections.__setitem__(slice(None), []),
+    lambda c: c.sections.__imul__(0),
+    lambda c: setattr(c, 'sections', c.sections[:-1]),
+])
+def test_removed_section_detached(removal):
+    c = generate_container(seed=7)
+    removed = c.sections[-1]
+    removal(c)
+    before = c.build()
+    removed.data = bytearray(100)
+    assert c.build() == before == uncached_build(c)
+    assert len(c) == len(before)
+    assert c.remaining_space() == max(0, MAX_CODE_SIZE - len(c) - 3)
+
+def test_repeated_sections_size():
+    c = generate_container(seed=7)
+    c.sections *= 2
+    assert len(c) == len(uncached_build(c))
+
+def test_build_returns_copy():
+    c = ContainerV1.parse("ef000101000100fe")
+    b = c.build()
+    b[0] = 0
+    assert c.build() == bytearray.fromhex("ef000101000100fe")
+
+def test_keccak256():
+    from filler.hashing import keccak256
+    c = generate_container(seed=1, code_size=32, data_size=16)
+    assert c.keccak256() == keccak256(bytes(c.build()))
+    c.sections[0].data = bytearray(b'\xfe')
+    assert c.keccak256() == keccak256(bytes(c.build()))
@@ -0,0 +1,41 @@
+import random
+from pyevmasm.evmasm import disassemble as pyevmasm_disassemble
+from eof.v1 import ContainerV1
+from eof.v1.disasm import disassemble, disassemble_dicts, instructions
+
+def test_disassemble_matches_pyevmasm():
+    r = random.Random(1)
+    for _ in range(50):
+        code = r.randbytes(r.randint(0, 2000))
+        # pyevmasm drops a truncated trailing PUSH, which is tested apart
+        decoded = list(instructions(code))
+        if decoded:
+            pos, op, immediate = decoded[-1]
+            if immediate is not None and len(immediate) < op - 0x5f:
+                code = code[:pos]
+        assert disassemble(code) == pyevmasm_disassemble(code)
+
+def test_disassemble_truncated_push():
+    assert disassemble(bytes.fromhex('600161aa')) == 'PUSH1 0x1\nPUSH2 0xaa (truncated)'
+    assert disassemble(bytes.fromhex('017f')) == 'ADD\nPUSH32 (truncated)'
+    assert list(disassemble_dicts(bytes.fromhex('0c61aa'), section=1)) == [
+        {'section': 1, 'offset': 0, 'opcode': 0x0c, 'name': None},
+        {'section': 1, 'offset': 1, 'opcode': 0x61, 'name': 'PUSH2', 'immediate': 'aa', 'truncated': True},
+    ]
+
+def test_container_lines():
+    c = ContainerV1.parse('ef0001010004020001006001f300aa')
+    assert list(c.lines()) == [
+        'MAGIC: 0',
+        '==========',
+        'SECTION 0:',
+        'KIND:1, len(DATA):4, CODE:',
+        'PUSH1 0x1',
+        'RETURN',
+        'STOP',
+        '==========',
+        'SECTION 1:',
+        'KIND:2, len(DATA):1',
+    ]
+    assert str(c) == '\n'.join(c.lines())
+    assert [d['offset'] for d in c.instructions()] == [0, 2, 3]
@@ -0,0 +1,49 @@
+import random
+import pytest
+from eof.v1 import ContainerV1, Section, SectionKindV1, generate_eof_container_initcode, generate_initcodes, generate_legacy_initcode, validate
+from eof.v1.initcode import EOF_INITCODE, LEGACY_INITCODE
+
+def return_code(length: int, offset: int) -> bytes:
+    return bytes([0x61]) + length.to_bytes(2, 'big') + bytes([0x61]) + offset.to_bytes(2, 'big') + bytes([0x60, 0x00, 0x39, 0x61]) + length.to_bytes(2, 'big') + bytes([0x60, 0x00, 0xf3])
+
+def reference_eof_initcode(code: bytes) -> bytes:
+    c = ContainerV1()
+    cs = Section(SectionKindV1.CODE)
+    ds = Section(SectionKindV1.DATA)
+    c.add_section(cs)
+    c.add_section(ds)
+    cs.data = return_code(len(code), 0)
+    cs.data = return_code(len(code), len(c))
+    ds.data = bytearray(code)
+    return bytes(c.build())
+
+@pytest.mark.parametrize("size", [0, 1, 255, 256, 4096, 2**16 - 1])
+def test_initcode_templates(size: int):
+    code = random.Random(size).randbytes(size)
+    assert generate_legacy_initcode(code) == return_code(size, 15) + code
+    initcode = generate_eof_container_initcode(code)
+    assert initcode == reference_eof_initcode(code)
+    assert validate(initcode)[0] == 0
+
+def test_initcode_too_long():
+    with pytest.raises(Exception):
+        generate_legacy_initcode(bytes(2**16))
+    with pytest.raises(Exception):
+        generate_eof_container_initcode(bytes(2**16))
+
+def test_generate_initcodes():
+    r = random.Random(1)
+    codes = [r.randbytes(r.randint(0, 300)) for _ in range(20)]
+    for initcode_f in [generate_legacy_initcode, generate_eof_container_initcode]:
+        assert [bytes(i) for i in generate_initcodes(codes, initcode_f)] == [initcode_f(code) for code in codes]
+    # Any other function is called per bytecode
+    assert [bytes(i) for i in generate_initcodes(codes, bytearray)] == codes
+
+def test_build_batch_into_buffer():
+    codes = [b'\x00', b'\x60\x01\x00']
+    buf = bytearray(b'\xff' * (4 + sum(EOF_INITCODE.size(len(code)) for code in codes)))
+    _, initcodes = EOF_INITCODE.build_batch(codes, buf, 4)
+    assert buf[:4] == b'\xff' * 4
+    assert bytes(buf[4:]) == b''.join(generate_eof_container_initcode(code) for code in codes)
+    assert [bytes(i) for i in initcodes] == [generate_eof_container_initcode(code) for code in codes]
+    assert LEGACY_INITCODE.size(3) == 18
@@ -0,0 +1,79 @@
+import mmap
+import pytest
+from eof.v1 import ContainerV1, InvalidFormatException, InvalidityType, generate_container, select_invalidity_type, validate
+
+def test_parse_roundtrip():
+    for seed in range(32):
+        c = generate_container(seed=seed, code_size=seed + 1, data_size=seed)
+        code = bytes(c.build())
+        for input in [code, bytearray(code), memoryview(code), code.hex(), '0x' + code.hex()]:
+            parsed = ContainerV1.parse(input)
+            assert parsed.build() == code
+            assert [s.kind for s in parsed.sections] == [s.kind for s in c.sections]
+
+def test_parse_zero_copy():
+    code = generate_container(seed=1, code_size=100, data_size=50).build()
+    buf = mmap.mmap(-1, len(code))
+    buf[:] = code
+    c = ContainerV1.parse(buf)
+    assert isinstance(c.sections[0].data, memoryview)
+    assert c.sections[0].data.obj is buf
+    assert c.build() == code
+    del c
+    buf.close()
+
+def test_parse_invalid():
+    invalid_inputs = [
+        ("", 0),
+        ("ef00", 2),
+        ("ef0002010001000000", 2),
+        ("ef000101", 3),
+        ("ef0001010001", 6),
+        ("ef00010100020000", 7),
+        ("ef000100", 3),
+        ("ef00010100010000fe", 8),
+    ]
+    for input, offset in invalid_inputs:
+        with pytest.raises(InvalidFormatException, match="invalid format") as e:
+            ContainerV1.parse(input)
+        assert e.value.offset == offset
+    for inv_type in [InvalidityType.INVALID_MAGIC, InvalidityType.INVALID_VERSION, InvalidityType.INVALID_TRAILING_BYTES, InvalidityType.EMPTY_SECTIONS]:
+        c = generate_container(seed=1, code_size=10, data_size=10, inv_type=inv_type)
+        with pytest.raises(Exception, match="invalid format"):
+            ContainerV1.parse(c.build())
+
+def test_validate():
+    inputs = [
+        ("", InvalidityType.INVALID_MAGIC, 0),
+        ("ef010101000100fe", InvalidityType.INVALID_MAGIC, 1),
+        ("ef000201000100fe", InvalidityType.INVALID_VERSION, 2),
+        ("ef000101", InvalidityType.INVALID_SECTION_SIZE, 4),
+        ("ef000100", InvalidityType.EMPTY_SECTIONS, 3),
+        ("ef000102000100fe", InvalidityType.NO_CODE_SECTION, 6),
+        ("ef000102000101000100fefe", InvalidityType.DATA_SECTION_FIRST, 3),
+        ("ef000101000101000100fefe", InvalidityType.TOO_MANY_CODE_SECTIONS, 6),
+        ("ef000101000103000100fefe", InvalidityType.INVALID_SECTION_KIND, 6),
+        ("ef000101000200fe", InvalidityType.INVALID_SECTION_SIZE, 8),
+        ("ef000101000100fe00", InvalidityType.INVALID_TRAILING_BYTES, 8),
+        ("ef010201000100fe00", InvalidityType.INVALID_MAGIC | InvalidityType.INVALID_VERSION | InvalidityType.INVALID_TRAILING_BYTES, 1),
+    ]
+    for input, inv_type, offset in inputs:
+        assert validate(bytes.fromhex(input)) == (inv_type, offset)
+    assert validate(bytes.fromhex("ef000101000102000100fefe")) == (0, -1)
+
+def test_validate_generated():
+    for seed in range(256):
+        for mode in [None, -1, -2]:
+            inv_type = select_invalidity_type(seed, mode)
+            code = generate_container(seed=seed, inv_type=inv_type).build()
+            # Raises if inconsistent with the generator
+            flags, _ = validate(code, inv_type)
+            if flags == 0:
+                ContainerV1.parse(code)
+
+def test_validate_batch():
+    from eof.v1.batch import pack_containers, validate_batch
+    containers = [generate_container(seed=seed, code_size=seed % 7 + 1, inv_type=select_invalidity_type(seed, -1 if seed % 2 else None)).build() for seed in range(64)]
+    containers += [bytes.fromhex(h) for h in ["", "ef", "ef00", "ef0001", "ef000101", "ef000100", "ef000101000100fe00", "ef000101000102000100fefe"]]
+    buf, offsets = pack_containers(containers)
+    assert list(validate_batch(buf, offsets)) == [validate(c)[0] for c in containers]
@@ -0,0 +1,74 @@
+import os
+from corpus import CorpusReader
+from eof.tree import compile_tree, expand_sources, load_manifest
+
+def write_source(path: str, code: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("version: 1\nsections:\n  - code: \":raw 0x{}\"\n".format(code))
+
+def test_expand_sources(tmp_path):
+    write_source(str(tmp_path / 'a.yml'), '00')
+    write_source(str(tmp_path / 'sub' / 'b.yaml'), '00')
+    (tmp_path / 'notes.txt').write_text('')
+    assert expand_sources([str(tmp_path)]) == [str(tmp_path / 'a.yml'), str(tmp_path / 'sub' / 'b.yaml')]
+    assert expand_sources([str(tmp_path / '**' / '*.yaml'), str(tmp_path / 'a.yml')]) == [str(tmp_path / 'a.yml'), str(tmp_path / 'sub' / 'b.yaml')]
+
+def test_compile_tree_skips_unchanged(tmp_path):
+    write_source(str(tmp_path / 'a.yml'), '00')
+    write_source(str(tmp_path / 'sub' / 'b.yml'), '600100')
+    manifest = str(tmp_path / 'manifest.json')
+
+    result = compile_tree([str(tmp_path)], manifest_path=manifest)
+    assert (result.compiled, result.skipped, result.errors) == (2, 0, {})
+    assert (tmp_path / 'a.hex').read_text() == '0xef00010100010000\n'
+    assert (tmp_path / 'sub' / 'b.hex').read_text() == '0xef000101000300600100\n'
+
+    write_source(str(tmp_path / 'a.yml'), 'fe')
+    (tmp_path / 'sub' / 'b.hex').unlink()
+    result = compile_tree([str(tmp_path)], manifest_path=manifest)
+    assert (result.compiled, result.skipped) == (1, 1)
+    assert (tmp_path / 'a.hex').read_text() == '0xef000101000100fe\n'
+    # Missing outputs of unchanged sources are restored from the manifest
+    assert (tmp_path / 'sub' / 'b.hex').exists()
+
+    result = compile_tree([str(tmp_path)], manifest_path=manifest, force=True)
+    assert (result.compiled, result.skipped) == (2, 0)
+
+def test_compile_tree_bundle(tmp_path):
+    write_source(str(tmp_path / 'src' / 'a.yml'), '00')
+    write_source(str(tmp_path / 'src' / 'b.yml'), '600100')
+    bundle = str(tmp_path / 'bundle.eofc')
+    manifest = str(tmp_path / 'manifest.json')
+
+    result = compile_tree([str(tmp_path / 'src')], jobs=2, manifest_path=manifest, bundle=bundle)
+    assert result.compiled == 2
+    assert not (tmp_path / 'src' / 'a.hex').exists()
+    assert [e.code.hex() for e in CorpusReader(bundle)] == ['ef00010100010000', 'ef000101000300600100']
+    assert [e['index'] for _, e in sorted(load_manifest(manifest).items())] == [0, 1]
+
+    (tmp_path / 'src' / 'c.yml').write_text("version: 1\nsections: 1\n")
+    os.unlink(bundle)
+    result = compile_tree([str(tmp_path / 'src')], manifest_path=manifest, bundle=bundle)
+    assert (result.compiled, result.skipped) == (0, 2)
+    assert list(result.errors) == [str(tmp_path / 'src' / 'c.yml')]
+    # The bundle is only written if every source compiles
+    assert not os.path.exists(bundle)
+
+def test_compile_tree_manifest_keys_and_fingerprint(tmp_path, monkeypatch):
+    import eof.tree
+    write_source(str(tmp_path / 'src' / 'a.yml'), '00')
+    manifest = str(tmp_path / 'manifest.json')
+    monkeypatch.chdir(tmp_path)
+    assert compile_tree(['src'], manifest_path=manifest).compiled == 1
+    assert list(load_manifest(manifest)) == [os.path.join('src', 'a.yml')]
+
+    # Same sources, reached from another working directory
+    monkeypatch.chdir(tmp_path / 'src')
+    result = compile_tree(['.'], manifest_path=manifest)
+    assert (result.compiled, result.skipped) == (0, 1)
+
+    # Changed compilers invalidate the manifest
+    monkeypatch.setattr(eof.tree, 'tool_fingerprint', lambda: 'other')
+    result = compile_tree(['.'], manifest_path=manifest)
+    assert (result.compiled, result.skipped) == (1, 0)
@@ -0,0 +1,206 @@
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+"""
+Batch compilation of trees of container sources.
+
+Sources are YAML files in the format of the `compile` subcommand, found in
+directories or through glob patterns, and compiled in parallel. The code of
+every source is written next to it, as `<name>.hex`, or into a binary bundle
+(a corpus, see `corpus`) holding the containers in source order.
+A manifest records the hash and the code of every compiled source, keyed by
+its path relative to the manifest, along with a fingerprint of the
+compilers, so sources which did not change since the previous run are not
+compiled again, as long as the compilers did not change either.
+"""
+
+SOURCE_EXTENSIONS = ('.yml', '.yaml')
+OUTPUT_EXTENSION = '.hex'
+MANIFEST_VERSION = 2
+
+"""
+Modules whose code determines the compiled containers, and compiler
+binaries, which make up the fingerprint of the manifest.
+"""
+COMPILER_MODULES = ('eof', 'eof.v1', 'compilers', 'compilers.raw', 'compilers.yul', 'compilers.lll')
+COMPILER_BINARIES = ('solc', 'lllc')
+
+"""
+Expands directories, recursively, to the sources they contain, and glob
+patterns to the files they match, keeping explicit files as they are.
+Returns the sources sorted, without duplicates.
+"""
+def expand_sources(paths: Iterable[str]) -> List[str]:
+    sources = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                sources.update(os.path.join(root, f) for f in files if f.endswith(SOURCE_EXTENSIONS))
+        elif glob.has_magic(path):
+            for match in glob.glob(path, recursive=True):
+                if os.path.isdir(match):
+                    sources.update(expand_sources([match]))
+                else:
+                    sources.add(match)
+        else:
+            sources.add(path)
+    return sorted(os.path.normpath(s) for s in sources)
+
+def source_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+"""
+Identifies the code of the compiler modules and the compiler binaries
+(see `compilers.cache.binary_fingerprint`), missing binaries included.
+"""
+def tool_fingerprint() -> str:
+    import importlib
+    from compilers.cache import binary_fingerprint
+    h = hashlib.sha256()
+    for name in COMPILER_MODULES:
+        with open(importlib.import_module(name).__file__, 'rb') as f:
+            h.update(f.read())
+    for binary in COMPILER_BINARIES:
+        h.update('{}={}\0'.format(binary, binary_fingerprint(binary)).encode())
+    return h.hexdigest()
+
+"""
+Key of a source in the manifest at `manifest_path`: its path relative to the
+directory of the manifest, so the manifest does not depend on the working
+directory.
+"""
+def manifest_key(source: str, manifest_path: str) -> str:
+    return os.path.relpath(os.path.abspath(source), os.path.dirname(os.path.abspath(manifest_path)))
+
+def output_path(source: str) -> str:
+    return os.path.splitext(source)[0] + OUTPUT_EXTENSION
+
+"""
+Compiles the YAML `text` of a source, returning its path along with the hex
+of the code, or the error raised.
+"""
+def compile_source(path: str, text: str) -> Tuple[str, Optional[str], Optional[str]]:
+    import yaml
+    from eof import compile_from_dict
+    try:
+        if not text.strip():
+            raise Exception("invalid input")
+        source = yaml.load(text, Loader=getattr(yaml, 'CLoader', yaml.Loader))
+        return (path, compile_from_dict(source).build().hex(), None)
+    except Exception as e:
+        return (path, None, str(e) or type(e).__name__)
+
+"""
+Loads the sources recorded in the manifest at `path`, or none if it does not
+exist or was written with compilers of another `fingerprint`.
+"""
+def load_manifest(path: Optional[str], fingerprint: Optional[str]=None) -> Dict[str, Dict[str, Any]]:
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    if fingerprint is not None and manifest.get('fingerprint') != fingerprint:
+        return {}
+    return manifest['sources']
+
+"""
+Saves the manifest, atomically replacing it.
+"""
+def save_manifest(path: str, sources: Dict[str, Dict[str, Any]], fingerprint: str):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'fingerprint': fingerprint, 'sources': sources}, f, indent=1, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _write_output(source: str, code: str):
+    with open(output_path(source), 'w') as f:
+        f.write('0x' + code + '\n')
+
+"""
+Writes the code of every source, in order, to a binary corpus at `path`.
+"""
+def write_bundle(path: str, codes: List[str], compression: Optional[str]=None):
+    from corpus import CorpusWriter
+    from eof.v1 import validate
+    with open(path, 'wb') as f, CorpusWriter(f, compression=compression) as writer:
+        for code in codes:
+            data = bytes.fromhex(code)
+            writer.write(data, valid=validate(data)[0] == 0)
+
+class TreeResult(object):
+    compiled: int
+    skipped: int
+    """
+    Error of every source which failed to compile, keyed by path.
+    """
+    errors: Dict[str, str]
+
+    def __init__(self):
+        self.compiled = 0
+        self.skipped = 0
+        self.errors = {}
+
+"""
+Compiles the sources found in `paths` over `jobs` processes.
+Sources whose hash matches the one in the manifest at `manifest_path` are
+skipped, unless `force` is set or the compilers changed since the manifest
+was written.
+The code is written next to every source, or, if `bundle` is set, into a
+binary bundle in source order, which is only written if every source
+compiles. The manifest then records the index of every source in it.
+"""
+def compile_tree(paths: Iterable[str], jobs: int=1, manifest_path: Optional[str]=None, bundle: Optional[str]=None, compression: Optional[str]=None, force: bool=False) -> TreeResult:
+    from parallel import imap_ordered
+    sources = expand_sources(paths)
+    fingerprint = tool_fingerprint()
+    manifest = load_manifest(manifest_path, fingerprint)
+    keys = {s: manifest_key(s, manifest_path) if manifest_path is not None else s for s in sources}
+    result = TreeResult()
+    hashes = {}
+    pending = []
+    for source in sources:
+        with open(source, 'rb') as f:
+            data = f.read()
+        hashes[source] = source_hash(data)
+        entry = manifest.get(keys[source])
+        if not force and entry is not None and entry['hash'] == hashes[source]:
+            result.skipped += 1
+            if bundle is None and not os.path.exists(output_path(source)):
+                _write_output(source, entry['code'])
+        else:
+            pending.append((source, data.decode()))
+
+    for source, code, error in imap_ordered(compile_source, pending, jobs):
+        if error is not None:
+            result.errors[source] = error
+            manifest.pop(keys[source], None)
+            continue
+        result.compiled += 1
+        manifest[keys[source]] = {'hash': hashes[source], 'code': code}
+        if bundle is None:
+            _write_output(source, code)
+
+    if bundle is not None and not result.errors:
+        for index, source in enumerate(sources):
+            manifest[keys[source]]['index'] = index
+        write_bundle(bundle, [manifest[keys[s]]['code'] for s in sources], compression)
+    if manifest_path is not None:
+        save_manifest(manifest_path, manifest, fingerprint)
+    return result
+
+def print_summary(result: TreeResult, out=sys.stderr):
+    for source, error in result.errors.items():
+        print("{}: {}".format(source, error), file=out)
+    print("Compiled {}, skipped {} unchanged, {} failed".format(result.compiled, result.skipped, len(result.errors)), file=out)
@@ -1,8 +1,11 @@
 import random
+import weakref
 from enum import IntEnum, IntFlag, auto
-from typing import Any, Callable, Optional, Union, List, Dict
-from pyevmasm.evmasm import disassemble
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple, Union, List, Dict
 from eof import Container
+from eof.v1.disasm import disassemble_dicts, disassemble_lines
+from eof.v1.initcode import EOF_INITCODE, LEGACY_INITCODE, InitcodeTemplate
+from metrics import stage, timed
 
 EOF_HEADER_TERMINATOR = 0
 EOF_MAGIC = 0
@@ -37,29 +40,82 @@ class InvalidityType(IntFlag):
 
     MAX_INVALIDITY          = auto()
 
+"""
+Raised when parsing a badly formatted EOF V1 container.
+`offset` is the position in the input of the first byte that could not be
+parsed, or the length of the input if it ended prematurely.
+"""
+class InvalidFormatException(Exception):
+    offset: int
+
+    def __init__(self, offset: int):
+        super().__init__("invalid format")
+        self.offset = offset
+
 class SectionKindV1(IntEnum):
     CODE = 1
     DATA = 2
 
 class Section(object):
+    """
+    Name used to reference this container.
+    """
+    name: Optional[str]=None
+
+    def __init__(self, kind: Union[SectionKindV1, int]):
+        self._kind = kind
+        self._data = None
+        self._size = None
+        self._container = None
+
     """
     Data to be contained by this section.
     Can be code or any abstract data.
+    Parsed sections hold a `memoryview` into the parsed buffer.
+    The data is not copied, so modifying it in place requires setting it
+    again for the container to take the change into account.
     """
-    data: Optional[bytearray]=None
+    @property
+    def data(self) -> Optional[Union[bytearray, memoryview]]:
+        return self._data
+
+    @data.setter
+    def data(self, data: Optional[Union[bytearray, memoryview]]):
+        old_length = len(self._data) if self._data else 0
+        self._data = data
+        self._changed((len(data) if data else 0) - old_length)
+
     """
     Size value to be used in the header.
     If set to None, the header is built with length of the data.
     """
-    size: Optional[int]=None
+    @property
+    def size(self) -> Optional[int]:
+        return self._size
+
+    @size.setter
+    def size(self, size: Optional[int]):
+        self._size = size
+        self._changed()
+
+    @property
+    def kind(self) -> Union[SectionKindV1, int]:
+        return self._kind
+
+    @kind.setter
+    def kind(self, kind: Union[SectionKindV1, int]):
+        self._kind = kind
+        self._changed()
+
     """
-    Name used to reference this container.
+    Notifies the container holding this section that it has been modified,
+    with the change in the length of its data.
     """
-    name: Optional[str]=None
-    kind: Union[SectionKindV1, int]
-
-    def __init__(self, kind: Union[SectionKindV1, int]):
-        self.kind = kind
+    def _changed(self, delta: int=0):
+        if self._container is not None:
+            c = self._container()
+            if c is not None:
+                c._body_changed(delta)
 
     """
     Sets a fixed number as size.
@@ -91,32 +147,181 @@ class Section(object):
     def get_body(self) -> bytearray:
         return self.data
 
-    def __str__(self) -> str:
-        s = 'KIND:{}, len(DATA):{}'.format(str(self.kind), len(self.data))
+    """
+    Yields the description of the section, followed by the disassembly of
+    code sections, one line at a time.
+    """
+    def lines(self) -> Iterator[str]:
         if self.kind == SectionKindV1.CODE:
-            s += ", CODE:\n"
-            s += disassemble(self.data)
-        return s
+            yield 'KIND:{}, len(DATA):{}, CODE:'.format(str(self.kind), len(self.data))
+            yield from disassemble_lines(self.data)
+        else:
+            yield 'KIND:{}, len(DATA):{}'.format(str(self.kind), len(self.data))
 
-class ContainerV1(Container):
-    sections: List[Section]
-    magic: Optional[int]=None
-    version: Optional[int]=None
+    def __str__(self) -> str:
+        return '\n'.join(self.lines())
+
+class SectionList(list):
     """
-    Extra data to be appended at the end of the container, which will
-    not be considered part of any of the sections.
-    If not None, the container is invalidated for testing purposes.
+    List of the sections of a container, which keeps the container's size
+    accounting and cached build up to date when it is modified.
+    A section is expected to belong to a single container at a time.
     """
-    extra: Optional[bytearray]=None
+    def __init__(self, container: 'ContainerV1', sections: Iterable[Section]=()):
+        super().__init__(sections)
+        # Weak references avoid cycles, so containers are freed as soon as
+        # they are no longer used
+        self._container = weakref.ref(container)
+        for s in self:
+            s._container = self._container
+
+    def _changed(self, previous: Iterable[Section]=()):
+        for s in self:
+            s._container = self._container
+        self._detach(previous)
+        self._container()._sections_changed()
+
+    """
+    Releases the sections of `sections` which are no longer in the list, so
+    later changes to them do not affect the container.
+    """
+    def _detach(self, sections: Iterable[Section]):
+        current = set(id(s) for s in self)
+        for s in sections:
+            if id(s) not in current and s._container is self._container:
+                s._container = None
+
+    def append(self, section: Section):
+        super().append(section)
+        section._container = self._container
+        self._container()._body_changed(len(section.data) if section.data else 0)
+
+    def extend(self, sections: Iterable[Section]):
+        super().extend(sections)
+        self._changed()
+
+    def insert(self, index: int, section: Section):
+        super().insert(index, section)
+        self._changed()
+
+    def pop(self, index: int=-1) -> Section:
+        section = super().pop(index)
+        self._changed([section])
+        return section
+
+    def remove(self, section: Section):
+        previous = list(self)
+        super().remove(section)
+        self._changed(previous)
+
+    def clear(self):
+        previous = list(self)
+        super().clear()
+        self._changed(previous)
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed()
+
+    def reverse(self):
+        super().reverse()
+        self._changed()
+
+    def __setitem__(self, index, value):
+        previous = list(self)
+        super().__setitem__(index, value)
+        self._changed(previous)
+
+    def __delitem__(self, index):
+        previous = list(self)
+        super().__delitem__(index)
+        self._changed(previous)
+
+    def __iadd__(self, sections: Iterable[Section]):
+        self.extend(sections)
+        return self
+
+    def __imul__(self, n: int):
+        previous = list(self)
+        super().__imul__(n)
+        self._changed(previous)
+        return self
+
+class ContainerV1(Container):
     valid: bool
     name: Optional[str]=None
     description: Optional[str]=None
     seed: Optional[int]=None
+    """
+    Invalidity types used to generate the container, if generated.
+    """
+    inv_type: Optional[InvalidityType]=None
 
     def __init__(self):
-        self.sections = []
+        self._magic = None
+        self._version = None
+        self._extra = None
+        self._body_size = 0
+        self._built = None
+        self._sections = SectionList(self)
         self.valid = True
 
+    """
+    Sections of the container.
+    Sections can be added, removed or reordered through the list, or replaced
+    by assigning a new list.
+    """
+    @property
+    def sections(self) -> List[Section]:
+        return self._sections
+
+    @sections.setter
+    def sections(self, sections: Iterable[Section]):
+        previous = self._sections
+        self._sections = SectionList(self, sections)
+        self._sections._detach(previous)
+        self._sections_changed()
+
+    @property
+    def magic(self) -> Optional[int]:
+        return self._magic
+
+    @magic.setter
+    def magic(self, magic: Optional[int]):
+        self._magic = magic
+        self._built = None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._version
+
+    @version.setter
+    def version(self, version: Optional[int]):
+        self._version = version
+        self._built = None
+
+    """
+    Extra data to be appended at the end of the container, which will
+    not be considered part of any of the sections.
+    If not None, the container is invalidated for testing purposes.
+    """
+    @property
+    def extra(self) -> Optional[bytearray]:
+        return self._extra
+
+    @extra.setter
+    def extra(self, extra: Optional[bytearray]):
+        self._extra = extra
+        self._built = None
+
+    def _body_changed(self, delta: int):
+        self._body_size += delta
+        self._built = None
+
+    def _sections_changed(self):
+        self._body_size = sum(len(s.data) for s in self._sections if s.data)
+        self._built = None
+
     """
     Override to get the byte length of the full container
     """
@@ -125,17 +330,13 @@ class ContainerV1(Container):
         l += 1 # EOF Version 0x01
         l += 3 * len(self.sections) # kind + size of each section
         l += 1 # Section Headers Terminator 0x00
-        for s in self.sections:
-            if s.data:
-                l += len(s.data)
+        l += self._body_size
         return l
 
     """
     Adds a section to the container.
     """ 
     def add_section(self, section: Section):
-        if not self.sections:
-            self.sections = []
         self.sections.append(section)
     
     """
@@ -147,8 +348,7 @@ class ContainerV1(Container):
         current_space_used += 1 # EOF Version 0x01
         current_space_used += 1 # Section Headers Terminator 0x00
         current_space_used += 3 * (len(self.sections) + 1)
-        for s in self.sections:
-            current_space_used += len(s.data)
+        current_space_used += self._body_size
         if current_space_used >= MAX_CODE_SIZE:
             return 0
         return MAX_CODE_SIZE - current_space_used
@@ -167,8 +367,17 @@ class ContainerV1(Container):
 
     """
     Builds the byte array that represents the entire EOF container.
+    The result is cached until the container is modified, so repeated builds
+    only copy the cached bytes.
     """ 
     def build(self) -> bytearray:
+        if self._built is None:
+            with stage('build') as st:
+                self._built = bytes(self._build())
+                st.nbytes = len(self._built)
+        return bytearray(self._built)
+
+    def _build(self) -> bytearray:
         c = bytearray.fromhex("EF")
 
         magic = self.magic
@@ -224,67 +433,116 @@ class ContainerV1(Container):
 
     """
     Parse an EOF V1 bytearray or hex string and returns a container.
-    Raises exception in case of a badly formatted bytearray.
+    Any buffer (`bytes`, `bytearray`, `memoryview`, `mmap`) is accepted and
+    parsed in a single pass without copying: section bodies are
+    `memoryview` slices of the input, so the input must not be resized or
+    closed while the container is in use.
+    Raises `InvalidFormatException` in case of a badly formatted bytearray.
     """
     @classmethod
-    def parse(cls, input: Union[bytearray, str]):
+    def parse(cls, input: Union[bytes, bytearray, memoryview, str]):
         if type(input) is str:
             if input.startswith("0x"):
                 input = input[2:]
-            input = bytearray.fromhex(input)
-        if not input:
-            raise Exception("invalid format")
-        c = cls()
-        if input[0:3] != bytearray.fromhex("ef0001"):
-            raise Exception("invalid format")
-        input = input[3:]
+            input = bytes.fromhex(input)
+        buf = memoryview(input)
+        if buf.format != 'B' or buf.ndim != 1:
+            buf = buf.cast('B')
+        end = len(buf)
+        for pos, expected in enumerate([0xEF, EOF_MAGIC, EOF_V1_VERSION_NUMBER]):
+            if pos >= end or buf[pos] != expected:
+                raise InvalidFormatException(pos)
+        sections = []
+        pos = 3
         # Parse sections
-        while input and input[0] != 0:
-            if len(input) < 3:
-                raise Exception("invalid format")
-            s = Section(input.pop(0))
-            s.size = int.from_bytes(input[:2], 'big')
-            input = input[2:]
-            c.add_section(s)
-        if not input or len(c.sections) == 0:
-            raise Exception("invalid format")
-        input.pop(0)
-        for s in c.sections:
-            if len(input) < s.size:
-                raise Exception("invalid format")
-            s.data = input[:s.size]
-            input = input[s.size:]
-        if len(input) > 0:
-            raise Exception("invalid format")
+        while pos < end and buf[pos] != EOF_HEADER_TERMINATOR:
+            if end - pos < 3:
+                raise InvalidFormatException(pos)
+            s = Section(buf[pos])
+            s._size = (buf[pos+1] << 8) | buf[pos+2]
+            pos += 3
+            sections.append(s)
+        if pos >= end or len(sections) == 0:
+            raise InvalidFormatException(pos)
+        pos += 1
+        for s in sections:
+            if end - pos < s._size:
+                raise InvalidFormatException(pos)
+            s._data = buf[pos:pos+s._size]
+            pos += s._size
+        if pos != end:
+            raise InvalidFormatException(pos)
+        # Sections are attached once fully parsed, so the size accounting is
+        # computed a single time
+        c = cls()
+        c.sections = sections
         return c
     """
     Checks whether magic and version bytes match the expected values for this version.
     """
     @classmethod
-    def is_version(cls, input: Union[bytearray, str]) -> bool:
+    def is_version(cls, input: Union[bytes, bytearray, memoryview, str]) -> bool:
         if type(input) is str:
             if input.startswith("0x"):
                 input = input[2:]
-            input = bytearray.fromhex(input)
-        if input[0:3] == bytearray.fromhex("ef0001"):
-            return True
-        return False
+            input = bytes.fromhex(input)
+        return bytes(input[0:3]) == b"\xef\x00\x01"
+
     """
-    Returns the keccak256 hash of the container.
+    Returns the keccak256 hash of the built container.
     """
     def keccak256(self) -> bytearray:
-        pass
+        from filler.hashing import keccak256
+        if self._built is None:
+            self.build()
+        with stage('keccak', len(self._built)):
+            return bytearray(keccak256(self._built))
 
 
-    def __str__(self) -> str:
+    """
+    Yields the description of the container and its sections, including the
+    disassembly of the code sections, one line at a time.
+    """
+    def lines(self) -> Iterator[str]:
         magic = self.magic
         if magic is None:
             magic = EOF_MAGIC
-        txt = 'MAGIC: {}\n'.format(magic)
+        yield 'MAGIC: {}'.format(magic)
+        for i, s in enumerate(self.sections):
+            yield '=========='
+            yield 'SECTION {}:'.format(i)
+            yield from s.lines()
+
+    """
+    Yields one dict per instruction of the code sections (see
+    `eof.v1.disasm.disassemble_dicts`), with the index of its section.
+    `fields` are added to every dict.
+    """
+    def instructions(self, **fields) -> Iterator[Dict[str, Any]]:
         for i, s in enumerate(self.sections):
-            txt += "==========\nSECTION {}:\n".format(i)
-            txt += str(s)
-        return txt
+            if s.kind == SectionKindV1.CODE:
+                yield from disassemble_dicts(s.data, **fields, section=i)
+
+    def __str__(self) -> str:
+        return '\n'.join(self.lines())
+
+"""
+Ways of filling the generated code sections: random bytes, well-formed
+instruction streams (see `eof.v1.code`), or instruction streams ending with
+a truncated PUSH.
+"""
+CODE_MODES = ('random', 'opcodes', 'truncated-push')
+
+"""
+Generates the bytes of a code section of `size` bytes in `code_mode`.
+"""
+def generate_code_section(r: random.Random, size: int, code_mode: str='random') -> bytearray:
+    if code_mode == 'random':
+        return r.randbytes(size)
+    if not code_mode in CODE_MODES:
+        raise Exception("invalid code mode: {}".format(code_mode))
+    from eof.v1.code import generate_code
+    return generate_code(r, size, truncate_push=code_mode == 'truncated-push')
 
 """
 Generate a container using the specified parameters.
@@ -292,15 +550,18 @@ Generated container will try to stay within the boundaries of
 `MAX_CODE_SIZE`, unless a specific code is used that by itself
 overflows the limit.
 """
-def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Optional[int]=None, data: Optional[bytearray]=None, data_size: Optional[int]=None, inv_type: Optional[InvalidityType]=InvalidityType(0)) -> ContainerV1:
-    # Init randomness for this subroutine
-    random.seed(seed)
+@timed('generate')
+def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Optional[int]=None, data: Optional[bytearray]=None, data_size: Optional[int]=None, inv_type: Optional[InvalidityType]=InvalidityType(0), code_mode: str='random') -> ContainerV1:
+    # Init randomness for this subroutine, using a private generator so
+    # concurrent generators do not interfere with each other
+    r = random.Random(seed)
 
     # Valid EOFV1 containers must have the following format:
     # 0x EF00 01 01 <code section size> [02 <data section size>] 00 <code section> [<data section>]
 
     c = ContainerV1()
     c.seed = seed
+    c.inv_type = inv_type
 
     if inv_type == 0:
         c.description = "Valid EOF V1 container"
@@ -310,12 +571,12 @@ def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Opt
     
 
     if InvalidityType.INVALID_MAGIC in inv_type:
-        c.magic = random.randint(EOF_MAGIC+1, 0xff)
+        c.magic = r.randint(EOF_MAGIC+1, 0xff)
         c.description += "\n- Invalid MAGIC={}".format(c.magic)
         
 
     if InvalidityType.INVALID_VERSION in inv_type:
-        c.version = random.randint(EOF_V1_VERSION_NUMBER+1, 0xfe)
+        c.version = r.randint(EOF_V1_VERSION_NUMBER+1, 0xfe)
         if c.version >= EOF_V1_VERSION_NUMBER:
             c.version += 1
         c.description += "\n- Invalid VERSION={}".format(c.version)
@@ -331,15 +592,15 @@ def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Opt
             else:
                 if code_size is None:
                     # No code nor size specified
-                    code_size = random.randint(1, c.remaining_space())
-                cs.data = random.randbytes(code_size)
+                    code_size = r.randint(1, c.remaining_space())
+                cs.data = generate_code_section(r, code_size, code_mode)
             c.add_section(cs)
 
             if InvalidityType.TOO_MANY_CODE_SECTIONS in inv_type:
                 # Insert another code section
                 cs = Section(SectionKindV1.CODE)
-                new_code_size = random.randint(0, c.remaining_space())
-                cs.data = random.randbytes(new_code_size)
+                new_code_size = r.randint(0, c.remaining_space())
+                cs.data = generate_code_section(r, new_code_size, code_mode)
                 c.add_section(cs)
                 c.description += "\n- Invalid due to TOO MANY CODE SECTIONS"
         else:
@@ -354,15 +615,15 @@ def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Opt
                 ds.data = data
             else:
                 if data_size is None:
-                    data_size = random.randint(1, c.remaining_space())
-                ds.data = random.randbytes(data_size)
+                    data_size = r.randint(min(1, c.remaining_space()), c.remaining_space())
+                ds.data = r.randbytes(data_size)
             c.add_section(ds)
             
             if InvalidityType.TOO_MANY_DATA_SECTIONS in inv_type:
                 # Insert another data section
                 ds = Section(SectionKindV1.DATA)
-                new_code_size = random.randint(0, c.remaining_space())
-                ds.data = random.randbytes(new_code_size)
+                new_code_size = r.randint(0, c.remaining_space())
+                ds.data = r.randbytes(new_code_size)
                 c.add_section(ds)
                 c.description += "\n- Invalid due to TOO MANY DATA SECTIONS"
     else:
@@ -383,21 +644,21 @@ def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Opt
             c.description += "\n- Invalid due to DATA SECTION APPEARS FIRST"
 
         if InvalidityType.INVALID_SECTION_KIND in inv_type:
-            section_index = random.randint(0, len(c.sections) - 1)
-            c.sections[section_index].kind = random.randint(0, 0xfd)
+            section_index = r.randint(0, len(c.sections) - 1)
+            c.sections[section_index].kind = r.randint(0, 0xfd)
             if c.sections[section_index].kind >= SectionKindV1.CODE.value:
                 c.sections[section_index].kind += 2
             c.description += "\n- Invalid due to section_kind={}".format(c.sections[section_index].kind)
 
         if InvalidityType.INVALID_SECTION_SIZE in inv_type:
-            section_index = random.randint(0, len(c.sections) - 1)
-            c.sections[section_index].size = random.randint(0, 0xfffe)
+            section_index = r.randint(0, len(c.sections) - 1)
+            c.sections[section_index].size = r.randint(0, 0xfffe)
             if c.sections[section_index].size >= len(c.sections[section_index].data):
                 c.sections[section_index].size += 1
             c.description += "\n- Invalid due to section_size={}!={}".format(c.sections[section_index].size, len(c.sections[section_index].data))
 
     if InvalidityType.INVALID_TRAILING_BYTES in inv_type:
-        c.extra = random.randbytes(2)
+        c.extra = r.randbytes(2)
         c.description += "\n- Invalid due to trailing bytes={}".format(c.extra.hex())
     valid_str = 'valid'
     if not c.valid:
@@ -407,107 +668,236 @@ def generate_container(seed: int, code: Optional[bytearray]=None, code_size: Opt
     return c
 
 """
-Generates a simple legacy initcode to return a bytecode.
+Resolves the invalidity type requested for a given seed.
+`-1` picks a random combination of invalidity types and `-2` picks a single
+random invalidity type, both derived from the seed, so the same seed always
+resolves to the same type.
 """
-def generate_legacy_initcode(code: bytearray) -> bytearray:
-    
-    if len(code) >= 2**16:
-        raise Exception("code too long for init code")
-
-    initcode = bytearray()
-
-    # PUSH2 - length - length of the code
-    initcode.append(0x61)
-    initcode += len(code).to_bytes(2, byteorder='big')
+def select_invalidity_type(seed: int, inv_type: Optional[int]=None) -> InvalidityType:
+    if inv_type is None:
+        return InvalidityType(0)
+    r = random.Random(seed)
+    if inv_type == -1:
+        # Random and multiple types of invalid characteristics
+        return InvalidityType(r.randint(1, InvalidityType.MAX_INVALIDITY - 1))
+    if inv_type == -2:
+        # Single random invalid characteristic
+        inv_types_count = len(bin(InvalidityType.MAX_INVALIDITY)[3:]) - 1
+        return InvalidityType(2 ** r.randint(0, inv_types_count))
+    return InvalidityType(inv_type)
 
-    # PUSH2 - offset - length of these opcodes
-    initcode.append(0x61)
-    opcodes_length_position = len(initcode)
-    initcode.append(0x00)
-    initcode.append(0x00)
-
-    # PUSH1 (0x00) - destOffset
-    initcode.append(0x60)
-    initcode.append(0x00)
-
-    # CODECOPY
-    initcode.append(0x39)
-
-    # PUSH2 - length - length of the code
-    initcode.append(0x61)
-    initcode += len(code).to_bytes(2, byteorder='big')
+"""
+Lazily generates one container per seed in `seeds`.
+All containers share the same parameters, except for the invalidity type
+which is resolved per seed when `inv_type` is `-1` or `-2`.
+"""
+def generate_containers(seeds: Iterable[int], code_size: Optional[int]=None, data_size: Optional[int]=None, inv_type: Optional[int]=None, code_mode: str='random') -> Iterator[ContainerV1]:
+    for seed in seeds:
+        yield generate_container(seed=seed, code_size=code_size, data_size=data_size, inv_type=select_invalidity_type(seed, inv_type), code_mode=code_mode)
+
+# Plain integer flags, so the validator does not build `InvalidityType`
+# objects on the hot path
+_INVALID_MAGIC = InvalidityType.INVALID_MAGIC.value
+_INVALID_VERSION = InvalidityType.INVALID_VERSION.value
+_EMPTY_SECTIONS = InvalidityType.EMPTY_SECTIONS.value
+_INVALID_SECTION_KIND = InvalidityType.INVALID_SECTION_KIND.value
+_INVALID_SECTION_SIZE = InvalidityType.INVALID_SECTION_SIZE.value
+_INVALID_TRAILING_BYTES = InvalidityType.INVALID_TRAILING_BYTES.value
+_NO_CODE_SECTION = InvalidityType.NO_CODE_SECTION.value
+_TOO_MANY_CODE_SECTIONS = InvalidityType.TOO_MANY_CODE_SECTIONS.value
+_TOO_MANY_DATA_SECTIONS = InvalidityType.TOO_MANY_DATA_SECTIONS.value
+_DATA_SECTION_FIRST = InvalidityType.DATA_SECTION_FIRST.value
 
-    # PUSH1 (0x00) - offset
-    initcode.append(0x60)
-    initcode.append(0x00)
+"""
+Invalidity types that applying each invalidity type in `generate_container`
+can additionally produce: changing the kind of a section, or turning the code
+section into a data section, can leave the container without code sections,
+and a wrong section size can show up as trailing bytes.
+An invalid kind can also be the header terminator, which ends the headers
+early and turns the remaining headers into body bytes.
+"""
+_IMPLIED_INVALIDITY = {
+    _INVALID_SECTION_KIND: _NO_CODE_SECTION | _EMPTY_SECTIONS | _INVALID_SECTION_SIZE | _INVALID_TRAILING_BYTES,
+    _DATA_SECTION_FIRST: _NO_CODE_SECTION,
+    _INVALID_SECTION_SIZE: _INVALID_TRAILING_BYTES,
+}
 
-    # RETURN
-    initcode.append(0xF3)
+"""
+Validates an EOF V1 container in a single pass over `buf`, without raising
+exceptions or allocating.
+Returns the `InvalidityType` bits detected and the offset of the first error,
+or `(0, -1)` for a valid container.
+An input ending within the section headers, or before the end of the
+section bodies, is reported as `INVALID_SECTION_SIZE`.
+If `expected` is specified, the result is cross-checked against the
+invalidity types used to generate the container, and `AssertionError` is
+raised if they are inconsistent.
+"""
+def validate(buf: Union[bytes, bytearray, memoryview], expected: Optional[int]=None) -> Tuple[int, int]:
+    end = len(buf)
+    flags = 0
+    offset = -1
+    if end < 1 or buf[0] != 0xEF or end < 2 or buf[1] != EOF_MAGIC:
+        flags = _INVALID_MAGIC
+        offset = 0 if end < 1 or buf[0] != 0xEF else 1
+        if end < 2:
+            return (flags, offset)
+    if end < 3:
+        return (flags | _INVALID_VERSION, 2 if offset < 0 else offset)
+    if buf[2] != EOF_V1_VERSION_NUMBER:
+        flags |= _INVALID_VERSION
+        if offset < 0:
+            offset = 2
+    pos = 3
+    code_sections = 0
+    data_sections = 0
+    body_size = 0
+    while pos < end and buf[pos] != EOF_HEADER_TERMINATOR:
+        if end - pos < 3:
+            flags |= _INVALID_SECTION_SIZE
+            if offset < 0:
+                offset = end
+            break
+        kind = buf[pos]
+        if kind == SectionKindV1.CODE:
+            code_sections += 1
+            if code_sections == 2:
+                flags |= _TOO_MANY_CODE_SECTIONS
+                if offset < 0:
+                    offset = pos
+        elif kind == SectionKindV1.DATA:
+            if code_sections == 0 and not flags & _DATA_SECTION_FIRST:
+                # Only an error if a code section appears later
+                data_first = pos
+                flags |= _DATA_SECTION_FIRST
+            data_sections += 1
+            if data_sections == 2:
+                flags |= _TOO_MANY_DATA_SECTIONS
+                if offset < 0:
+                    offset = pos
+        else:
+            flags |= _INVALID_SECTION_KIND
+            if offset < 0:
+                offset = pos
+        body_size += (buf[pos+1] << 8) | buf[pos+2]
+        pos += 3
+    terminated = pos < end and buf[pos] == EOF_HEADER_TERMINATOR
+    if flags & _DATA_SECTION_FIRST:
+        if code_sections == 0:
+            flags &= ~_DATA_SECTION_FIRST
+        elif offset < 0 or data_first < offset:
+            offset = data_first
+    if code_sections + data_sections == 0 and not flags & _INVALID_SECTION_KIND:
+        if not terminated:
+            # Input ended before the header terminator
+            if not flags & _INVALID_SECTION_SIZE:
+                flags |= _INVALID_SECTION_SIZE
+                if offset < 0:
+                    offset = end
+            return (flags, offset)
+        flags |= _EMPTY_SECTIONS
+        if offset < 0:
+            offset = pos
+    elif code_sections == 0:
+        flags |= _NO_CODE_SECTION
+        if offset < 0:
+            offset = pos
+    if terminated:
+        pos += 1
+        if end - pos > body_size:
+            flags |= _INVALID_TRAILING_BYTES
+            if offset < 0:
+                offset = pos + body_size
+        elif end - pos < body_size:
+            flags |= _INVALID_SECTION_SIZE
+            if offset < 0:
+                offset = end
+    elif not flags & _INVALID_SECTION_SIZE:
+        flags |= _INVALID_SECTION_SIZE
+        if offset < 0:
+            offset = end
+    if expected is not None:
+        check_invalidity(flags, expected)
+    return (flags, offset)
 
-    # Overwrite opcodes length with current actual length
-    initcode_length = len(initcode).to_bytes(2, byteorder='big')
-    initcode[opcodes_length_position] = initcode_length[0]
-    initcode[opcodes_length_position+1] = initcode_length[1]
+"""
+Checks that the invalidity types detected by `validate` are consistent with
+the invalidity types `expected` by the generator: the container must be
+invalid if and only if any invalidity type was applied, and every detected
+type must be explained by the applied ones.
+Types applied to a container can be masked by others (e.g. no section kind
+can be invalid in a container without sections), so they are not required to
+be detected.
+Raises `AssertionError` if they are inconsistent.
+"""
+def check_invalidity(detected: int, expected: int):
+    expected = int(expected)
+    explained = expected
+    for t, implied in _IMPLIED_INVALIDITY.items():
+        if expected & t:
+            explained |= implied
+    if (detected == 0) != (expected == 0) or detected & ~explained:
+        raise AssertionError("detected invalidity {!r} is inconsistent with expected {!r}".format(InvalidityType(detected), InvalidityType(expected)))
 
-    # Finally add the code
-    initcode += code
-    return initcode
+"""
+Generates a simple legacy initcode to return a bytecode.
+"""
+@timed('initcode.legacy')
+def generate_legacy_initcode(code: bytearray) -> bytearray:
+    return LEGACY_INITCODE.build(code)
 
 """
 Generates a EOF V1 initcode containing the inialization code and the
 output bytecode as a data section.
 """
+@timed('initcode.eof')
 def generate_eof_container_initcode(code: bytearray) -> bytearray:
-    if len(code) >= 2**16:
-        raise Exception("code too long for init code")
-
-    c = ContainerV1()
-
-    cs = Section(SectionKindV1.CODE)
-    ds = Section(SectionKindV1.DATA)
-    c.add_section(cs)
-    c.add_section(ds)
-
-    # Build the init code
-    cs.data = bytearray()
-
-    # PUSH2 - length - length of the code
-    cs.data.append(0x61)
-    cs.data += len(code).to_bytes(2, byteorder='big')
+    return EOF_INITCODE.build(code)
 
-    # PUSH2 - offset - length of these opcodes
-    cs.data.append(0x61)
-    opcodes_length_position = len(cs.data)
-    cs.data.append(0x00)
-    cs.data.append(0x00)
-
-    # PUSH1 (0x00) - destOffset
-    cs.data.append(0x60)
-    cs.data.append(0x00)
-
-    # CODECOPY
-    cs.data.append(0x39)
-
-    # PUSH2 - length - length of the code
-    cs.data.append(0x61)
-    cs.data += len(code).to_bytes(2, byteorder='big')
-
-    # PUSH1 (0x00) - offset
-    cs.data.append(0x60)
-    cs.data.append(0x00)
-
-    # RETURN
-    cs.data.append(0xF3)
+"""
+Template of the initcodes produced by `initcode_f`, one of the initcode
+generators above, or None for any other function.
+"""
+def initcode_template(initcode_f: Optional[Callable[[bytearray], bytearray]]) -> Optional[InitcodeTemplate]:
+    return _INITCODE_TEMPLATES.get(initcode_f)
 
-    # Overwrite opcodes length with current actual length
-    initcode_length = len(c).to_bytes(2, byteorder='big')
-    cs.data[opcodes_length_position] = initcode_length[0]
-    cs.data[opcodes_length_position+1] = initcode_length[1]
+_INITCODE_TEMPLATES = {
+    generate_legacy_initcode: LEGACY_INITCODE,
+    generate_eof_container_initcode: EOF_INITCODE,
+}
 
-    # Finally add the code to the data section
-    ds.data = code
+"""
+Generates the initcodes of a list of bytecodes with `initcode_f`, written one
+after the other into a single buffer, see `InitcodeTemplate.build_batch`.
+Returns a `memoryview` of the buffer for every initcode.
+"""
+def generate_initcodes(codes: List[bytearray], initcode_f: Callable[[bytearray], bytearray]=generate_legacy_initcode) -> List[memoryview]:
+    template = initcode_template(initcode_f)
+    if template is None:
+        return [memoryview(initcode_f(code)) for code in codes]
+    with stage('initcode.batch') as st:
+        buf, initcodes = template.build_batch(codes)
+        st.nbytes = len(buf)
+    return initcodes
 
-    return c.build()
+"""
+Collects the code strings of every section in the dict, including those of
+nested sub-containers, so they can be compiled together ahead of time.
+Sub-containers are collected according to their own version.
+"""
+def collect_v1_sources(source_dict: Dict[str, Any]) -> List[str]:
+    from eof import collect_sources
+    sources = []
+    for section_dict in source_dict.get('sections') or []:
+        for key in ['code', 'data']:
+            if key in section_dict:
+                compile_data = section_dict[key]
+                if type(compile_data) is str:
+                    sources.append(compile_data)
+                elif type(compile_data) is dict:
+                    sources += collect_sources(compile_data)
+                break
+    return sources
 
 def compile_v1_from_dict(source_dict: Dict[str, Any], container_compiler: Callable[[Dict[str, Any]], Container], code_compiler: Callable[[str], bytearray]) -> Container:
     c = ContainerV1()
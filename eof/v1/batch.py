@@ -0,0 +1,103 @@
+from typing import Iterable, Tuple, Union
+import numpy as np
+from eof.v1 import EOF_HEADER_TERMINATOR, EOF_MAGIC, EOF_V1_VERSION_NUMBER, InvalidityType, SectionKindV1
+
+"""
+Vectorized validation of batches of EOF V1 containers.
+
+Containers are packed into a single contiguous `uint8` buffer and validated
+together: every check runs as a NumPy operation over all containers, and
+section headers are scanned one header slot at a time, only over the
+containers which have not reached their header terminator yet.
+The detected invalidity types are the same as those of `eof.v1.validate`.
+"""
+
+"""
+Packs containers into a single buffer.
+Returns the buffer and the offset of every container in it.
+"""
+def pack_containers(containers: Iterable[Union[bytes, bytearray, memoryview]]) -> Tuple[np.ndarray, np.ndarray]:
+    containers = [bytes(c) for c in containers]
+    offsets = np.zeros(len(containers), dtype=np.int64)
+    if containers:
+        np.cumsum([len(c) for c in containers[:-1]], out=offsets[1:])
+    return (np.frombuffer(b''.join(containers), dtype=np.uint8), offsets)
+
+"""
+Validates every container packed in `buf`.
+`offsets` holds the start of every container, which ends where the next one
+starts, or at the end of the buffer for the last one.
+Returns an array with the `InvalidityType` bits detected for each container,
+0 for valid containers.
+"""
+def validate_batch(buf: Union[bytes, bytearray, memoryview, np.ndarray], offsets: Union[Iterable[int], np.ndarray]) -> np.ndarray:
+    buf = np.frombuffer(buf, dtype=np.uint8) if not isinstance(buf, np.ndarray) else buf.view(np.uint8).reshape(-1)
+    starts = np.asarray(offsets, dtype=np.int64)
+    n = len(starts)
+    ends = np.empty(n, dtype=np.int64)
+    ends[:-1] = starts[1:]
+    if n:
+        ends[-1] = len(buf)
+    lengths = ends - starts
+    flags = np.zeros(n, dtype=np.uint16)
+    if n == 0:
+        return flags
+    last = max(len(buf) - 1, 0)
+    if len(buf) == 0:
+        buf = np.zeros(1, dtype=np.uint8)
+
+    def byte_at(pos: np.ndarray) -> np.ndarray:
+        return buf[np.minimum(pos, last)]
+
+    def set_flag(mask: np.ndarray, t: InvalidityType):
+        flags[mask] |= np.uint16(t.value)
+
+    # Magic and version
+    set_flag((lengths < 2) | (byte_at(starts) != 0xEF) | (byte_at(starts + 1) != EOF_MAGIC), InvalidityType.INVALID_MAGIC)
+    set_flag((lengths == 2) | ((lengths > 2) & (byte_at(starts + 2) != EOF_V1_VERSION_NUMBER)), InvalidityType.INVALID_VERSION)
+
+    # Section headers, one slot per iteration over the containers still
+    # scanning their headers
+    idx = np.flatnonzero(lengths >= 3)
+    pos = starts + 3
+    code_sections = np.zeros(n, dtype=np.int64)
+    data_sections = np.zeros(n, dtype=np.int64)
+    body_size = np.zeros(n, dtype=np.int64)
+    terminated = np.zeros(n, dtype=bool)
+    data_first = np.zeros(n, dtype=bool)
+    invalid_kind = np.zeros(n, dtype=bool)
+    while len(idx):
+        p = pos[idx]
+        remaining = ends[idx] - p
+        kind = byte_at(p)
+        at_terminator = (remaining > 0) & (kind == EOF_HEADER_TERMINATOR)
+        terminated[idx[at_terminator]] = True
+        idx = idx[(remaining >= 3) & ~at_terminator]
+        if not len(idx):
+            break
+        p = pos[idx]
+        kind = buf[p]
+        is_code = kind == SectionKindV1.CODE
+        is_data = kind == SectionKindV1.DATA
+        data_first[idx[is_data & (code_sections[idx] == 0)]] = True
+        code_sections[idx] += is_code
+        data_sections[idx] += is_data
+        invalid_kind[idx[~is_code & ~is_data]] = True
+        body_size[idx] += (buf[p + 1].astype(np.int64) << 8) | buf[p + 2]
+        pos[idx] = p + 3
+
+    set_flag(invalid_kind, InvalidityType.INVALID_SECTION_KIND)
+    set_flag(code_sections > 1, InvalidityType.TOO_MANY_CODE_SECTIONS)
+    set_flag(data_sections > 1, InvalidityType.TOO_MANY_DATA_SECTIONS)
+    set_flag(data_first & (code_sections > 0), InvalidityType.DATA_SECTION_FIRST)
+    scanned = lengths >= 3
+    no_sections = scanned & (code_sections + data_sections == 0) & ~invalid_kind
+    set_flag(no_sections & terminated, InvalidityType.EMPTY_SECTIONS)
+    set_flag(scanned & ~no_sections & (code_sections == 0), InvalidityType.NO_CODE_SECTION)
+
+    # Section bodies
+    body_remaining = ends - pos - 1
+    set_flag(terminated & (body_remaining > body_size), InvalidityType.INVALID_TRAILING_BYTES)
+    # Also covers inputs ending within the section headers
+    set_flag(scanned & (~terminated | (body_remaining < body_size)), InvalidityType.INVALID_SECTION_SIZE)
+    return flags
@@ -0,0 +1,200 @@
+import array
+import random
+import sys
+from collections import defaultdict
+from typing import Dict
+import numpy as np
+from pyevmasm.evmasm import instruction_tables
+
+"""
+Opcode-aware generation of code sections.
+
+Instead of random bytes, code sections are filled with well-formed
+instruction streams of the opcodes defined in `FORK`: every PUSH is followed
+by its immediate bytes, opcodes are drawn with the weights of
+`GROUP_WEIGHTS`, and the code ends with a halting instruction or,
+deliberately, with a truncated PUSH.
+
+Generation is vectorized: the opcodes of all the instructions are drawn at
+once from a precomputed pool, their offsets are the cumulative sum of their
+lengths, and the immediates are the random bytes left in between.
+Short codes use the same draws one instruction at a time.
+"""
+
+FORK = 'istanbul'
+
+"""
+Total weight of the opcodes of every group of the instruction table.
+Within a group the weight is split evenly, except for PUSH opcodes, where
+narrower ones are more likely.
+"""
+GROUP_WEIGHTS = {
+    'Push Operations': 24,
+    'Duplication Operations': 12,
+    'Exchange Operations': 8,
+    'Stop and Arithmetic Operations': 12,
+    'Comparison & Bitwise Logic Operations': 10,
+    'Stack, Memory, Storage and Flow Operations': 12,
+    'Environmental Information': 6,
+    'Block Information': 3,
+    'SHA3': 2,
+    'Logging Operations': 2,
+    'System operations': 3,
+}
+
+"""
+Total weight of the halting opcodes (STOP, RETURN, REVERT, INVALID,
+SELFDESTRUCT) within the code, before its last instruction.
+"""
+HALTING_WEIGHT = 1
+
+"""
+Number of entries of the opcode pool, each opcode being repeated in
+proportion to its weight, so an opcode is drawn from two random bytes.
+"""
+POOL_SIZE = 1 << 16
+
+PUSH1 = 0x60
+JUMPDEST = 0x5b
+
+def _opcode_weights() -> Dict[int, float]:
+    groups = defaultdict(list)
+    halting = []
+    for i in instruction_tables[FORK]:
+        if i.is_terminator and not i.is_branch:
+            halting.append(i.opcode)
+        else:
+            groups[i.group].append(i)
+    weights = {}
+    for group, instructions in groups.items():
+        if group == 'Push Operations':
+            shares = [1 / i.operand_size for i in instructions]
+        else:
+            shares = [1] * len(instructions)
+        for i, share in zip(instructions, shares):
+            weights[i.opcode] = GROUP_WEIGHTS.get(group, 1) * share / sum(shares)
+    for opcode in halting:
+        weights[opcode] = HALTING_WEIGHT / len(halting)
+    return weights
+
+def _opcode_pool(weights: Dict[int, float]) -> np.ndarray:
+    opcodes = sorted(weights)
+    total = sum(weights.values())
+    slots = np.array([max(1, int(weights[op] / total * POOL_SIZE)) for op in opcodes], dtype=np.int64)
+    slots[np.argmax(slots)] += POOL_SIZE - slots.sum()
+    return np.repeat(np.array(opcodes, dtype=np.uint8), slots)
+
+OPCODE_WEIGHTS = _opcode_weights()
+OPCODE_POOL = _opcode_pool(OPCODE_WEIGHTS)
+
+"""
+Length of the instruction of every opcode, including its immediate bytes,
+and of every entry of the opcode pool.
+"""
+INSTRUCTION_LENGTHS = np.ones(256, dtype=np.int32)
+for _i in instruction_tables[FORK]:
+    INSTRUCTION_LENGTHS[_i.opcode] = 1 + _i.operand_size
+POOL_LENGTHS = INSTRUCTION_LENGTHS[OPCODE_POOL]
+
+HALTING_OPCODES = bytes(sorted(i.opcode for i in instruction_tables[FORK] if i.is_terminator and not i.is_branch))
+
+"""
+Instructions are about 3 bytes long on average with `GROUP_WEIGHTS`, so
+drawing 2 opcodes per 5 bytes, plus a margin for short codes, almost always
+fills the code at the first attempt.
+"""
+DRAWS_PER_BYTE = (2, 5)
+DRAW_MARGIN = 24
+
+"""
+Codes up to this size are generated one instruction at a time, which is
+faster than the fixed cost of the NumPy calls.
+Both ways consume the same random draws and produce the same code.
+"""
+SMALL_CODE_SIZE = 320
+
+OPCODE_POOL_LIST = OPCODE_POOL.tolist()
+POOL_LENGTHS_LIST = POOL_LENGTHS.tolist()
+
+# Narrow lengths make their gather and cumulative sum cheaper
+POOL_LENGTHS_U8 = POOL_LENGTHS.astype(np.uint8)
+
+def _draw_count(size: int) -> int:
+    return size * DRAWS_PER_BYTE[0] // DRAWS_PER_BYTE[1] + DRAW_MARGIN
+
+"""
+Draws `count` indexes of the opcode pool, as little-endian 16-bit numbers.
+"""
+def _draw(r: random.Random, count: int) -> array.array:
+    draws = array.array('H', r.randbytes(2 * count))
+    if sys.byteorder == 'big':
+        draws.byteswap()
+    return draws
+
+"""
+Writes the opcodes of an instruction stream filling exactly `code[0:size]`,
+whose immediates are the bytes already in `code`.
+A last PUSH that would not fit is narrowed down.
+"""
+def _fill_instructions(code: bytearray, r: random.Random, size: int):
+    if size == 0:
+        return
+    if size <= SMALL_CODE_SIZE:
+        _fill_instructions_small(code, r, size)
+        return
+    draws = np.frombuffer(r.randbytes(2 * _draw_count(size)), dtype='<u2')
+    lengths = POOL_LENGTHS_U8[draws]
+    ends = np.cumsum(lengths, dtype=np.int32)
+    while ends[-1] < size:
+        more = np.frombuffer(r.randbytes(2 * _draw_count(size)), dtype='<u2')
+        draws = np.concatenate((draws, more))
+        lengths = np.concatenate((lengths, POOL_LENGTHS_U8[more]))
+        ends = np.concatenate((ends, ends[-1] + np.cumsum(lengths[-len(more):], dtype=np.int32)))
+    last = int(np.searchsorted(ends, size))
+    opcodes = OPCODE_POOL[draws[:last+1]]
+    starts = ends[:last+1] - lengths[:last+1]
+    if ends[last] > size:
+        width = size - int(starts[last]) - 1
+        opcodes[last] = PUSH1 + width - 1 if width > 0 else JUMPDEST
+    view = np.frombuffer(code, dtype=np.uint8)
+    view[starts] = opcodes
+    del view
+
+def _fill_instructions_small(code: bytearray, r: random.Random, size: int):
+    pool = OPCODE_POOL_LIST
+    lengths = POOL_LENGTHS_LIST
+    pos = 0
+    while True:
+        for draw in _draw(r, _draw_count(size)):
+            length = lengths[draw]
+            if pos + length >= size:
+                if pos + length == size:
+                    code[pos] = pool[draw]
+                else:
+                    width = size - pos - 1
+                    code[pos] = PUSH1 + width - 1 if width > 0 else JUMPDEST
+                return
+            code[pos] = pool[draw]
+            pos += length
+
+"""
+Generates `size` bytes of code as a well-formed instruction stream.
+The code ends with a halting instruction if `terminate` is set, or with a
+PUSH missing some of its immediate bytes if `truncate_push` is set.
+"""
+def generate_code(r: random.Random, size: int, truncate_push: bool=False, terminate: bool=True) -> bytearray:
+    code = bytearray(r.randbytes(size))
+    if size == 0:
+        return code
+    if truncate_push:
+        width = r.randint(1, 32)
+        present = r.randint(0, min(width - 1, size - 1))
+        body = size - 1 - present
+        _fill_instructions(code, r, body)
+        code[body] = PUSH1 + width - 1
+    elif terminate:
+        _fill_instructions(code, r, size - 1)
+        code[size - 1] = HALTING_OPCODES[r.randrange(len(HALTING_OPCODES))]
+    else:
+        _fill_instructions(code, r, size)
+    return code
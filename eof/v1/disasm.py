@@ -0,0 +1,95 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from pyevmasm.evmasm import instruction_tables
+
+"""
+Table-driven disassembler.
+
+Code is decoded lazily from a `memoryview`, one instruction at a time, so
+the disassembly of large containers or batches of them can be streamed
+line by line. The text format is the one of `pyevmasm.disassemble`, except
+for a PUSH truncated by the end of the code, which is shown with the bytes
+present instead of being dropped.
+"""
+
+FORK = 'istanbul'
+
+"""
+Name and immediate size of every opcode, None for undefined opcodes.
+"""
+OPCODE_NAMES: List[Optional[str]] = [None] * 256
+IMMEDIATE_SIZES: List[int] = [0] * 256
+for _i in instruction_tables[FORK]:
+    OPCODE_NAMES[_i.opcode] = _i.name
+    IMMEDIATE_SIZES[_i.opcode] = _i.operand_size
+
+"""
+Text of every opcode, undefined ones being shown as `INVALID`.
+"""
+OPCODE_TEXT = [name or 'INVALID' for name in OPCODE_NAMES]
+
+def _byte_view(code: Union[bytes, bytearray, memoryview]) -> memoryview:
+    buf = memoryview(code)
+    if buf.format != 'B' or buf.ndim != 1:
+        buf = buf.cast('B')
+    return buf
+
+"""
+Decodes the instructions of `code`, yielding their offset, opcode and
+immediate bytes, which are None for opcodes without immediates and a
+`memoryview` of `code` otherwise, shorter than the immediate size of the
+opcode if the code ends within it.
+"""
+def instructions(code: Union[bytes, bytearray, memoryview]) -> Iterator[Tuple[int, int, Optional[memoryview]]]:
+    buf = _byte_view(code)
+    end = len(buf)
+    sizes = IMMEDIATE_SIZES
+    pos = 0
+    while pos < end:
+        op = buf[pos]
+        n = sizes[op]
+        if n:
+            yield (pos, op, buf[pos+1:pos+1+n])
+            pos += 1 + n
+        else:
+            yield (pos, op, None)
+            pos += 1
+
+"""
+Yields one line of text per instruction of `code`.
+"""
+def disassemble_lines(code: Union[bytes, bytearray, memoryview]) -> Iterator[str]:
+    text = OPCODE_TEXT
+    for _, op, immediate in instructions(code):
+        if immediate is None:
+            yield text[op]
+        elif len(immediate) == IMMEDIATE_SIZES[op]:
+            yield '{} {}'.format(text[op], hex(int.from_bytes(immediate, 'big')))
+        elif len(immediate) > 0:
+            yield '{} {} (truncated)'.format(text[op], hex(int.from_bytes(immediate, 'big')))
+        else:
+            yield '{} (truncated)'.format(text[op])
+
+"""
+Disassembles `code` into text, one instruction per line.
+"""
+def disassemble(code: Union[bytes, bytearray, memoryview]) -> str:
+    return '\n'.join(disassemble_lines(code))
+
+"""
+Yields one dict per instruction of `code` with its offset, opcode, name
+(None for undefined opcodes) and, for PUSH instructions, the hex of its
+immediate bytes, flagged as truncated if the code ends within them.
+`fields` are added to every dict.
+"""
+def disassemble_dicts(code: Union[bytes, bytearray, memoryview], **fields) -> Iterator[Dict[str, Any]]:
+    names = OPCODE_NAMES
+    for pos, op, immediate in instructions(code):
+        d = dict(fields)
+        d['offset'] = pos
+        d['opcode'] = op
+        d['name'] = names[op]
+        if immediate is not None:
+            d['immediate'] = immediate.hex()
+            if len(immediate) < IMMEDIATE_SIZES[op]:
+                d['truncated'] = True
+        yield d
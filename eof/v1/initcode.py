@@ -0,0 +1,117 @@
+import struct
+from typing import List, Optional, Sequence, Tuple, Union
+
+"""
+Template-patched initcode generation.
+
+The initcode returning a bytecode is the same for every container except for
+the length of the bytecode, so each kind of initcode is a precomputed prologue
+in which only the length fields are patched, with `struct.pack_into`, before
+the bytecode is appended. The initcode does not depend on the create method
+(`tx`, `create` or `create2`), which only changes how it is sent.
+"""
+
+MAX_INITCODE_CODE_SIZE = 2**16 - 1
+
+_LENGTH = struct.Struct('>H')
+
+"""
+Instructions copying the bytecode that follows them, at offset `0x0000`
+(patched), to memory and returning it. The length fields are patched.
+"""
+_RETURN_CODE = bytes([
+    0x61, 0x00, 0x00,   # PUSH2 - length - length of the code
+    0x61, 0x00, 0x00,   # PUSH2 - offset - length of the initcode before the code
+    0x60, 0x00,         # PUSH1 (0x00) - destOffset
+    0x39,               # CODECOPY
+    0x61, 0x00, 0x00,   # PUSH2 - length - length of the code
+    0x60, 0x00,         # PUSH1 (0x00) - offset
+    0xF3,               # RETURN
+])
+_RETURN_CODE_LENGTH_OFFSETS = (1, 10)
+_RETURN_CODE_OFFSET_OFFSET = 4
+
+"""
+Header of an EOF V1 container with a code section holding `_RETURN_CODE` and
+a data section, of patched size, holding the bytecode.
+"""
+_EOF_HEADER = bytes([
+    0xEF, 0x00, 0x01,
+    0x01, 0x00, len(_RETURN_CODE),
+    0x02, 0x00, 0x00,
+    0x00,
+])
+_EOF_DATA_SIZE_OFFSET = 7
+
+class InitcodeTemplate(object):
+    """
+    Bytes preceding the bytecode, with the length fields set to zero.
+    """
+    prologue: bytes
+    """
+    Offsets in the prologue of the 2-byte fields set to the length of the
+    bytecode.
+    """
+    length_offsets: Tuple[int, ...]
+
+    def __init__(self, prologue: bytes, length_offsets: Tuple[int, ...]):
+        self.prologue = prologue
+        self.length_offsets = length_offsets
+
+    def size(self, code_length: int) -> int:
+        return len(self.prologue) + code_length
+
+    """
+    Writes the initcode of `code` into `buf` at `offset`, returning the
+    offset following it.
+    """
+    def write_into(self, buf: Union[bytearray, memoryview], offset: int, code: Union[bytes, bytearray, memoryview]) -> int:
+        n = len(code)
+        if n > MAX_INITCODE_CODE_SIZE:
+            raise Exception("code too long for init code")
+        start = offset + len(self.prologue)
+        buf[offset:start] = self.prologue
+        for o in self.length_offsets:
+            _LENGTH.pack_into(buf, offset + o, n)
+        buf[start:start + n] = code
+        return start + n
+
+    def build(self, code: Union[bytes, bytearray, memoryview]) -> bytearray:
+        initcode = bytearray(self.size(len(code)))
+        self.write_into(initcode, 0, code)
+        return initcode
+
+    """
+    Writes the initcodes of every bytecode in `codes` one after the other into
+    `buf`, starting at `offset`, or into a new buffer if `buf` is None.
+    Returns the buffer and a `memoryview` of it for every initcode.
+    """
+    def build_batch(self, codes: Sequence[Union[bytes, bytearray, memoryview]], buf: Optional[Union[bytearray, memoryview]]=None, offset: int=0) -> Tuple[Union[bytearray, memoryview], List[memoryview]]:
+        if buf is None:
+            buf = bytearray(offset + sum(self.size(len(code)) for code in codes))
+        view = memoryview(buf)
+        initcodes = []
+        for code in codes:
+            end = self.write_into(view, offset, code)
+            initcodes.append(view[offset:end])
+            offset = end
+        return (buf, initcodes)
+
+def _return_code(code_offset: int) -> bytearray:
+    prologue = bytearray(_RETURN_CODE)
+    _LENGTH.pack_into(prologue, _RETURN_CODE_OFFSET_OFFSET, code_offset)
+    return prologue
+
+"""
+Legacy initcode returning the bytecode appended to it.
+"""
+LEGACY_INITCODE = InitcodeTemplate(bytes(_return_code(len(_RETURN_CODE))), _RETURN_CODE_LENGTH_OFFSETS)
+
+"""
+EOF V1 initcode, a container whose code section returns the bytecode held by
+its data section.
+"""
+EOF_INITCODE = InitcodeTemplate(
+    _EOF_HEADER + _return_code(len(_EOF_HEADER) + len(_RETURN_CODE)),
+    (_EOF_DATA_SIZE_OFFSET,) + tuple(len(_EOF_HEADER) + o for o in _RETURN_CODE_LENGTH_OFFSETS),
+)
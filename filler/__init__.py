@@ -1,10 +1,9 @@
 from eof import Container
 from collections.abc import Callable
+from typing import Any, Dict
 import yaml
-import rlp
-from web3 import Web3
-
-w3 = Web3()
+from filler import hashing
+from metrics import stage
 
 sender_sk = "45a915e4d060149eb4365960e6a7a45f334393093061116b197e3240065ff2d8"
 sender_address = "a94f5374fce5edbc8e2a8697c15331677e6ebf0b"
@@ -79,48 +78,65 @@ expect_preset = {
             },
         }
     
-def get_create_address(addr: str, intnonce: int) -> str:
+"""
+Normalizes a hex address, with or without `0x` prefix, to bytes.
+"""
+def address_bytes(addr: str) -> bytes:
     if addr.startswith('0x'):
         addr = addr[2:]
-
-    nonce = hex(intnonce)[2:]
-
     if (len(addr) % 2) != 0:
         addr = '0' + addr
+    return bytes.fromhex(addr)
 
-    if (len(nonce) % 2) != 0:
-        nonce = '0' + nonce
-    addr = bytes.fromhex(addr)
-    nonce = bytes.fromhex(nonce)
-
-    if nonce == bytes.fromhex('00'):
-        nonce = ''
-    kec = w3.keccak(hexstr=rlp.encode([addr, nonce]).hex())
-    return kec[12:].hex()[2:]
+def get_create_address(addr: str, intnonce: int) -> str:
+    return hashing.create_address(address_bytes(addr), intnonce).hex()
 
 def get_create2_address(addr: str, salt_int: int, initcode: bytearray) -> str:
-    if addr.startswith('0x'):
-        addr = addr[2:]
-    if (len(addr) % 2) != 0:
-        addr = '0' + addr
-    
-    salt = hex(salt_int)[2:]
-    while len(salt) < 64:
-        salt = '0' + salt
-
-    ff = bytes.fromhex('ff')
-    addr = bytes.fromhex(addr)
-    salt = bytes.fromhex(salt)
-    init_kec = w3.keccak(hexstr=initcode.hex())
-    kec = w3.keccak(hexstr=(ff + addr + salt + init_kec).hex())
-    return kec[12:].hex()[2:]
-    
-def generate_filler(container: Container, initcodegen: Callable[..., bytearray], create_method: str='tx') -> str:
+    return hashing.create2_address(address_bytes(addr), salt_int, bytes(initcode)).hex()
+
+"""
+Addresses of the contracts created by the `tx` and `create` methods, which do
+not depend on the initcode.
+"""
+tx_created_address = get_create_address(sender_address, sender_nonce)
+create_created_address = get_create_address(create_address, create_address_nonce)
+
+"""
+YAML dumper used for the fillers, using the libyaml emitter when available.
+Aliases are never emitted, so sharing objects between tests is safe.
+"""
+class FillerDumper(getattr(yaml, 'CDumper', yaml.Dumper)):
+    def ignore_aliases(self, data) -> bool:
+        return True
+
+"""
+Returns a new transaction for the test, so templates are never modified.
+"""
+def new_transaction(data: str, to: str="") -> dict:
+    tx = dict(init_transaction_template)
+    tx["data"] = [data]
+    tx["gasLimit"] = list(init_transaction_template["gasLimit"])
+    tx["value"] = list(init_transaction_template["value"])
+    tx["to"] = to
+    return tx
+
+"""
+Returns a new expect section for the test, so the preset is never modified.
+"""
+def new_expect() -> dict:
+    return {
+        "network": list(expect_preset["network"]),
+        "result": {addr: dict(result) for addr, result in expect_preset["result"].items()},
+    }
+
+"""
+Builds the filler test of a container, as a dict of a single entry keyed by
+the test name.
+"""
+def build_filler(container: Container, initcodegen: Callable[..., bytearray], create_method: str='tx') -> Dict[str, Any]:
     # Generate the init code
     code = container.build()
     initcode = initcodegen(code)
-    tx = init_transaction_template.copy()
-    tx["data"].append(":raw 0x" + initcode.hex())
     contract_result = dict()
     if container.is_valid():
         contract_result["code"] = "0x" + code.hex()
@@ -128,37 +144,59 @@ def generate_filler(container: Container, initcodegen: Callable[..., bytearray],
         contract_result["storage"] = dict()
     else:
         contract_result["shouldnotexist"] = 1
-    expect = expect_preset.copy()
 
     if create_method=='tx':
-        created_contract = get_create_address(sender_address, sender_nonce)
+        created_contract = tx_created_address
+        to = ""
 
     elif create_method=='create':
-        created_contract = get_create_address(create_address, create_address_nonce)
-        tx["to"] = "0x" + create_address
+        created_contract = create_created_address
+        to = "0x" + create_address
 
     elif create_method=='create2':
-        created_contract = get_create2_address(create2_address, 0, initcode)
-        tx["to"] = "0x" + create2_address
+        with stage('filler.keccak', len(initcode)):
+            created_contract = get_create2_address(create2_address, 0, initcode)
+        to = "0x" + create2_address
     else:
         raise Exception("invalid create method: {}".format(create_method))
-        
+
+    tx = new_transaction(":raw 0x" + initcode.hex(), to)
+    expect = new_expect()
     expect["result"][created_contract] = contract_result
-    
+
     filler = dict()
     filler_name = container.get_name()
     filler[filler_name] = dict()
     filler[filler_name]["_info"] = {
         "comment": "Generated using eoffuzzer, seed {}:\n{}".format(container.get_seed(), container.get_description())
     }
-    filler[filler_name]["env"] = default_env.copy()
-    filler[filler_name]["pre"] = default_pre.copy()
+    filler[filler_name]["env"] = default_env
+    filler[filler_name]["pre"] = default_pre
     filler[filler_name]["transaction"] = tx
     filler[filler_name]["expect"] = [expect]
-
+    return filler
+
+"""
+Dumps fillers in YAML format.
+Dumps of different fillers can be concatenated into a single file.
+"""
+def dump_filler(filler: Dict[str, Any]) -> str:
+    with stage('filler.dump') as st:
+        dumped = yaml.dump(filler, Dumper=FillerDumper)
+        st.nbytes = len(dumped)
+    return dumped
+
+"""
+Writes a dumped filler to its own `<name>Filler.yml` file.
+"""
+def write_filler(filler_name: str, dumped_filler: str):
     output_file_name = "{}Filler.yml".format(filler_name)
 
-    with open(output_file_name, 'w') as f:
-        yaml.dump(filler, f)
+    with stage('filler.write', len(dumped_filler)), open(output_file_name, 'w') as f:
+        f.write(dumped_filler)
 
+def generate_filler(container: Container, initcodegen: Callable[..., bytearray], create_method: str='tx') -> str:
+    filler = build_filler(container, initcodegen, create_method)
+    filler_name = container.get_name()
+    write_filler(filler_name, dump_filler(filler))
     return filler_name
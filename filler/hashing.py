@@ -0,0 +1,35 @@
+from Crypto.Hash import keccak
+
+"""
+Returns the keccak256 hash of `data`.
+"""
+def keccak256(data: bytes) -> bytes:
+    return keccak.new(data=data, digest_bits=256).digest()
+
+"""
+Encodes an integer as an RLP string.
+"""
+def rlp_encode_int(value: int) -> bytes:
+    if value == 0:
+        return b'\x80'
+    if value < 0x80:
+        return bytes([value])
+    b = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 + len(b)]) + b
+
+"""
+Returns the address of the contract created by `sender` using `nonce`, as
+`keccak256(rlp([sender, nonce]))[12:]`.
+"""
+def create_address(sender: bytes, nonce: int) -> bytes:
+    # The payload is always shorter than 56 bytes, so the list prefix is a
+    # single byte
+    payload = b'\x94' + sender + rlp_encode_int(nonce)
+    return keccak256(bytes([0xc0 + len(payload)]) + payload)[12:]
+
+"""
+Returns the address of the contract created by `deployer` using CREATE2, as
+`keccak256(0xff ++ deployer ++ salt ++ keccak256(initcode))[12:]`.
+"""
+def create2_address(deployer: bytes, salt: int, initcode: bytes) -> bytes:
+    return keccak256(b'\xff' + deployer + salt.to_bytes(32, 'big') + keccak256(initcode))[12:]
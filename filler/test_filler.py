@@ -0,0 +1,72 @@
+import copy
+import yaml
+import pytest
+import filler
+from eof.v1 import generate_container, generate_legacy_initcode, InvalidityType
+
+def test_build_filler_isolated_templates():
+    tx_template = copy.deepcopy(filler.init_transaction_template)
+    expect = copy.deepcopy(filler.expect_preset)
+    fillers = []
+    for seed in range(3):
+        c = generate_container(seed=seed, code_size=8, data_size=4, inv_type=InvalidityType(seed))
+        fillers.append(filler.build_filler(c, generate_legacy_initcode, 'create'))
+    assert filler.init_transaction_template == tx_template
+    assert filler.expect_preset == expect
+    for f in fillers:
+        test = list(f.values())[0]
+        assert len(test["transaction"]["data"]) == 1
+        assert len(test["expect"][0]["result"]) == 2
+
+def test_dump_filler_concatenated():
+    fillers = {}
+    dumped = ''
+    for seed in range(3):
+        c = generate_container(seed=seed, code_size=8, data_size=4)
+        f = filler.build_filler(c, generate_legacy_initcode, 'create2')
+        fillers.update(f)
+        dumped += filler.dump_filler(f)
+    assert yaml.safe_load(dumped) == fillers
+
+def test_sharded_filler_runs_do_not_overwrite(tmp_path):
+    import io
+    from fuzzer import FuzzerRun, stream_run
+    def run(seed, start=0, **kwargs):
+        r = FuzzerRun(seed, code_size=8, data_size=4, inv_type=-1, initcode_f=generate_legacy_initcode, filler=True, filler_shard_size=4, filler_directory=str(tmp_path), **kwargs)
+        return stream_run(io.BytesIO(), r, count=6, start=start)
+    run(1)
+    run(2)
+    # Resumed run
+    run(1, start=6)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        'eofV1Fuzz_1_0_000000Filler.yml', 'eofV1Fuzz_1_0_000001Filler.yml',
+        'eofV1Fuzz_1_6_000000Filler.yml', 'eofV1Fuzz_1_6_000001Filler.yml',
+        'eofV1Fuzz_2_0_000000Filler.yml', 'eofV1Fuzz_2_0_000001Filler.yml',
+    ]
+    with pytest.raises(Exception, match="already exists"):
+        run(1)
+    run(1, filler_overwrite=True)
+    run(1, filler_prefix='custom_')
+    assert (tmp_path / 'custom_000001Filler.yml').exists()
+
+def test_rlp_encode_int():
+    from filler.hashing import rlp_encode_int
+    assert [rlp_encode_int(v) for v in [0, 1, 0x7f, 0x80, 0x400]] == [b'\x80', b'\x01', b'\x7f', b'\x81\x80', b'\x82\x04\x00']
+
+@pytest.mark.parametrize("sender,nonce,address", [
+    ("6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", 0, "cd234a471b72ba2f1ccf0a70fcaba648a5eecd8d"),
+    ("6ac7ea33f8831ea9dcc53393aaa88b25a785dbf0", 1, "343c43a37d37dff08ae8c4a11544c718abb4fcf8"),
+])
+def test_create_address(sender, nonce, address):
+    from filler.hashing import create_address
+    assert create_address(bytes.fromhex(sender), nonce).hex() == address
+
+# Examples of EIP-1014
+@pytest.mark.parametrize("deployer,salt,initcode,address", [
+    ("0000000000000000000000000000000000000000", 0, "00", "4d1a2e2bb4f88f0250f26ffff098b0b30b26bf38"),
+    ("00000000000000000000000000000000deadbeef", 0xcafebabe, "deadbeef", "60f3f640a8508fc6a86d45df051962668e1e8ac7"),
+    ("0000000000000000000000000000000000000000", 0, "", "e33c0c7f7df4809055c3eba6c09cfe4baf1bd9e0"),
+])
+def test_create2_address(deployer, salt, initcode, address):
+    from filler.hashing import create2_address
+    assert create2_address(bytes.fromhex(deployer), salt, bytes.fromhex(initcode)).hex() == address
@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+from typing import List, Optional
+
+"""
+Default number of tests packed into each filler file.
+"""
+DEFAULT_SHARD_SIZE = 1000
+
+"""
+Maximum number of tests waiting to be written, which bounds memory use when
+the disk is slower than the generation.
+"""
+QUEUE_SIZE = 4096
+
+class ShardedFillerWriter(object):
+    """
+    Writes dumped filler tests, packing `shard_size` tests per file.
+    Files are written by a background thread, so generation does not wait for
+    the disk, and are named `<prefix><shard number>Filler.yml`.
+    Existing files are not overwritten unless `overwrite` is set: the writer
+    fails instead.
+    """
+    directory: str
+    prefix: str
+    shard_size: int
+    overwrite: bool
+    """
+    Names of the files written so far.
+    """
+    files: List[str]
+
+    def __init__(self, directory: str='.', prefix: str='eofV1Fuzz', shard_size: int=DEFAULT_SHARD_SIZE, overwrite: bool=False):
+        if shard_size < 1:
+            raise Exception("invalid shard size: {}".format(shard_size))
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.overwrite = overwrite
+        self.files = []
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='filler-writer', daemon=True)
+        self._thread.start()
+
+    """
+    Queues a test, as returned by `filler.dump_filler`, to be written.
+    """
+    def write(self, dumped_filler: str):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(dumped_filler)
+
+    """
+    Writes the remaining tests and waits for the background thread.
+    """
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write_shard(self, shard: List[str]):
+        name = "{}{:06d}Filler.yml".format(self.prefix, len(self.files))
+        path = os.path.join(self.directory, name)
+        try:
+            f = open(path, 'w' if self.overwrite else 'x')
+        except FileExistsError:
+            raise Exception("filler file already exists: {}".format(path))
+        with f:
+            f.write(''.join(shard))
+        self.files.append(name)
+
+    def _run(self):
+        shard = []
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self._error is not None:
+                # Keep draining so producers are never blocked
+                continue
+            shard.append(item)
+            if len(shard) == self.shard_size:
+                try:
+                    self._write_shard(shard)
+                except BaseException as e:
+                    self._error = e
+                shard = []
+        if shard and self._error is None:
+            try:
+                self._write_shard(shard)
+            except BaseException as e:
+                self._error = e
@@ -0,0 +1,389 @@
+import hashlib
+import itertools
+import os
+import sys
+import time
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+from eof import Container
+from fuzzer.dedup import DedupIndex
+import metrics
+from metrics import stage
+
+"""
+Size of the buffer used to stream the generated containers.
+"""
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+"""
+Number of containers rendered by a single unit of work.
+"""
+CHUNK_SIZE = 64
+
+"""
+Opens the binary writer used to stream the fuzzer output.
+`None` or `-` write to the standard output.
+If `offset` is set, the file is truncated to `offset` bytes and appended to,
+instead of being replaced.
+"""
+def open_output(path: Optional[str]=None, offset: Optional[int]=None) -> BinaryIO:
+    if path is None or path == '-':
+        sys.stdout.flush()
+        return open(sys.stdout.fileno(), 'wb', buffering=OUTPUT_BUFFER_SIZE, closefd=False)
+    if offset is None or not os.path.exists(path):
+        if offset:
+            raise Exception("output to resume does not exist: {}".format(path))
+        return open(path, 'wb', buffering=OUTPUT_BUFFER_SIZE)
+    out = open(path, 'r+b', buffering=OUTPUT_BUFFER_SIZE)
+    if out.seek(0, os.SEEK_END) < offset:
+        out.close()
+        raise Exception("output is shorter than the saved cursor: {}".format(path))
+    out.truncate(offset)
+    out.seek(offset)
+    return out
+
+"""
+Path of the corpus written by a run resumed at position `start`,
+`<name>.<start><ext>`: a corpus cannot be appended to, so every resumed
+segment is a complete corpus of its own.
+"""
+def segment_path(path: str, start: int) -> str:
+    root, ext = os.path.splitext(path)
+    return '{}.{}{}'.format(root, start, ext)
+
+"""
+Derives the seed of the container at position `index` of a run started
+with `master_seed`.
+The derivation only depends on both numbers, so any container of the run can
+be reproduced in isolation, regardless of how the run was split.
+The first container uses the master seed itself, so it is the container a
+single, unstreamed fuzzer run generates from the same seed.
+"""
+def derive_seed(master_seed: int, index: int) -> int:
+    if index == 0:
+        return master_seed
+    h = hashlib.blake2b('{}:{}'.format(master_seed, index).encode(), digest_size=8)
+    return int.from_bytes(h.digest(), 'big')
+
+"""
+Stops iterating over `items` once `duration` seconds have elapsed.
+"""
+def limit_duration(items: Iterable, duration: Optional[float]=None) -> Iterator:
+    if duration is None:
+        yield from items
+        return
+    deadline = time.monotonic() + duration
+    for item in items:
+        if time.monotonic() >= deadline:
+            return
+        yield item
+
+"""
+Splits the run into consecutive `(start, stop)` index ranges, beginning at
+index `first`.
+The sequence is unbounded unless `count` is specified.
+"""
+def chunk_ranges(count: Optional[int]=None, chunk_size: int=CHUNK_SIZE, first: int=0) -> Iterator[Tuple[int, int]]:
+    for start in itertools.count(first, chunk_size):
+        if count is not None:
+            if start >= first + count:
+                return
+            yield (start, min(start + chunk_size, first + count))
+        else:
+            yield (start, start + chunk_size)
+
+"""
+Formats a single container as one output line.
+The line contains the hex of the container, followed by the hex of the
+initcode if `initcode_f` is set.
+If `filler` is set, the filler file is written and its name is returned
+instead.
+"""
+def format_container(c: Container, initcode_f: Optional[Callable[[bytearray], bytearray]]=None, filler: bool=False, create_method: str='tx') -> bytes:
+    if filler:
+        from filler import generate_filler
+        return generate_filler(c, initcode_f, create_method).encode() + b'\n'
+    code = c.build()
+    if initcode_f is None:
+        return code.hex().encode() + b'\n'
+    return (code.hex() + ' ' + initcode_f(code).hex()).encode() + b'\n'
+
+class FuzzerRun(object):
+    """
+    Seed from which the seed of every container in the run is derived.
+    """
+    seed: int
+    code_size: Optional[int]=None
+    data_size: Optional[int]=None
+    """
+    Invalidity type of every container, or `-1`/`-2` to pick a random one
+    per container.
+    """
+    inv_type: Optional[int]=None
+    initcode_f: Optional[Callable[[bytearray], bytearray]]=None
+    filler: bool=False
+    create_method: str='tx'
+    """
+    Number of filler tests packed per file, or None to write one file per
+    test.
+    """
+    filler_shard_size: Optional[int]=None
+    """
+    Directory of the packed filler files, and prefix of their names, which
+    defaults to one made of the seed, the shard and the start position of
+    the run, so separate runs do not write the same files.
+    Existing files are only replaced if `filler_overwrite` is set.
+    """
+    filler_directory: str='.'
+    filler_prefix: Optional[str]=None
+    filler_overwrite: bool=False
+    """
+    Enumerate the generation space (see `fuzzer.enumeration`) instead of
+    picking random invalidity types and sizes, covering the points assigned
+    to `shard` out of `shards`.
+    """
+    enumeration: bool=False
+    shard: int=0
+    shards: int=1
+    """
+    Output format: `hex` lines, or a binary `corpus` (see `corpus`)
+    compressed with `compression`.
+    """
+    output_format: str='hex'
+    compression: Optional[str]=None
+    """
+    How code sections are filled, one of `eof.v1.CODE_MODES`.
+    """
+    code_mode: str='random'
+
+    def __init__(self, seed: int, code_size: Optional[int]=None, data_size: Optional[int]=None, inv_type: Optional[int]=None, initcode_f: Optional[Callable[[bytearray], bytearray]]=None, filler: bool=False, create_method: str='tx', filler_shard_size: Optional[int]=None, output_format: str='hex', compression: Optional[str]=None, enumeration: bool=False, shard: int=0, shards: int=1, code_mode: str='random', filler_directory: str='.', filler_prefix: Optional[str]=None, filler_overwrite: bool=False):
+        self.seed = seed
+        self.code_size = code_size
+        self.data_size = data_size
+        self.inv_type = inv_type
+        self.initcode_f = initcode_f
+        self.filler = filler
+        self.create_method = create_method
+        self.filler_shard_size = filler_shard_size
+        self.output_format = output_format
+        self.compression = compression
+        self.enumeration = enumeration
+        self.shard = shard
+        self.shards = shards
+        self.code_mode = code_mode
+        self.filler_directory = filler_directory
+        self.filler_prefix = filler_prefix
+        self.filler_overwrite = filler_overwrite
+
+    """
+    Prefix of the names of the filler files packed by a run started at
+    position `start`.
+    """
+    def filler_shard_prefix(self, start: int) -> str:
+        if self.filler_prefix is not None:
+            return self.filler_prefix
+        prefix = 'eofV1Fuzz_{:x}_'.format(self.seed)
+        if self.shards > 1:
+            prefix += '{}of{}_'.format(self.shard, self.shards)
+        return prefix + '{}_'.format(start)
+
+    """
+    Lazily generates the containers at positions `[start, stop)` of the run.
+    """
+    def containers(self, start: int, stop: int) -> Iterator[Container]:
+        if self.enumeration:
+            from fuzzer.enumeration import enumerated_containers
+            return enumerated_containers(self.seed, start, stop, self.shard, self.shards, self.code_mode)
+        from eof.v1 import generate_containers
+        seeds = (derive_seed(self.seed, i) for i in range(start, stop))
+        return generate_containers(seeds, code_size=self.code_size, data_size=self.data_size, inv_type=self.inv_type, code_mode=self.code_mode)
+
+    """
+    Renders the output lines of the containers at positions `[start, stop)`.
+    """
+    def render(self, start: int, stop: int) -> bytes:
+        return b''.join(format_container(c, self.initcode_f, self.filler, self.create_method) for c in self.containers(start, stop))
+
+    """
+    Dumps the filler tests of the containers at positions `[start, stop)`,
+    returning the output lines with their names and the dumped tests.
+    """
+    def render_fillers(self, start: int, stop: int) -> Tuple[bytes, List[str]]:
+        from filler import build_filler, dump_filler
+        lines = []
+        fillers = []
+        for c in self.containers(start, stop):
+            fillers.append(dump_filler(build_filler(c, self.initcode_f, self.create_method)))
+            lines.append(c.get_name().encode() + b'\n')
+        return (b''.join(lines), fillers)
+
+    """
+    Produces the corpus entries `(code, seed, inv_type, valid)` of the
+    containers at positions `[start, stop)`.
+    Filler tests are also written, or dumped and returned when sharded.
+    """
+    def render_entries(self, start: int, stop: int) -> Tuple[List[Tuple[bytes, int, int, bool]], List[str]]:
+        entries = []
+        fillers = []
+        for c in self.containers(start, stop):
+            entries.append((bytes(c.build()), c.get_seed(), int(c.inv_type), c.is_valid()))
+            if self.filler:
+                from filler import build_filler, dump_filler, generate_filler
+                if self.filler_shard_size is not None:
+                    fillers.append(dump_filler(build_filler(c, self.initcode_f, self.create_method)))
+                else:
+                    generate_filler(c, self.initcode_f, self.create_method)
+        return (entries, fillers)
+
+    """
+    Renders the containers at positions `[start, stop)` one by one, as
+    `(keccak256, output, dumped filler, name)` tuples, so they can be
+    deduplicated before being written.
+    The output is the corpus entry, or the output line, of the container.
+    """
+    def render_items(self, start: int, stop: int) -> List[Tuple[bytes, Union[bytes, Tuple[bytes, int, int, bool]], Optional[str], str]]:
+        items = []
+        for c in self.containers(start, stop):
+            dumped = None
+            if self.filler:
+                from filler import build_filler, dump_filler
+                dumped = dump_filler(build_filler(c, self.initcode_f, self.create_method))
+            if self.output_format == 'corpus':
+                output = (bytes(c.build()), c.get_seed(), int(c.inv_type), c.is_valid())
+            elif self.filler:
+                output = c.get_name().encode() + b'\n'
+            else:
+                output = format_container(c, self.initcode_f)
+            items.append((bytes(c.keccak256()), output, dumped, c.get_name()))
+        return items
+
+def _render_chunk(run: FuzzerRun, start: int, stop: int, per_container: bool=False) -> Tuple[int, Union[bytes, List], List[str]]:
+    if per_container:
+        return (stop - start, run.render_items(start, stop), [])
+    if run.output_format == 'corpus':
+        entries, fillers = run.render_entries(start, stop)
+        return (stop - start, entries, fillers)
+    if run.filler and run.filler_shard_size is not None:
+        lines, fillers = run.render_fillers(start, stop)
+        return (stop - start, lines, fillers)
+    return (stop - start, run.render(start, stop), [])
+
+"""
+Streams the output of `run` to `out`, spreading the work over `jobs`
+processes (all available cores if `jobs` is 0).
+Output is always written in run order, so it is byte-identical for any
+number of jobs.
+Sharded filler tests are dumped by the workers and packed into files by a
+background writer.
+With the `corpus` output format, the corpus index is written once the run
+ends.
+If a `dedup` index is given, containers already in it are dropped before
+being written, and the remaining ones are added to it.
+The run starts at position `start`, and `progress` is called with the
+position following the last written chunk.
+Returns the number of containers written.
+"""
+def stream_run(out: BinaryIO, run: FuzzerRun, count: Optional[int]=None, duration: Optional[float]=None, jobs: int=1, dedup: Optional[DedupIndex]=None, start: int=0, progress: Optional[Callable[[int], None]]=None) -> int:
+    from parallel import imap_ordered
+    corpus = None
+    if run.output_format == 'corpus':
+        from corpus import CorpusWriter
+        corpus = CorpusWriter(out, compression=run.compression)
+    writer = None
+    if run.filler and run.filler_shard_size is not None:
+        from filler.writer import ShardedFillerWriter
+        writer = ShardedFillerWriter(run.filler_directory, run.filler_shard_prefix(start), run.filler_shard_size, run.filler_overwrite)
+    chunks = limit_duration(chunk_ranges(count, first=start), duration)
+    position = start
+    written = 0
+    committed = 0
+    try:
+        for n, output, fillers in imap_ordered(_render_chunk, ((run, start, stop, dedup is not None) for start, stop in chunks), jobs):
+            with stage('write') as st:
+                if dedup is not None:
+                    unique = write_unique(output, dedup, out, corpus, writer)
+                    metrics.count('containers.duplicate', n - unique)
+                    written += unique
+                else:
+                    if corpus is not None:
+                        for e in output:
+                            corpus.write(*e)
+                    else:
+                        out.write(output)
+                        st.nbytes = len(output)
+                    for f in fillers:
+                        writer.write(f)
+                    written += n
+            metrics.count('containers', n)
+            position += n
+            if corpus is not None:
+                committed = corpus.count
+            if progress is not None:
+                progress(position)
+    finally:
+        if writer is not None:
+            writer.close()
+        if corpus is not None:
+            # Entries of an interrupted chunk are not indexed, so the corpus
+            # ends at the position reported to `progress`
+            corpus.discard(committed)
+            corpus.close()
+    out.flush()
+    return written
+
+"""
+Writes the items rendered by `FuzzerRun.render_items` which are not in the
+`dedup` index yet.
+Returns the number of items written.
+"""
+def write_unique(items: List[Tuple[bytes, Union[bytes, Tuple[bytes, int, int, bool]], Optional[str], str]], dedup: DedupIndex, out: BinaryIO, corpus=None, writer=None) -> int:
+    written = 0
+    for digest, output, dumped, name in items:
+        if not dedup.add(digest):
+            continue
+        if corpus is not None:
+            corpus.write(*output)
+        else:
+            out.write(output)
+        if dumped is not None:
+            if writer is not None:
+                writer.write(dumped)
+            else:
+                from filler import write_filler
+                write_filler(name, dumped)
+        written += 1
+    return written
+
+"""
+Streams `run` to the file at `path` like `stream_run`, saving the position
+reached to `cursor`, along with the size of the output.
+If `resume` is set, the run continues the output of a previous run which
+stopped at position `start`: hex output is truncated to the size saved with
+the cursor, dropping anything written past it, and appended to, while a
+corpus is written to a new segment (see `segment_path`).
+Returns the number of containers written.
+"""
+def stream_to_path(path: Optional[str], run: FuzzerRun, cursor=None, start: int=0, resume: bool=False, count: Optional[int]=None, duration: Optional[float]=None, jobs: int=1, dedup: Optional[DedupIndex]=None) -> int:
+    offset = None
+    if resume and path is not None and path != '-':
+        if run.output_format == 'corpus':
+            path = segment_path(path, start)
+        elif cursor is not None and cursor.offset is not None:
+            offset = cursor.offset
+        else:
+            offset = os.path.getsize(path) if os.path.exists(path) else 0
+    position = start
+    try:
+        with open_output(path, offset) as out:
+            truncatable = run.output_format != 'corpus' and out.seekable()
+            offset = out.tell() if truncatable else None
+            def progress(p):
+                nonlocal position, offset
+                position = p
+                if truncatable:
+                    offset = out.tell()
+                if cursor is not None:
+                    cursor.update(p, out.flush, offset)
+            return stream_run(out, run, count=count, duration=duration, jobs=jobs, dedup=dedup, start=start, progress=progress)
+    finally:
+        if cursor is not None:
+            cursor.save(position, offset)
@@ -0,0 +1,152 @@
+import os
+import struct
+import tempfile
+from typing import Optional
+
+"""
+Deduplication of generated containers by their keccak256 hash.
+
+Hashes are kept in an exact set until it would use more than the configured
+memory, and then moved into a Bloom filter of that size, which can drop a
+small fraction of unique containers as duplicates but never grows.
+The index can be saved and loaded, so duplicates are also dropped across
+runs.
+"""
+
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+
+"""
+Approximate memory used by each hash kept in the exact set.
+"""
+ENTRY_MEMORY = 128
+
+"""
+Number of bits set per hash in the Bloom filter, which gives a false
+positive rate around 1% once it holds one hash per 10 bits.
+"""
+BLOOM_HASHES = 7
+
+DEDUP_MAGIC = b'EOFD'
+DEDUP_VERSION = 1
+HEADER = struct.Struct('<4sBBxxQ')
+MODE_EXACT = 0
+MODE_BLOOM = 1
+
+class DedupIndex(object):
+    max_memory: int
+    """
+    Number of hashes added, and of duplicates found.
+    """
+    added: int
+    duplicates: int
+
+    def __init__(self, max_memory: int=DEFAULT_MAX_MEMORY):
+        self.max_memory = max_memory
+        self.added = 0
+        self.duplicates = 0
+        self._hashes = set()
+        self._bloom: Optional[bytearray] = None
+        self._bloom_bits = 0
+
+    """
+    Returns true if the index holds the hashes in a Bloom filter.
+    """
+    def is_approximate(self) -> bool:
+        return self._bloom is not None
+
+    def _bloom_positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[0:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        for i in range(BLOOM_HASHES):
+            yield (h1 + i * h2) % self._bloom_bits
+
+    def _to_bloom(self, bits: int):
+        self._bloom_bits = bits
+        self._bloom = bytearray((bits + 7) // 8)
+        for digest in self._hashes:
+            self._bloom_add(digest)
+        self._hashes = set()
+
+    def _bloom_add(self, digest: bytes) -> bool:
+        bloom = self._bloom
+        new = False
+        for p in self._bloom_positions(digest):
+            mask = 1 << (p & 7)
+            if not bloom[p >> 3] & mask:
+                bloom[p >> 3] |= mask
+                new = True
+        return new
+
+    """
+    Adds the keccak256 `digest` of a container.
+    Returns false if it was already in the index.
+    """
+    def add(self, digest: bytes) -> bool:
+        if self._bloom is not None:
+            new = self._bloom_add(digest)
+        else:
+            new = not digest in self._hashes
+            if new:
+                self._hashes.add(bytes(digest))
+                if len(self._hashes) * ENTRY_MEMORY > self.max_memory:
+                    self._to_bloom(self.max_memory * 8)
+        if new:
+            self.added += 1
+        else:
+            self.duplicates += 1
+        return new
+
+    def __contains__(self, digest: bytes) -> bool:
+        if self._bloom is not None:
+            return all(self._bloom[p >> 3] & (1 << (p & 7)) for p in self._bloom_positions(digest))
+        return digest in self._hashes
+
+    """
+    Saves the index to `path`, atomically replacing it.
+    """
+    def save(self, path: str):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if self._bloom is not None:
+                    f.write(HEADER.pack(DEDUP_MAGIC, DEDUP_VERSION, MODE_BLOOM, self._bloom_bits))
+                    f.write(self._bloom)
+                else:
+                    f.write(HEADER.pack(DEDUP_MAGIC, DEDUP_VERSION, MODE_EXACT, len(self._hashes)))
+                    f.write(b''.join(self._hashes))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    """
+    Loads an index saved by `save`.
+    An exact index larger than `max_memory` is moved into a Bloom filter,
+    while a Bloom filter keeps its saved size.
+    """
+    @classmethod
+    def load(cls, path: str, max_memory: int=DEFAULT_MAX_MEMORY) -> 'DedupIndex':
+        index = cls(max_memory)
+        with open(path, 'rb') as f:
+            magic, version, mode, size = HEADER.unpack(f.read(HEADER.size))
+            if magic != DEDUP_MAGIC or version != DEDUP_VERSION:
+                raise Exception("invalid dedup index: {}".format(path))
+            data = f.read()
+        if mode == MODE_BLOOM:
+            index._bloom_bits = size
+            index._bloom = bytearray(data)
+        elif mode == MODE_EXACT:
+            index._hashes = set(data[i:i+32] for i in range(0, size * 32, 32))
+            if len(index._hashes) * ENTRY_MEMORY > max_memory:
+                index._to_bloom(max_memory * 8)
+        else:
+            raise Exception("invalid dedup index: {}".format(path))
+        return index
+
+"""
+Loads the index at `path` if it exists, or creates an empty one.
+"""
+def open_dedup_index(path: Optional[str]=None, max_memory: int=DEFAULT_MAX_MEMORY) -> DedupIndex:
+    if path is not None and os.path.exists(path):
+        return DedupIndex.load(path, max_memory)
+    return DedupIndex(max_memory)
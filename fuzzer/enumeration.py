@@ -0,0 +1,172 @@
+import os
+import tempfile
+import time
+from typing import Callable, Iterator, Optional, Tuple
+from eof.v1 import MAX_CODE_SIZE, ContainerV1, InvalidityType, generate_container
+from fuzzer import derive_seed
+
+"""
+Exhaustive enumeration of the generation space.
+
+Every point of the space is a combination of invalidity types and a size
+class for both the code and the data sections. Points are numbered so that
+the invalidity types vary fastest, and the index of a container in the
+enumeration determines its point and, along with the run seed, its random
+bytes. Repeating the enumeration over several rounds covers every point once
+per round, each time with different bytes.
+"""
+
+"""
+Size classes of a section: empty, a single byte, exactly filling the
+container up to `MAX_CODE_SIZE`, and overflowing it by a byte.
+"""
+SIZE_CLASSES = ('zero', 'one', 'fit', 'overflow')
+
+"""
+Bytes used by the magic, version, terminator and the headers of the code and
+data sections.
+"""
+CONTAINER_OVERHEAD = 3 + 3 * 2 + 1
+
+INVALIDITY_COMBINATIONS = int(InvalidityType.MAX_INVALIDITY)
+SPACE_SIZE = INVALIDITY_COMBINATIONS * len(SIZE_CLASSES) ** 2
+
+"""
+Returns the `(inv_type, code size class, data size class)` of the point at
+`index` of the enumeration.
+"""
+def space_point(index: int) -> Tuple[InvalidityType, str, str]:
+    index %= SPACE_SIZE
+    inv_type = InvalidityType(index % INVALIDITY_COMBINATIONS)
+    index //= INVALIDITY_COMBINATIONS
+    code_class = SIZE_CLASSES[index % len(SIZE_CLASSES)]
+    data_class = SIZE_CLASSES[index // len(SIZE_CLASSES)]
+    return (inv_type, code_class, data_class)
+
+"""
+Resolves the size classes of the code and data sections to sizes.
+A section that fits uses the space left by the other one, and both share it
+if both fit.
+"""
+def section_sizes(code_class: str, data_class: str) -> Tuple[int, int]:
+    space = MAX_CODE_SIZE - CONTAINER_OVERHEAD
+    fixed = {'zero': 0, 'one': 1}
+    if code_class in fixed and data_class in fixed:
+        return (fixed[code_class], fixed[data_class])
+    if code_class in fixed:
+        code_size = fixed[code_class]
+        data_size = space - code_size
+    elif data_class in fixed:
+        data_size = fixed[data_class]
+        code_size = space - data_size
+    else:
+        code_size = (space + 1) // 2
+        data_size = space // 2
+    if code_class == 'overflow':
+        code_size += 1
+    if data_class == 'overflow':
+        data_size += 1
+    return (code_size, data_size)
+
+"""
+Returns the number of points of an enumeration of `rounds` rounds that are
+assigned to `shard` out of `shards`.
+"""
+def shard_count(shard: int=0, shards: int=1, rounds: int=1) -> int:
+    return (SPACE_SIZE * rounds - shard + shards - 1) // shards
+
+"""
+Maps a position within a shard to the index in the whole enumeration.
+Shards are interleaved, so any prefix of a shard covers the invalidity types
+as evenly as the whole enumeration.
+"""
+def shard_index(position: int, shard: int=0, shards: int=1) -> int:
+    return position * shards + shard
+
+"""
+Lazily generates the containers at positions `[start, stop)` of a shard of
+the enumeration.
+"""
+def enumerated_containers(seed: int, start: int, stop: int, shard: int=0, shards: int=1, code_mode: str='random') -> Iterator[ContainerV1]:
+    for position in range(start, stop):
+        index = shard_index(position, shard, shards)
+        inv_type, code_class, data_class = space_point(index)
+        code_size, data_size = section_sizes(code_class, data_class)
+        yield generate_container(seed=derive_seed(seed, index), code_size=code_size, data_size=data_size, inv_type=inv_type, code_mode=code_mode)
+
+"""
+Parses a `K/N` shard specification.
+"""
+def parse_shard(spec: str) -> Tuple[int, int]:
+    shard, _, shards = spec.partition('/')
+    shard, shards = int(shard), int(shards or 1)
+    if shards < 1 or not 0 <= shard < shards:
+        raise Exception("invalid shard: {}".format(spec))
+    return (shard, shards)
+
+"""
+Minimum number of seconds between two saves of a cursor.
+"""
+CURSOR_INTERVAL = 1.0
+
+class Cursor(object):
+    """
+    Position of a shard in the enumeration, saved to a file so an interrupted
+    run can be resumed.
+    """
+    path: str
+    """
+    Size of the output when the position was saved, for outputs which can be
+    truncated back to it, as loaded by `load`.
+    """
+    offset: Optional[int]=None
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = None
+        self._last_save = 0.0
+
+    """
+    Returns the saved position, or 0 if there is none.
+    """
+    def load(self) -> int:
+        self.offset = None
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path) as f:
+            fields = f.read().split()
+        if len(fields) > 1:
+            self.offset = int(fields[1])
+        return int(fields[0]) if fields else 0
+
+    """
+    Saves the position, and the size of the output, atomically replacing the
+    file.
+    """
+    def save(self, position: int, offset: Optional[int]=None):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                if offset is None:
+                    f.write('{}\n'.format(position))
+                else:
+                    f.write('{} {}\n'.format(position, offset))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._last_save = time.monotonic()
+
+    """
+    Saves the position unless it was saved less than `CURSOR_INTERVAL`
+    seconds ago, calling `flush` first so the output is never behind the
+    saved position.
+    Returns true if it was saved.
+    """
+    def update(self, position: int, flush: Optional[Callable[[], None]]=None, offset: Optional[int]=None) -> bool:
+        if time.monotonic() - self._last_save < CURSOR_INTERVAL:
+            return False
+        if flush is not None:
+            flush()
+        self.save(position, offset)
+        return True
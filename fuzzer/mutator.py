@@ -0,0 +1,193 @@
+import random
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+from eof.v1 import EOF_HEADER_TERMINATOR, MAX_CODE_SIZE, SectionKindV1
+
+"""
+Default maximum number of mutations stacked on a single mutant.
+"""
+MAX_STACKED_MUTATIONS = 4
+
+"""
+Default extra room, over the largest corpus entry, that mutants can grow by.
+"""
+GROWTH_MARGIN = MAX_CODE_SIZE
+
+"""
+Scans the section headers of an EOF container, tolerating invalid input.
+Returns the offsets of the section headers and the offset of the header
+terminator, or None if there is no terminator.
+"""
+def scan_header(buf: Union[bytes, bytearray, memoryview], n: int) -> Tuple[List[int], Optional[int]]:
+    headers = []
+    pos = 3
+    while pos + 2 < n and buf[pos] != EOF_HEADER_TERMINATOR:
+        headers.append(pos)
+        pos += 3
+    if pos < n and buf[pos] == EOF_HEADER_TERMINATOR:
+        return (headers, pos)
+    return (headers, None)
+
+"""
+Returns the `(kind, body)` of every section of a container whose body is
+fully present, to be spliced into other containers.
+"""
+def extract_sections(code: bytes) -> List[Tuple[int, bytes]]:
+    headers, terminator = scan_header(code, len(code))
+    if terminator is None:
+        return []
+    sections = []
+    pos = terminator + 1
+    for h in headers:
+        size = (code[h+1] << 8) | code[h+2]
+        if pos + size > len(code):
+            break
+        sections.append((code[h], code[pos:pos+size]))
+        pos += size
+    return sections
+
+class Mutator(object):
+    """
+    Produces mutants of the containers in a corpus.
+    Every mutant is written in place into a single preallocated buffer, which
+    is overwritten by the next mutant, and the sequence of mutants only
+    depends on the corpus and the seed.
+    """
+    corpus: List[bytes]
+    seed: int
+    max_stacked: int
+    """
+    Names of the mutations applied to the last mutant.
+    """
+    last_mutations: List[str]
+
+    def __init__(self, corpus: Iterable[Union[bytes, bytearray]], seed: int, max_stacked: int=MAX_STACKED_MUTATIONS, growth: int=GROWTH_MARGIN):
+        self.corpus = [bytes(c) for c in corpus]
+        if not self.corpus:
+            raise Exception("empty corpus")
+        self.seed = seed
+        self.max_stacked = max_stacked
+        self.last_mutations = []
+        self._random = random.Random(seed)
+        self._buf = bytearray(max(len(c) for c in self.corpus) + growth)
+        self._view = memoryview(self._buf)
+        # Sections available for splicing, extracted once from the corpus
+        self._donors = [s for c in self.corpus for s in extract_sections(c)]
+        self._mutations = [
+            ('flip_bit', self._flip_bit),
+            ('set_byte', self._set_byte),
+            ('flip_kind', self._flip_kind),
+            ('perturb_size', self._perturb_size),
+            ('splice_section', self._splice_section),
+            ('insert_terminator', self._insert_terminator),
+            ('remove_terminator', self._remove_terminator),
+            ('truncate', self._truncate),
+            ('append_bytes', self._append_bytes),
+        ]
+
+    """
+    Produces the next mutant.
+    The returned view is only valid until the next call.
+    """
+    def mutate(self) -> memoryview:
+        r = self._random
+        src = self.corpus[r.randrange(len(self.corpus))]
+        n = len(src)
+        self._buf[:n] = src
+        self.last_mutations = []
+        for _ in range(r.randint(1, self.max_stacked)):
+            name, mutation = self._mutations[r.randrange(len(self._mutations))]
+            n = mutation(n)
+            self.last_mutations.append(name)
+        return self._view[:n]
+
+    """
+    Produces `count` mutants as bytes.
+    """
+    def mutants(self, count: int) -> Iterator[bytes]:
+        for _ in range(count):
+            yield bytes(self.mutate())
+
+    def _insert(self, pos: int, data: bytes, n: int) -> int:
+        if n + len(data) > len(self._buf):
+            return n
+        self._buf[pos+len(data):n+len(data)] = self._buf[pos:n]
+        self._buf[pos:pos+len(data)] = data
+        return n + len(data)
+
+    def _delete(self, pos: int, length: int, n: int) -> int:
+        self._buf[pos:n-length] = self._buf[pos+length:n]
+        return n - length
+
+    def _flip_bit(self, n: int) -> int:
+        if n:
+            self._buf[self._random.randrange(n)] ^= 1 << self._random.randrange(8)
+        return n
+
+    def _set_byte(self, n: int) -> int:
+        if n:
+            self._buf[self._random.randrange(n)] = self._random.randrange(256)
+        return n
+
+    def _flip_kind(self, n: int) -> int:
+        headers, _ = scan_header(self._buf, n)
+        if headers:
+            h = self._random.choice(headers)
+            kind = self._buf[h]
+            if kind == SectionKindV1.CODE:
+                kind = SectionKindV1.DATA
+            elif kind == SectionKindV1.DATA:
+                kind = SectionKindV1.CODE
+            else:
+                kind = self._random.randrange(1, 256)
+            self._buf[h] = kind
+        return n
+
+    def _perturb_size(self, n: int) -> int:
+        headers, _ = scan_header(self._buf, n)
+        if headers:
+            r = self._random
+            h = r.choice(headers)
+            size = (self._buf[h+1] << 8) | self._buf[h+2]
+            choice = r.randrange(4)
+            if choice == 0:
+                size += r.choice([-1, 1])
+            elif choice == 1:
+                size += r.randint(-16, 16)
+            elif choice == 2:
+                size = r.choice([0, 1, 0xffff])
+            else:
+                size = r.randrange(0x10000)
+            size &= 0xffff
+            self._buf[h+1] = size >> 8
+            self._buf[h+2] = size & 0xff
+        return n
+
+    def _splice_section(self, n: int) -> int:
+        _, terminator = scan_header(self._buf, n)
+        if terminator is None or not self._donors:
+            return n
+        kind, body = self._donors[self._random.randrange(len(self._donors))]
+        if n + 3 + len(body) > len(self._buf):
+            return n
+        n = self._insert(terminator, bytes([kind, len(body) >> 8, len(body) & 0xff]), n)
+        return self._insert(n, body, n)
+
+    def _insert_terminator(self, n: int) -> int:
+        headers, _ = scan_header(self._buf, n)
+        if headers:
+            return self._insert(self._random.choice(headers), b'\x00', n)
+        return n
+
+    def _remove_terminator(self, n: int) -> int:
+        _, terminator = scan_header(self._buf, n)
+        if terminator is not None:
+            return self._delete(terminator, 1, n)
+        return n
+
+    def _truncate(self, n: int) -> int:
+        if n:
+            return self._random.randrange(n)
+        return n
+
+    def _append_bytes(self, n: int) -> int:
+        return self._insert(n, self._random.randbytes(self._random.randint(1, 4)), n)
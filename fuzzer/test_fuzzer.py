@@ -0,0 +1,144 @@
+import io
+import pytest
+from eof.v1 import InvalidityType, generate_container, select_invalidity_type
+from fuzzer import FuzzerRun, derive_seed, stream_run
+
+def test_stream_run_jobs():
+    run = FuzzerRun(0x1234, code_size=8, data_size=4, inv_type=-1)
+    outputs = []
+    for jobs in [1, 2, 3]:
+        out = io.BytesIO()
+        assert stream_run(out, run, count=200, jobs=jobs) == 200
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert len(outputs[0].splitlines()) == 200
+
+def test_stream_run_reproducible_container():
+    run = FuzzerRun(0x1234, code_size=8, data_size=4, inv_type=-1)
+    out = io.BytesIO()
+    stream_run(out, run, count=10)
+    lines = out.getvalue().splitlines()
+    for i in [0, 9]:
+        seed = derive_seed(0x1234, i)
+        c = generate_container(seed=seed, code_size=8, data_size=4, inv_type=select_invalidity_type(seed, -1))
+        assert lines[i] == c.build().hex().encode()
+
+def test_stream_run_first_container_uses_seed():
+    run = FuzzerRun(0x10, inv_type=-1)
+    out = io.BytesIO()
+    stream_run(out, run, count=1)
+    c = generate_container(seed=0x10, inv_type=select_invalidity_type(0x10, -1))
+    assert out.getvalue() == c.build().hex().encode() + b'\n'
+
+def test_mutator_reproducible():
+    from fuzzer.mutator import Mutator
+    corpus = [generate_container(seed=seed, code_size=16, data_size=8).build() for seed in range(8)]
+    first = list(Mutator(corpus, 42).mutants(500))
+    assert first == list(Mutator(corpus, 42).mutants(500))
+    assert first != list(Mutator(corpus, 43).mutants(500))
+    assert any(m not in corpus for m in first)
+
+def test_stream_run_dedup():
+    from fuzzer.dedup import DedupIndex
+    # Containers without sections only differ by their trailing bytes
+    run = FuzzerRun(0x1234, inv_type=InvalidityType.EMPTY_SECTIONS | InvalidityType.INVALID_TRAILING_BYTES)
+    out = io.BytesIO()
+    stream_run(out, run, count=300)
+    lines = out.getvalue().splitlines()
+    dedup = DedupIndex()
+    out = io.BytesIO()
+    written = stream_run(out, run, count=300, dedup=dedup, jobs=2)
+    unique = list(dict.fromkeys(lines))
+    assert out.getvalue().splitlines() == unique
+    assert written == len(unique) < 300
+    assert dedup.duplicates == 300 - written
+
+def test_dedup_index(tmp_path):
+    from fuzzer.dedup import ENTRY_MEMORY, DedupIndex, open_dedup_index
+    from filler.hashing import keccak256
+    digests = [keccak256(i.to_bytes(4, 'big')) for i in range(1000)]
+    path = str(tmp_path / "dedup")
+    for max_memory in [1 << 20, 100 * ENTRY_MEMORY]:
+        index = DedupIndex(max_memory)
+        assert all(index.add(d) for d in digests[:500])
+        assert index.is_approximate() == (max_memory < 500 * ENTRY_MEMORY)
+        assert not any(index.add(d) for d in digests[:500])
+        index.save(path)
+        index = open_dedup_index(path, max_memory)
+        assert all(d in index for d in digests[:500])
+        assert sum(index.add(d) for d in digests[500:]) > 490
+
+def test_enumeration_shards():
+    from fuzzer.enumeration import SPACE_SIZE, shard_count, space_point
+    run = FuzzerRun(0x1234, enumeration=True)
+    full = io.BytesIO()
+    stream_run(full, run, count=300)
+    shards = []
+    for shard in range(3):
+        out = io.BytesIO()
+        sharded = FuzzerRun(0x1234, enumeration=True, shard=shard, shards=3)
+        # Resuming half way gives the same output
+        stream_run(out, sharded, count=50)
+        stream_run(out, sharded, count=50, start=50)
+        shards.append(out.getvalue().splitlines())
+    assert [l for i in range(100) for l in (s[i] for s in shards)] == full.getvalue().splitlines()
+    assert sum(shard_count(shard, 3) for shard in range(3)) == SPACE_SIZE
+    assert len(set(space_point(i) for i in range(SPACE_SIZE))) == SPACE_SIZE
+
+def test_enumeration_size_classes():
+    from eof.v1 import MAX_CODE_SIZE, validate
+    from fuzzer.enumeration import INVALIDITY_COMBINATIONS, enumerated_containers
+    sizes = [len(c) for c in enumerated_containers(1, 0, 16, shard=0, shards=INVALIDITY_COMBINATIONS)]
+    assert sizes[:2] == [10, 11]
+    assert sizes.count(MAX_CODE_SIZE) == 5
+    assert sizes.count(MAX_CODE_SIZE + 1) == 6
+    for c in enumerated_containers(1, 0, 2048, shard=1, shards=8):
+        validate(c.build(), c.inv_type)
+
+class InterruptedRun(FuzzerRun):
+    """
+    Run interrupted once it reaches position `stop_at`.
+    """
+    def __init__(self, stop_at: int, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stop_at = stop_at
+
+    def render(self, start: int, stop: int) -> bytes:
+        if start >= self.stop_at:
+            raise KeyboardInterrupt()
+        return super().render(start, stop)
+
+    def render_entries(self, start: int, stop: int):
+        if start >= self.stop_at:
+            raise KeyboardInterrupt()
+        return super().render_entries(start, stop)
+
+@pytest.mark.parametrize("output_format", ["hex", "corpus"])
+def test_stream_to_path_resume(tmp_path, output_format: str):
+    from corpus import CorpusReader
+    from fuzzer import segment_path, stream_to_path
+    from fuzzer.enumeration import Cursor
+    run = FuzzerRun(0x1234, code_size=8, data_size=4, inv_type=-1, output_format=output_format)
+    full = str(tmp_path / 'full')
+    stream_to_path(full, run, count=200)
+
+    path = str(tmp_path / 'out')
+    cursor = Cursor(str(tmp_path / 'cursor'))
+    with pytest.raises(KeyboardInterrupt):
+        stream_to_path(path, InterruptedRun(128, 0x1234, code_size=8, data_size=4, inv_type=-1, output_format=output_format), cursor=cursor, count=200)
+    if output_format == 'hex':
+        # Part of a chunk written after the saved position
+        with open(path, 'ab') as f:
+            f.write(b'ef00')
+    start = cursor.load()
+    assert start == 128
+    stream_to_path(path, run, cursor=cursor, start=start, resume=True, count=200 - start)
+    assert cursor.load() == 200
+
+    if output_format == 'hex':
+        with open(path, 'rb') as f, open(full, 'rb') as g:
+            assert f.read() == g.read()
+    else:
+        with CorpusReader(path) as first, CorpusReader(segment_path(path, 128)) as second, CorpusReader(full) as expected:
+            codes = [bytes(e.code) for e in first] + [bytes(e.code) for e in second]
+            assert codes == [bytes(e.code) for e in expected]
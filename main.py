@@ -6,6 +6,9 @@ import argparse
 
 def get_options(args=sys.argv[1:]):
     parser = argparse.ArgumentParser(description="EOF Utilities")
+    parser.add_argument("--metrics", help="File where per-stage timings and counters are written on exit, and periodically with --metrics-interval. Default=No metrics")
+    parser.add_argument("--metrics-format", help="Format of the metrics file. Default=json", choices=["json", "prometheus"], default="json")
+    parser.add_argument("--metrics-interval", help="Also write the metrics file every S seconds.", type=float)
     subparsers = parser.add_subparsers(dest="subcommand_name", required=True)
 
     fuzzer = subparsers.add_parser("fuzzer", help="Output a fuzzed EOF container with or without an initcode (EOF/Legacy). Optionally create a yml file with a \"ethereum/tests\" test.")
@@ -16,66 +19,120 @@ def get_options(args=sys.argv[1:]):
     fuzzer.add_argument("-i", "--initcode", help="Produce legacy initcode for the EOF container. Default=No", action='store_true')
     fuzzer.add_argument("--eof-initcode", help="Produce EOF initcode for the EOF container. Default=No", action='store_true')
     fuzzer.add_argument("-f", "--filler", help="Produce the test filler in yml format. Default=No", action='store_true')
+    fuzzer.add_argument("--filler-shard-size", help="When streaming fillers, pack N tests per yml file instead of one file per test.", type=int)
+    fuzzer.add_argument("--filler-dir", help="Directory of the packed filler files. Default=.", default=".")
+    fuzzer.add_argument("--filler-prefix", help="Prefix of the names of the packed filler files. Default=eofV1Fuzz_<seed>_[<shard>of<shards>_]<start>_, or eofV1Fuzz_<corpus name>_ with --input")
+    fuzzer.add_argument("--filler-overwrite", help="Replace existing packed filler files instead of failing. Default=No", action='store_true')
     fuzzer.add_argument("--create-method", help="Specify how the filler should create the contract (tx, create or create2). Default=tx", type=str, default='tx')
     fuzzer.add_argument("--invalidity-type", help="Produce an invalid EOF container. Use -1 to generate a random invalidity type. Default=0.", type=int)
+    fuzzer.add_argument("-n", "--count", help="Stream N containers, one per line, each one using a seed derived from the seed. Default=1", type=int)
+    fuzzer.add_argument("--duration", help="Stream containers, one per line, for S seconds. Can be combined with --count.", type=float)
+    fuzzer.add_argument("-o", "--output", help="Output file for streamed containers. Default=stdout")
+    fuzzer.add_argument("-j", "--jobs", help="Number of processes used to stream containers, 0 to use all cores. Output does not depend on it. Default=1", type=int, default=1)
+    fuzzer.add_argument("--format", help="Format of the streamed output: hex lines, or a binary corpus recording the seed and invalidity of every container. Default=hex", choices=["hex", "corpus"], default="hex")
+    fuzzer.add_argument("--compression", help="Block compression of the binary corpus. Default=none", choices=["zlib", "lzma"])
+    fuzzer.add_argument("--input", nargs="+", help="Binary corpora whose containers are used, in order, instead of generating new ones, e.g. to produce their fillers.")
+    fuzzer.add_argument("--enumerate", help="Stream every combination of invalidity types and code/data section size classes (0, 1, exact fit, overflow) in a fixed order, instead of random ones. Default=No", action='store_true')
+    fuzzer.add_argument("--rounds", help="Number of times the enumeration covers every combination, each time with different bytes. Default=1", type=int, default=1)
+    fuzzer.add_argument("--shard", help="Only stream the part K/N of the enumeration, so N workers can cover it. Default=0/1", default="0/1")
+    fuzzer.add_argument("--start", help="Position of the stream, or of the enumeration shard, to start from. Default=0, or the saved cursor", type=int)
+    fuzzer.add_argument("--cursor", help="File where the position of the stream is saved, and resumed from. A resumed run appends to the hex output, or writes a binary corpus to OUTPUT.<position>.")
+    fuzzer.add_argument("--dedup", help="Drop streamed containers identical to a previous one. Default=No", action='store_true')
+    fuzzer.add_argument("--dedup-index", help="File where the dedup index is loaded from and saved to, so duplicates are dropped across runs. Implies --dedup.")
+    fuzzer.add_argument("--dedup-memory", help="Memory used by the exact dedup index before it falls back to a Bloom filter, in MiB. Default=256", type=int, default=256)
+    fuzzer.add_argument("--code-mode", help="How code sections are filled: random bytes, well-formed instruction streams ending with a halting opcode, or instruction streams ending with a truncated PUSH. Default=random", choices=["random", "opcodes", "truncated-push"], default="random")
     ## TODO: Add invalidity types as arguments here too
 
-    compile = subparsers.add_parser("compile", help="Compile a YML file into an EOF container")
-    compile.add_argument("ymlfile", help="Source YML file.")
+    compile = subparsers.add_parser("compile", help="Compile a YML file into an EOF container, or a tree of them in batch")
+    compile.add_argument("ymlfile", nargs="+", help="Source YML file. Several files, directories or glob patterns compile every source in batch, writing each container as hex next to its source.")
+    compile.add_argument("-j", "--jobs", help="Number of processes used to compile in batch, 0 to use all cores. Default=1", type=int, default=1)
+    compile.add_argument("--manifest", help="File recording the hash and the code of every source compiled in batch, so unchanged sources are skipped on the next run.")
+    compile.add_argument("--bundle", help="Write the containers compiled in batch, in source order, to a binary corpus file instead of next to their sources.")
+    compile.add_argument("--compression", help="Block compression of the bundle. Default=none", choices=["zlib", "lzma"])
+    compile.add_argument("--force", help="Compile every source in batch, even if unchanged. Default=No", action='store_true')
+    compile.add_argument("--cache-stats", help="Print the compile cache statistics to stderr. Default=No", action='store_true')
+
+    parse = subparsers.add_parser("parse", help="Parse EOF V1 containers. Prints a single container, or streams one JSON verdict line per corpus entry.")
+    parse.add_argument("hex", nargs="?", help="Hex of a single container to parse and print.")
+    parse.add_argument("--input", nargs="+", help="Corpus files (or - for stdin) to validate in bulk.")
+    parse.add_argument("--format", help="Format of the corpus: newline-delimited hex, raw containers (one per file, directories are expanded) or binary corpus files. Default=hex", choices=["hex", "raw", "corpus"], default="hex")
+    parse.add_argument("-j", "--jobs", help="Number of processes used to parse the corpus, 0 to use all cores. Default=1", type=int, default=1)
+    parse.add_argument("-o", "--output", help="Output file for the verdicts. Default=stdout")
+    parse.add_argument("--write-corpus", help="Also write the entries, with their validity, to a binary corpus file.")
+    parse.add_argument("--compression", help="Block compression of the written corpus. Default=none", choices=["zlib", "lzma"])
+    parse.add_argument("--disassemble", help="Print the disassembly of the containers instead of their verdicts, as text or as one JSON line per instruction with its offset, opcode, name and PUSH immediate. Default=text for a single container", choices=["text", "json"])
+
+    mutate = subparsers.add_parser("mutate", help="Stream mutants of the containers in a corpus, one hex container per line.")
+    mutate.add_argument("--input", nargs="+", required=True, help="Corpus files (or - for stdin) to mutate.")
+    mutate.add_argument("--format", help="Format of the corpus: newline-delimited hex, raw containers (one per file, directories are expanded) or binary corpus files. Default=hex", choices=["hex", "raw", "corpus"], default="hex")
+    mutate.add_argument("-s", "--seed", help="Hex seed used to produce the mutants. Default=random")
+    mutate.add_argument("-n", "--count", help="Number of mutants to produce. Default=1", type=int, default=1)
+    mutate.add_argument("--max-stacked", help="Maximum number of mutations applied to each mutant. Default=4", type=int, default=4)
+    mutate.add_argument("-o", "--output", help="Output file for the mutants. Default=stdout")
+
+    differential = subparsers.add_parser("differential", help="Validate containers with local EOF validator executables, recording every disagreement with the reference parser.")
+    differential.add_argument("--validator", action="append", required=True, help="Validator command reading one hex container per line and printing one verdict per line, valid ones starting with OK (e.g. \"evm eofparse\"). Can be repeated.")
+    differential.add_argument("--input", nargs="+", help="Corpus files (or - for stdin) to validate. Default=generate containers")
+    differential.add_argument("--format", help="Format of the corpus: newline-delimited hex, raw containers (one per file, directories are expanded) or binary corpus files, whose recorded invalidity types are used. Default=hex", choices=["hex", "raw", "corpus"], default="hex")
+    differential.add_argument("-s", "--seed", help="Hex seed used to generate the containers. Default=random")
+    differential.add_argument("--codesize", help="Size of the random code section's data. Default=random([1,MAX_CODE_SIZE])", type=int)
+    differential.add_argument("--datasize", help="Size of the random data section's data. Default=random([1,MAX_CODE_SIZE])", type=int)
+    differential.add_argument("--invalidity-type", help="Invalidity type of the generated containers. Use -1 to generate a random invalidity type. Default=-1.", type=int, default=-1)
+    differential.add_argument("--code-mode", help="How code sections are filled: random bytes, well-formed instruction streams ending with a halting opcode, or instruction streams ending with a truncated PUSH. Default=random", choices=["random", "opcodes", "truncated-push"], default="random")
+    differential.add_argument("-n", "--count", help="Number of containers to generate. Default=unbounded", type=int)
+    differential.add_argument("--duration", help="Generate containers for S seconds. Can be combined with --count.", type=float)
+    differential.add_argument("-j", "--jobs", help="Number of processes of each validator, and of generator processes, 0 to use all cores. Default=1", type=int, default=1)
+    differential.add_argument("-o", "--output", help="Output file for the disagreements, one JSON line each. Default=stdout")
+
+    serve = subparsers.add_parser("serve", help="Serve fuzz, compile and parse requests, one JSON line each, from stdin or a Unix socket, keeping the modules and compiler workers loaded.")
+    serve.add_argument("--socket", help="Unix socket to listen on. Default=stdin/stdout")
+    serve.add_argument("-j", "--jobs", help="Number of requests handled concurrently. Default=number of cores", type=int)
 
     options = parser.parse_args(args)
     return options
 
+def parse_seed(seed):
+    if seed:
+        if not type(seed) is str:
+            raise Exception("invalid input")
+        if not seed.startswith("0x"):
+            seed = "0x" + seed
+        return int(seed, 16)
+    else:
+        from time import time
+        return int(time() * 1000000)
+
 def exec_fuzzer(opts):
-    import random
     # Check version requested
     if opts.version and opts.version != 1:
         raise Exception("Invalid version requested (only version 1 supported)")
 
     # Random seed will be used to try to replicate the same initcode twice
-    if opts.seed:
-        if not type(opts.seed) is str:
-            raise Exception("invalid input")
-        if not opts.seed.startswith("0x"):
-            opts.seed = "0x" + opts.seed
-        opts.seed = int(opts.seed, 16)
-    else:
-        from time import time
-        opts.seed = int(time() * 1000000)
-
-    current_seed = opts.seed
-    random.seed(current_seed)
+    opts.seed = parse_seed(opts.seed)
 
     if opts.version == 1:
-        from eof.v1 import generate_container, InvalidityType
+        from eof.v1 import generate_container, select_invalidity_type
     else:
         raise Exception("Invalid version")
 
-    if opts.invalidity_type is None:
-        opts.invalidity_type = 0
-    elif opts.invalidity_type == -1:
-        # Produce a container with random and multiple types of invalid characteristics
-        opts.invalidity_type = random.randint(1, InvalidityType.MAX_INVALIDITY - 1)
-    elif opts.invalidity_type == -2:
-        # Produce a container with a single random invalid characteristic
-        inv_types_count = len(bin(InvalidityType.MAX_INVALIDITY)[3:]) - 1
-        opts.invalidity_type = InvalidityType(2 ** random.randint(0, inv_types_count))
+    if opts.input is not None:
+        exec_fuzzer_corpus(opts)
+        return
+
+    if opts.count is not None or opts.duration is not None or opts.format == "corpus" or opts.dedup or opts.dedup_index or opts.enumerate:
+        if opts.count is None and opts.duration is None and not opts.enumerate:
+            opts.count = 1
+        exec_fuzzer_stream(opts)
+        return
 
-    opts.invalidity_type=InvalidityType(opts.invalidity_type)
+    opts.invalidity_type = select_invalidity_type(opts.seed, opts.invalidity_type)
 
-    c = generate_container(seed=opts.seed, code_size=opts.codesize, data_size=opts.datasize, inv_type=opts.invalidity_type)
+    c = generate_container(seed=opts.seed, code_size=opts.codesize, data_size=opts.datasize, inv_type=opts.invalidity_type, code_mode=opts.code_mode)
 
 
     if opts.filler:
         from filler import generate_filler
-        initcode_f = None
-        if opts.eof_initcode:
-            from eof.v1 import generate_legacy_initcode
-            initcode_f = generate_legacy_initcode
-        else:
-            from eof.v1 import generate_eof_container_initcode
-            initcode_f = generate_eof_container_initcode
-        print(generate_filler(c, initcode_f, opts.create_method))
+        print(generate_filler(c, get_initcode_generator(opts), opts.create_method))
     else:
         print("Generated EOF container: ", c.build().hex())
         if opts.initcode or opts.eof_initcode:
@@ -88,25 +145,213 @@ def exec_fuzzer(opts):
                 initcode = generate_legacy_initcode(c.build())
                 print("Generated EOF container legacy initcode: ", initcode.hex())
 
+def get_initcode_generator(opts):
+    if opts.eof_initcode:
+        from eof.v1 import generate_eof_container_initcode
+        return generate_eof_container_initcode
+    if opts.initcode or opts.filler:
+        from eof.v1 import generate_legacy_initcode
+        return generate_legacy_initcode
+    return None
+
+def exec_fuzzer_stream(opts):
+    from fuzzer import FuzzerRun, stream_to_path
+
+    from fuzzer.enumeration import Cursor, parse_shard, shard_count
+
+    shard, shards = parse_shard(opts.shard)
+    # The seed of every container is derived from the master seed, which is
+    # needed to reproduce them
+    print("Seed: 0x{:x}".format(opts.seed), file=sys.stderr)
+    run = FuzzerRun(opts.seed, code_size=opts.codesize, data_size=opts.datasize, inv_type=opts.invalidity_type, initcode_f=get_initcode_generator(opts), filler=opts.filler, create_method=opts.create_method, filler_shard_size=opts.filler_shard_size, output_format=opts.format, compression=opts.compression, enumeration=opts.enumerate, shard=shard, shards=shards, code_mode=opts.code_mode, filler_directory=opts.filler_dir, filler_prefix=opts.filler_prefix, filler_overwrite=opts.filler_overwrite)
+
+    cursor = Cursor(opts.cursor) if opts.cursor else None
+    start = opts.start
+    # Resuming from the cursor continues the output of the previous run
+    resume = False
+    if start is None:
+        start = cursor.load() if cursor is not None else 0
+        resume = start > 0
+    count = opts.count
+    if opts.enumerate:
+        remaining = max(0, shard_count(shard, shards, opts.rounds) - start)
+        count = remaining if count is None else min(count, remaining)
+
+    dedup = None
+    if opts.dedup or opts.dedup_index:
+        from fuzzer.dedup import open_dedup_index
+        dedup = open_dedup_index(opts.dedup_index, max_memory=opts.dedup_memory * 1024 * 1024)
+    stream_to_path(opts.output, run, cursor=cursor, start=start, resume=resume, count=count, duration=opts.duration, jobs=opts.jobs, dedup=dedup)
+    if dedup is not None:
+        if opts.dedup_index:
+            dedup.save(opts.dedup_index)
+        print("Dropped {} duplicate containers".format(dedup.duplicates), file=sys.stderr)
+
+def exec_fuzzer_corpus(opts):
+    from corpus import CorpusReader
+    from fuzzer import format_container, open_output
+
+    writer = None
+    if opts.filler and opts.filler_shard_size is not None:
+        from filler.writer import ShardedFillerWriter
+        import os
+        prefix = opts.filler_prefix
+        if prefix is None:
+            prefix = 'eofV1Fuzz_{}_'.format(os.path.splitext(os.path.basename(opts.input[0]))[0])
+        writer = ShardedFillerWriter(opts.filler_dir, prefix, opts.filler_shard_size, opts.filler_overwrite)
+    initcode_f = get_initcode_generator(opts)
+    try:
+        remaining = opts.count
+        with open_output(opts.output) as out:
+            for path in opts.input:
+                if remaining is not None and remaining <= 0:
+                    break
+                with CorpusReader(path) as reader:
+                    count = len(reader) if remaining is None else min(remaining, len(reader))
+                    for i in range(count):
+                        c = reader.entry(i)
+                        if writer is not None:
+                            from filler import build_filler, dump_filler
+                            writer.write(dump_filler(build_filler(c, initcode_f, opts.create_method)))
+                            out.write(c.get_name().encode() + b'\n')
+                        else:
+                            out.write(format_container(c, initcode_f, opts.filler, opts.create_method))
+                        c = None
+                if remaining is not None:
+                    remaining -= count
+    finally:
+        if writer is not None:
+            writer.close()
+
 def exec_compiler(opts):
+    import glob
+    import os
     import yaml
-    from yaml import Loader
     from eof import compile_from_dict
+    from metrics import stage
+
+    if len(opts.ymlfile) > 1 or opts.manifest or opts.bundle or os.path.isdir(opts.ymlfile[0]) or glob.has_magic(opts.ymlfile[0]):
+        exec_batch_compiler(opts)
+        return
 
     lines = None
-    with open(opts.ymlfile) as f:
+    with open(opts.ymlfile[0]) as f:
         lines = f.read().splitlines()
 
     if not lines:
         raise Exception("invalid input")
 
-    l = yaml.load('\n'.join(lines), Loader=Loader)
+    with stage('yaml.load', sum(len(line) + 1 for line in lines)):
+        # The libyaml parser is much faster, when available
+        l = yaml.load('\n'.join(lines), Loader=getattr(yaml, 'CLoader', yaml.Loader))
+
+    with stage('compile'):
+        c = compile_from_dict(l)
+    print('0x' + c.build().hex())
+
+    if opts.cache_stats:
+        from compilers.cache import get_cache
+        cache = get_cache()
+        if cache is not None:
+            print("Compile cache: " + ", ".join("{}={}".format(k, v) for k, v in cache.stats().items()), file=sys.stderr)
+
+def exec_batch_compiler(opts):
+    from eof.tree import compile_tree, print_summary
+    result = compile_tree(opts.ymlfile, jobs=opts.jobs, manifest_path=opts.manifest, bundle=opts.bundle, compression=opts.compression, force=opts.force)
+    print_summary(result)
+    if result.errors:
+        sys.exit(1)
+
+def read_input_entries(opts):
+    from triage import read_corpus_entries, read_hex_entries, read_raw_entries
+    if opts.format == "corpus":
+        if "-" in opts.input:
+            raise Exception("binary corpus cannot be read from stdin")
+        yield from read_corpus_entries(opts.input)
+        return
+    if opts.format == "raw":
+        if "-" in opts.input:
+            raise Exception("raw corpus cannot be read from stdin")
+        yield from read_raw_entries(opts.input)
+        return
+    for path in opts.input:
+        if path == "-":
+            yield from read_hex_entries(sys.stdin)
+        else:
+            with open(path) as f:
+                yield from read_hex_entries(f)
+
+def exec_parser(opts):
+    if opts.input is None:
+        if opts.hex is None:
+            return
+        import json
+        from eof.v1 import ContainerV1
+        c = ContainerV1.parse(opts.hex)
+        if opts.disassemble == "json":
+            lines = (json.dumps(d) for d in c.instructions())
+        else:
+            lines = c.lines()
+        for line in lines:
+            sys.stdout.write(line + '\n')
+        return
+
+    from fuzzer import open_output
+    from triage import stream_disassembly, stream_verdicts, write_corpus_entries
+    entries = read_input_entries(opts)
+    if opts.write_corpus is not None:
+        entries = write_corpus_entries(opts.write_corpus, opts.compression, entries)
+    with open_output(opts.output) as out:
+        if opts.disassemble is not None:
+            stream_disassembly(out, entries, opts.disassemble, jobs=opts.jobs)
+        else:
+            stream_verdicts(out, entries, jobs=opts.jobs)
+
+def exec_mutator(opts):
+    from fuzzer import open_output
+    from fuzzer.mutator import Mutator
 
-    print('0x' + compile_from_dict(l).build().hex())
+    opts.seed = parse_seed(opts.seed)
+    corpus = [bytes.fromhex(e[2:] if e.startswith("0x") else e) if type(e) is str else e for e, _ in read_input_entries(opts)]
+    m = Mutator(corpus, opts.seed, max_stacked=opts.max_stacked)
+    with open_output(opts.output) as out:
+        for _ in range(opts.count):
+            out.write(m.mutate().hex().encode() + b'\n')
+
+def exec_differential(opts):
+    from fuzzer import open_output
+    from triage.differential import generated_entries, run_differential
+
+    if opts.input is not None and opts.format == "corpus":
+        from triage.differential import corpus_entries
+        entries = corpus_entries(opts.input)
+    elif opts.input is not None:
+        entries = ((i, e.removeprefix("0x") if type(e) is str else e.hex(), None) for i, (e, _) in enumerate(read_input_entries(opts)))
+    else:
+        from fuzzer import FuzzerRun
+        opts.seed = parse_seed(opts.seed)
+        run = FuzzerRun(opts.seed, code_size=opts.codesize, data_size=opts.datasize, inv_type=opts.invalidity_type, code_mode=opts.code_mode)
+        entries = generated_entries(run, count=opts.count, duration=opts.duration, jobs=opts.jobs)
+    with open_output(opts.output) as out:
+        checked, found = run_differential(opts.validator, entries, out, jobs=opts.jobs)
+    print("Checked {} containers, {} disagreements".format(checked, found), file=sys.stderr)
 
 opts = get_options()
 
+if opts.metrics is not None:
+    import metrics
+    metrics.start_export(opts.metrics, opts.metrics_format, opts.metrics_interval)
+
 if opts.subcommand_name == "fuzzer":
     exec_fuzzer(opts)
 elif opts.subcommand_name == "compile":
-    exec_compiler(opts)
\ No newline at end of file
+    exec_compiler(opts)
+elif opts.subcommand_name == "parse":
+    exec_parser(opts)
+elif opts.subcommand_name == "mutate":
+    exec_mutator(opts)
+elif opts.subcommand_name == "differential":
+    exec_differential(opts)
+elif opts.subcommand_name == "serve":
+    from server import serve
+    serve(opts.socket, opts.jobs)
\ No newline at end of file
@@ -0,0 +1,283 @@
+import atexit
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+"""
+Per-stage timing and counters.
+
+Stages are timed with `stage` (or the `timed` decorator) and events are
+counted with `count`. Nothing is recorded until `enable` is called: while
+disabled, `stage` returns a shared no-op context manager, so instrumented
+code only pays for a function call and a global check.
+Metrics recorded in worker processes are merged into the parent process by
+`parallel.imap_ordered`.
+"""
+
+"""
+Upper bounds, in seconds, of the buckets of the wall time histograms.
+"""
+BUCKETS = [1e-6 * 4 ** i for i in range(14)]
+
+class StageStats(object):
+    count: int
+    wall: float
+    cpu: float
+    bytes: int
+    """
+    Number of calls in each bucket of `BUCKETS`, plus one for longer calls.
+    """
+    histogram: List[int]
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes = 0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def record(self, wall: float, cpu: float, nbytes: int):
+        self.count += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.bytes += nbytes
+        for i, bound in enumerate(BUCKETS):
+            if wall <= bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'wall_seconds': self.wall,
+            'cpu_seconds': self.cpu,
+            'bytes': self.bytes,
+            'histogram': list(self.histogram),
+        }
+
+    def merge(self, d: Dict[str, Any]):
+        self.count += d['count']
+        self.wall += d['wall_seconds']
+        self.cpu += d['cpu_seconds']
+        self.bytes += d['bytes']
+        for i, n in enumerate(d['histogram']):
+            self.histogram[i] += n
+
+class Registry(object):
+    stages: Dict[str, StageStats]
+    """
+    Count and bytes of every counted event.
+    """
+    counters: Dict[str, List[int]]
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, wall: float, cpu: float, nbytes: int=0):
+        with self._lock:
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = StageStats()
+            s.record(wall, cpu, nbytes)
+
+    def count(self, name: str, n: int=1, nbytes: int=0):
+        with self._lock:
+            c = self.counters.get(name)
+            if c is None:
+                c = self.counters[name] = [0, 0]
+            c[0] += n
+            c[1] += nbytes
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'stages': {name: s.to_dict() for name, s in self.stages.items()},
+                'counters': {name: {'count': c[0], 'bytes': c[1]} for name, c in self.counters.items()},
+            }
+
+    """
+    Returns the snapshot of the metrics and resets them.
+    """
+    def take(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {
+                'stages': {name: s.to_dict() for name, s in self.stages.items()},
+                'counters': {name: {'count': c[0], 'bytes': c[1]} for name, c in self.counters.items()},
+            }
+            self.stages = {}
+            self.counters = {}
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Any]):
+        with self._lock:
+            for name, d in snapshot['stages'].items():
+                s = self.stages.get(name)
+                if s is None:
+                    s = self.stages[name] = StageStats()
+                s.merge(d)
+            for name, d in snapshot['counters'].items():
+                c = self.counters.get(name)
+                if c is None:
+                    c = self.counters[name] = [0, 0]
+                c[0] += d['count']
+                c[1] += d['bytes']
+
+_registry: Optional[Registry] = None
+
+def enable():
+    global _registry
+    if _registry is None:
+        _registry = Registry()
+
+"""
+Disables the metrics, dropping those recorded so far.
+"""
+def disable():
+    global _registry
+    _registry = None
+
+def enabled() -> bool:
+    return _registry is not None
+
+def get_registry() -> Optional[Registry]:
+    return _registry
+
+class Stage(object):
+    __slots__ = ('name', 'nbytes', '_wall', '_cpu')
+    name: str
+    """
+    Bytes processed by the stage, which can be set before it ends.
+    """
+    nbytes: int
+
+    def __init__(self, name: str, nbytes: int=0):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *args):
+        registry = _registry
+        if registry is not None:
+            registry.record(self.name, time.perf_counter() - self._wall, time.thread_time() - self._cpu, self.nbytes)
+
+class NullStage(object):
+    __slots__ = ('nbytes',)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+NULL_STAGE = NullStage()
+
+"""
+Returns a context manager timing the stage `name`, which processes `nbytes`
+bytes.
+"""
+def stage(name: str, nbytes: int=0):
+    if _registry is None:
+        return NULL_STAGE
+    return Stage(name, nbytes)
+
+"""
+Decorator timing every call of the function as the stage `name`.
+"""
+def timed(name: str) -> Callable[[Callable], Callable]:
+    def decorator(f: Callable) -> Callable:
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if _registry is None:
+                return f(*args, **kwargs)
+            with Stage(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+"""
+Counts `n` events `name`, which processed `nbytes` bytes.
+"""
+def count(name: str, n: int=1, nbytes: int=0):
+    registry = _registry
+    if registry is not None:
+        registry.count(name, n, nbytes)
+
+"""
+Renders a snapshot in the Prometheus text exposition format.
+"""
+def to_prometheus(snapshot: Dict[str, Any], prefix: str='eoffuzzer') -> str:
+    lines = []
+    def metric(name: str, kind: str, help: str):
+        lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+        lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+    stages = sorted(snapshot['stages'].items())
+    metric('stage_wall_seconds', 'histogram', 'Wall time of each stage.')
+    for name, s in stages:
+        cumulative = 0
+        for bound, n in zip(BUCKETS + [float('inf')], s['histogram']):
+            cumulative += n
+            lines.append('{}_stage_wall_seconds_bucket{{stage="{}",le="{}"}} {}'.format(prefix, name, '+Inf' if bound == float('inf') else repr(bound), cumulative))
+        lines.append('{}_stage_wall_seconds_sum{{stage="{}"}} {}'.format(prefix, name, repr(s['wall_seconds'])))
+        lines.append('{}_stage_wall_seconds_count{{stage="{}"}} {}'.format(prefix, name, s['count']))
+    metric('stage_cpu_seconds_total', 'counter', 'CPU time of each stage.')
+    for name, s in stages:
+        lines.append('{}_stage_cpu_seconds_total{{stage="{}"}} {}'.format(prefix, name, repr(s['cpu_seconds'])))
+    metric('stage_bytes_total', 'counter', 'Bytes processed by each stage.')
+    for name, s in stages:
+        lines.append('{}_stage_bytes_total{{stage="{}"}} {}'.format(prefix, name, s['bytes']))
+    counters = sorted(snapshot['counters'].items())
+    metric('events_total', 'counter', 'Number of events.')
+    for name, c in counters:
+        lines.append('{}_events_total{{event="{}"}} {}'.format(prefix, name, c['count']))
+    metric('event_bytes_total', 'counter', 'Bytes of the events.')
+    for name, c in counters:
+        lines.append('{}_event_bytes_total{{event="{}"}} {}'.format(prefix, name, c['bytes']))
+    return '\n'.join(lines) + '\n'
+
+"""
+Writes the current metrics to `path`, atomically replacing it, in `json`
+or `prometheus` format.
+"""
+def export(path: str, format: str='json'):
+    if _registry is None:
+        return
+    snapshot = _registry.snapshot()
+    if format == 'prometheus':
+        data = to_prometheus(snapshot)
+    elif format == 'json':
+        data = json.dumps(snapshot, indent=1, sort_keys=True) + '\n'
+    else:
+        raise Exception("invalid metrics format: {}".format(format))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+"""
+Enables the metrics and exports them to `path` when the process exits and,
+if `interval` is set, every `interval` seconds from a background thread.
+"""
+def start_export(path: str, format: str='json', interval: Optional[float]=None):
+    enable()
+    atexit.register(export, path, format)
+    if interval:
+        def run():
+            while True:
+                time.sleep(interval)
+                export(path, format)
+        threading.Thread(target=run, name='metrics-export', daemon=True).start()
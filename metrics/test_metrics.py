@@ -0,0 +1,62 @@
+import json
+import metrics
+from metrics import NULL_STAGE, Registry, stage, timed
+
+def test_stage():
+    assert not metrics.enabled()
+    assert stage('disabled') is NULL_STAGE
+
+    @timed('double')
+    def double(x):
+        return 2 * x
+
+    metrics.enable()
+    try:
+        with stage('test', 10) as st:
+            st.nbytes += 5
+        with stage('test', 1):
+            pass
+        assert double(2) == 4
+        metrics.count('events', 3, nbytes=7)
+        snapshot = metrics.get_registry().snapshot()
+    finally:
+        metrics._registry = None
+
+    assert not metrics.enabled()
+    s = snapshot['stages']['test']
+    assert s['count'] == 2
+    assert s['bytes'] == 16
+    assert sum(s['histogram']) == 2
+    assert snapshot['stages']['double']['count'] == 1
+    assert snapshot['counters']['events'] == {'count': 3, 'bytes': 7}
+
+def test_merge_and_export(tmp_path):
+    worker = Registry()
+    worker.record('build', 2e-6, 1e-6, 100)
+    worker.record('build', 1.0, 0.5, 100)
+    worker.count('containers', 2)
+    snapshot = worker.take()
+    assert worker.snapshot() == {'stages': {}, 'counters': {}}
+
+    parent = Registry()
+    parent.record('build', 1e-3, 1e-3, 50)
+    parent.merge(snapshot)
+    merged = parent.snapshot()
+    assert merged['stages']['build']['count'] == 3
+    assert merged['stages']['build']['bytes'] == 250
+    assert merged['counters']['containers']['count'] == 2
+
+    text = metrics.to_prometheus(merged)
+    assert 'eoffuzzer_stage_wall_seconds_bucket{stage="build",le="+Inf"} 3' in text
+    assert 'eoffuzzer_stage_wall_seconds_count{stage="build"} 3' in text
+    assert 'eoffuzzer_stage_bytes_total{stage="build"} 250' in text
+    assert 'eoffuzzer_events_total{event="containers"} 2' in text
+
+    metrics._registry = parent
+    try:
+        path = str(tmp_path / 'metrics.json')
+        metrics.export(path)
+    finally:
+        metrics._registry = None
+    with open(path) as f:
+        assert json.load(f) == merged
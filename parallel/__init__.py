@@ -0,0 +1,70 @@
+import os
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator
+
+"""
+Number of tasks each worker can have in flight, which bounds the memory used
+by the results waiting to be consumed in order.
+"""
+TASKS_PER_JOB = 4
+
+"""
+Resolves the number of processes to use, `0` meaning all available cores.
+"""
+def resolve_jobs(jobs: int) -> int:
+    if jobs == 0:
+        return os.cpu_count() or 1
+    if jobs < 0:
+        raise Exception("invalid number of jobs: {}".format(jobs))
+    return jobs
+
+"""
+Calls `f(*a)` for every tuple `a` in `args` over `jobs` processes, yielding
+the results in the order of `args`.
+`args` is consumed lazily, so it can be unbounded.
+With a single job everything runs in the current process.
+When metrics are enabled, the ones recorded by the workers are merged into
+the current process along with every result.
+"""
+def imap_ordered(f: Callable[..., Any], args: Iterable[tuple], jobs: int=1) -> Iterator[Any]:
+    jobs = resolve_jobs(jobs)
+    if jobs == 1:
+        for a in args:
+            yield f(*a)
+        return
+
+    import metrics
+    from concurrent.futures import ProcessPoolExecutor
+    registry = metrics.get_registry()
+    if registry is None:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending = deque()
+            for a in args:
+                pending.append(pool.submit(f, *a))
+                if len(pending) >= jobs * TASKS_PER_JOB:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=metrics.enable) as pool:
+        pending = deque()
+        for a in args:
+            pending.append(pool.submit(_call_with_metrics, f, *a))
+            if len(pending) >= jobs * TASKS_PER_JOB:
+                result, snapshot = pending.popleft().result()
+                registry.merge(snapshot)
+                yield result
+        while pending:
+            result, snapshot = pending.popleft().result()
+            registry.merge(snapshot)
+            yield result
+
+"""
+Calls `f(*a)` in a worker, returning the result along with the metrics
+recorded since the previous call.
+"""
+def _call_with_metrics(f: Callable[..., Any], *a) -> tuple:
+    import metrics
+    result = f(*a)
+    return (result, metrics.get_registry().take())
@@ -0,0 +1,231 @@
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, IO, Optional
+
+"""
+Long-running server answering fuzz, compile and parse requests.
+
+Requests and responses are JSON lines, read from stdin or from the
+connections to a Unix socket:
+```
+{"id": 1, "method": "fuzz", "params": {"seed": "0x1234", "code_size": 10, "inv_type": 0}}
+{"id": 1, "result": {"code": "ef00...", "valid": true, ...}, "ms": 0.21}
+```
+Requests are handled concurrently, so responses can come in any order and
+carry the `id` of their request, along with the time taken to handle it in
+milliseconds. A failed request gets an `error` instead of a `result`.
+Modules, the compiler thread pool and the compile cache are loaded once, when
+the server starts.
+"""
+
+"""
+Parses a seed given as an integer or a hex string, or picks one from the
+current time.
+"""
+def request_seed(seed: Optional[Any]) -> int:
+    if seed is None:
+        return int(time.time() * 1000000)
+    if type(seed) is int:
+        return seed
+    if type(seed) is str:
+        return int(seed if seed.startswith("0x") else "0x" + seed, 16)
+    raise Exception("invalid seed: {!r}".format(seed))
+
+"""
+Generates a container.
+Params: `seed`, `code_size`, `data_size`, `inv_type` (`-1`/`-2` for a random
+one), `code_mode`, `initcode` (`legacy` or `eof`), `filler` and
+`create_method`. The filler test is returned instead of written.
+"""
+def handle_fuzz(params: Dict[str, Any]) -> Dict[str, Any]:
+    from eof.v1 import generate_container, generate_eof_container_initcode, generate_legacy_initcode, select_invalidity_type
+    seed = request_seed(params.get('seed'))
+    inv_type = select_invalidity_type(seed, params.get('inv_type'))
+    c = generate_container(seed=seed, code_size=params.get('code_size'), data_size=params.get('data_size'), inv_type=inv_type, code_mode=params.get('code_mode', 'random'))
+    code = c.build()
+    result = {
+        'seed': hex(seed),
+        'name': c.get_name(),
+        'valid': c.is_valid(),
+        'inv_type': int(inv_type),
+        'description': c.get_description(),
+        'code': code.hex(),
+    }
+    initcode = params.get('initcode')
+    initcode_f = None
+    if initcode == 'legacy' or (initcode is None and params.get('filler')):
+        initcode_f = generate_legacy_initcode
+    elif initcode == 'eof':
+        initcode_f = generate_eof_container_initcode
+    elif initcode is not None:
+        raise Exception("invalid initcode: {}".format(initcode))
+    if initcode_f is not None:
+        result['initcode'] = initcode_f(code).hex()
+    if params.get('filler'):
+        from filler import build_filler, dump_filler
+        result['filler'] = dump_filler(build_filler(c, initcode_f, params.get('create_method', 'tx')))
+    return result
+
+"""
+Compiles a container.
+Params: `yaml`, the source in the format of the `compile` subcommand, or
+`source`, the same source already as a dict.
+"""
+def handle_compile(params: Dict[str, Any]) -> Dict[str, Any]:
+    from eof import compile_from_dict
+    source = params.get('source')
+    if source is None:
+        import yaml
+        if not params.get('yaml'):
+            raise Exception("invalid input")
+        source = yaml.load(params['yaml'], Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+    return {'code': compile_from_dict(source).build().hex()}
+
+"""
+Parses a container.
+Params: `hex`, and `disassemble` (`text` or `json`) to also return the
+disassembly of a valid container.
+Returns the verdict of `triage.verdict`.
+"""
+def handle_parse(params: Dict[str, Any]) -> Dict[str, Any]:
+    from triage import verdict
+    entry = params.get('hex')
+    if type(entry) is not str:
+        raise Exception("invalid input")
+    v = verdict(0, entry)
+    del v['index']
+    disassemble = params.get('disassemble')
+    if disassemble is not None and v['valid']:
+        from eof.v1 import ContainerV1
+        c = ContainerV1.parse(entry)
+        if disassemble == 'json':
+            v['disassembly'] = list(c.instructions())
+        elif disassemble == 'text':
+            v['disassembly'] = '\n'.join(c.lines())
+        else:
+            raise Exception("invalid disassembly format: {}".format(disassemble))
+    return v
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'fuzz': handle_fuzz,
+    'compile': handle_compile,
+    'parse': handle_parse,
+}
+
+"""
+Handles a request line, returning the response line.
+"""
+def handle_line(line: str) -> str:
+    start = time.perf_counter()
+    response = {'id': None}
+    try:
+        request = json.loads(line)
+        if type(request) is not dict:
+            raise Exception("invalid request")
+        response['id'] = request.get('id')
+        handler = HANDLERS.get(request.get('method'))
+        if handler is None:
+            raise Exception("invalid method: {}".format(request.get('method')))
+        params = request.get('params') or {}
+        if type(params) is not dict:
+            raise Exception("invalid params")
+        response['result'] = handler(params)
+    except Exception as e:
+        response['error'] = str(e) or type(e).__name__
+    response['ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return json.dumps(response, separators=(',', ':'))
+
+"""
+Loads the modules and starts the compiler threads used by the handlers, so
+the first requests are not slower than the following ones.
+"""
+def warm_up():
+    import yaml
+    import eof.v1
+    import eof.v1.disasm
+    import filler
+    import triage
+    from compilers import get_executor
+    from compilers.cache import get_cache
+    get_executor()
+    get_cache()
+
+"""
+Number of requests of a stream that can be queued or running per worker,
+which bounds the memory used by a client sending requests faster than they
+are handled.
+"""
+PENDING_PER_WORKER = 4
+
+"""
+Serves the request lines of `rfile`, writing the response lines to `wfile`
+as requests complete.
+Returns once `rfile` is exhausted and every request has been answered.
+"""
+def serve_stream(rfile: IO[str], wfile: IO[str], executor: ThreadPoolExecutor, workers: int):
+    lock = threading.Lock()
+    max_pending = workers * PENDING_PER_WORKER
+    slots = threading.Semaphore(max_pending)
+
+    def respond(future):
+        try:
+            with lock:
+                wfile.write(future.result() + '\n')
+                wfile.flush()
+        except (BrokenPipeError, ConnectionError, ValueError):
+            # The client went away
+            pass
+        finally:
+            slots.release()
+
+    for line in rfile:
+        if not line.strip():
+            continue
+        slots.acquire()
+        executor.submit(handle_line, line).add_done_callback(respond)
+    for _ in range(max_pending):
+        slots.acquire()
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+"""
+Serves requests from stdin, or from the connections to the Unix socket at
+`socket_path`, handling up to `workers` requests concurrently.
+"""
+def serve(socket_path: Optional[str]=None, workers: Optional[int]=None):
+    warm_up()
+    workers = workers or os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='server')
+    try:
+        if socket_path is None:
+            serve_stream(sys.stdin, sys.stdout, executor, workers)
+            return
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                rfile = self.request.makefile('r', encoding='utf-8')
+                wfile = self.request.makefile('w', encoding='utf-8')
+                try:
+                    serve_stream(rfile, wfile, executor, workers)
+                finally:
+                    rfile.close()
+                    wfile.close()
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        # Exit through the cleanup below when terminated
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+        with _UnixServer(socket_path, Handler) as server:
+            try:
+                server.serve_forever()
+            finally:
+                os.unlink(socket_path)
+    finally:
+        executor.shutdown()
@@ -0,0 +1,46 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from server import handle_line, serve_stream
+
+def request(method, params=None, id=1):
+    return json.loads(handle_line(json.dumps({'id': id, 'method': method, 'params': params})))
+
+def test_handle_fuzz():
+    r = request('fuzz', {'seed': '0x1234', 'code_size': 4, 'data_size': 2, 'inv_type': 0, 'initcode': 'legacy'})
+    assert r['id'] == 1
+    assert r['ms'] >= 0
+    assert r['result']['valid']
+    assert r['result']['code'].startswith('ef0001010004020002')
+    assert r['result']['initcode'].endswith(r['result']['code'])
+    assert request('fuzz', {'seed': 0x1234, 'code_size': 4, 'data_size': 2, 'inv_type': 0})['result']['code'] == r['result']['code']
+    r = request('fuzz', {'seed': 7, 'inv_type': -1, 'filler': True})
+    assert not r['result']['valid']
+    assert r['result']['name'] in r['result']['filler']
+
+def test_handle_parse_and_compile():
+    r = request('parse', {'hex': 'ef0001010004020001006001f300aa', 'disassemble': 'json'})
+    assert r['result']['valid']
+    assert r['result']['sections'] == [[1, 4], [2, 1]]
+    assert [d['name'] for d in r['result']['disassembly']] == ['PUSH1', 'RETURN', 'STOP']
+    r = request('parse', {'hex': 'ef00'})
+    assert not r['result']['valid']
+    assert r['result']['offset'] == 2
+    r = request('compile', {'yaml': "sections:\n- code: ':raw 0x6001'\n"})
+    assert r['result']['code'] == 'ef0001010002006001'
+
+def test_handle_errors():
+    assert request('unknown')['error'] == "invalid method: unknown"
+    assert request('parse', {})['error'] == "invalid input"
+    r = json.loads(handle_line('not json'))
+    assert r['id'] is None
+    assert 'error' in r
+
+def test_serve_stream():
+    lines = [json.dumps({'id': i, 'method': 'parse', 'params': {'hex': 'ef0001010001000' + str(i % 8)}}) for i in range(50)]
+    out = io.StringIO()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        serve_stream(io.StringIO('\n'.join(lines) + '\n\n'), out, executor, 4)
+    responses = [json.loads(l) for l in out.getvalue().splitlines()]
+    assert sorted(r['id'] for r in responses) == list(range(50))
+    assert all(r['result']['valid'] for r in responses)
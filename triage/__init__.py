@@ -0,0 +1,179 @@
+import json
+import os
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
+
+"""
+Number of entries parsed by a single unit of work.
+"""
+CHUNK_SIZE = 256
+
+"""
+Produces the verdict of parsing a single corpus entry as an EOF V1
+container.
+`entry` is either the raw container or its hex representation.
+Invalid containers are described by the invalidity types found by
+`validate`, and the offset of the first error.
+"""
+def verdict(index: int, entry: Union[bytes, str], name: Optional[str]=None) -> dict:
+    from eof.v1 import ContainerV1, InvalidityType, validate
+    from metrics import stage
+    v = {"index": index}
+    if name is not None:
+        v["name"] = name
+    if type(entry) is str:
+        if entry.startswith("0x"):
+            entry = entry[2:]
+        try:
+            entry = bytes.fromhex(entry)
+        except ValueError:
+            v["valid"] = False
+            v["error"] = "invalid hex"
+            return v
+    v["size"] = len(entry)
+    # `validate` decides the validity, as for corpus entries, and locates the
+    # error, so only valid containers are parsed, to describe their sections
+    flags, offset = validate(entry)
+    if flags:
+        v["valid"] = False
+        v["error"] = "invalid container: {}".format(InvalidityType(flags).name)
+        v["offset"] = offset
+        return v
+    with stage('parse', len(entry)):
+        c = ContainerV1.parse(entry)
+    v["valid"] = True
+    v["sections"] = [[s.kind, len(s.data)] for s in c.sections]
+    return v
+
+"""
+Writes the entries, as they are iterated, to a binary corpus at `path`,
+recording the validity decided by `validate`, as in `verdict`. Entries with
+invalid hex are only passed through.
+"""
+def write_corpus_entries(path: str, compression: Optional[str], entries: Iterable[Tuple[Union[bytes, str], Optional[str]]]) -> Iterator[Tuple[Union[bytes, str], Optional[str]]]:
+    from corpus import CorpusWriter
+    from eof.v1 import validate
+    with open(path, 'wb') as f, CorpusWriter(f, compression=compression) as corpus:
+        for entry, name in entries:
+            try:
+                code = entry if type(entry) is not str else bytes.fromhex(entry.removeprefix("0x"))
+                corpus.write(code, valid=validate(code)[0] == 0)
+            except ValueError:
+                # Invalid hex, only reported in the verdicts
+                pass
+            yield (entry, name)
+
+"""
+Renders the verdicts of a chunk of `(index, entry, name)` tuples as JSON
+lines.
+"""
+def verdict_lines(chunk: List[Tuple[int, Union[bytes, str], Optional[str]]]) -> bytes:
+    return b''.join(json.dumps(verdict(*e), separators=(',', ':')).encode() + b'\n' for e in chunk)
+
+"""
+Renders the disassembly of a chunk of `(index, entry, name)` tuples, either
+as text, every container being preceded by a `# entry` line, or as one JSON
+line per instruction with the index of its entry.
+Entries that cannot be parsed are rendered as their verdict.
+"""
+def disassembly_lines(chunk: List[Tuple[int, Union[bytes, str], Optional[str]]], format: str='text') -> bytes:
+    from eof.v1 import ContainerV1
+    lines = []
+    for index, entry, name in chunk:
+        v = verdict(index, entry, name)
+        header = '# entry {}'.format(index) if name is None else '# entry {} {}'.format(index, name)
+        if not v["valid"]:
+            if format == 'json':
+                lines.append(json.dumps(v, separators=(',', ':')))
+            else:
+                lines.append('{}: {}'.format(header, v["error"]))
+            continue
+        c = ContainerV1.parse(entry)
+        if format == 'json':
+            lines.extend(json.dumps(d, separators=(',', ':')) for d in c.instructions(index=index))
+        else:
+            lines.append(header)
+            lines.extend(c.lines())
+    return ''.join(line + '\n' for line in lines).encode()
+
+"""
+Reads newline-delimited hex containers from `f`.
+Only the first word of each line is used, so the output of the fuzzer can be
+fed directly, and empty lines are skipped.
+"""
+def read_hex_entries(f: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+    for line in f:
+        words = line.split(maxsplit=1)
+        if words:
+            yield (words[0], None)
+
+"""
+Reads raw binary containers, one per file.
+Directories are expanded to the files they contain, in name order.
+"""
+def read_raw_entries(paths: Iterable[str]) -> Iterator[Tuple[bytes, Optional[str]]]:
+    for path in paths:
+        if os.path.isdir(path):
+            yield from read_raw_entries(os.path.join(path, p) for p in sorted(os.listdir(path)))
+        else:
+            with open(path, 'rb') as f:
+                yield (f.read(), path)
+
+"""
+Reads the containers of binary corpus files (see `corpus`).
+Containers generated by the fuzzer are named after their seed.
+"""
+def read_corpus_entries(paths: Iterable[str]) -> Iterator[Tuple[bytes, Optional[str]]]:
+    from corpus import CorpusReader
+    for path in paths:
+        with CorpusReader(path) as reader:
+            for e in reader:
+                entry = (bytes(e.code), e.get_name() if e.seed is not None else None)
+                # Views of the file must be released before the reader is
+                # closed
+                e = None
+                yield entry
+
+"""
+Groups `(entry, name)` pairs into numbered chunks.
+"""
+def chunk_entries(entries: Iterable[Tuple[Union[bytes, str], Optional[str]]], chunk_size: int=CHUNK_SIZE) -> Iterator[List[Tuple[int, Union[bytes, str], Optional[str]]]]:
+    chunk = []
+    for index, (entry, name) in enumerate(entries):
+        chunk.append((index, entry, name))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+"""
+Writes one JSON verdict line per entry to `out`, in input order, spreading
+the parsing over `jobs` processes.
+Entries are read lazily, so memory use does not depend on the input size.
+Returns the number of entries processed.
+"""
+def stream_verdicts(out: BinaryIO, entries: Iterable[Tuple[Union[bytes, str], Optional[str]]], jobs: int=1) -> int:
+    from parallel import imap_ordered
+    processed = 0
+    for lines in imap_ordered(verdict_lines, ((chunk,) for chunk in chunk_entries(entries)), jobs):
+        out.write(lines)
+        processed += lines.count(b'\n')
+    out.flush()
+    return processed
+
+"""
+Writes the disassembly of every entry to `out` (see `disassembly_lines`),
+in input order, spreading the work over `jobs` processes.
+Returns the number of entries processed.
+"""
+def stream_disassembly(out: BinaryIO, entries: Iterable[Tuple[Union[bytes, str], Optional[str]]], format: str='text', jobs: int=1) -> int:
+    from parallel import imap_ordered
+    processed = 0
+    for chunk, lines in imap_ordered(_disassemble_chunk, ((chunk, format) for chunk in chunk_entries(entries)), jobs):
+        out.write(lines)
+        processed += chunk
+    out.flush()
+    return processed
+
+def _disassemble_chunk(chunk: List[Tuple[int, Union[bytes, str], Optional[str]]], format: str) -> Tuple[int, bytes]:
+    return (len(chunk), disassembly_lines(chunk, format))
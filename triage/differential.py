@@ -0,0 +1,206 @@
+import json
+import queue
+import shlex
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import Popen, PIPE, DEVNULL
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+"""
+Differential testing of EOF validators.
+
+Validators are long-lived local processes which read one hex container per
+line on stdin and write one verdict line per container on stdout, in order,
+such as `evm eofparse`. Verdicts starting with `OK` (case insensitive) mean
+the container is valid; any other line means it is invalid.
+"""
+
+"""
+Number of containers sent to a validator process at once.
+"""
+BATCH_SIZE = 256
+
+"""
+Entry to validate: position in the run, hex of the container and, if the
+container was generated, its invalidity types.
+"""
+Entry = Tuple[int, str, Optional[int]]
+
+class ValidatorProcess(object):
+    command: List[str]
+
+    def __init__(self, command: List[str]):
+        self.command = command
+        self._process = Popen(command, stdin=PIPE, stdout=PIPE, stderr=DEVNULL, text=True, bufsize=1)
+
+    """
+    Sends a batch of hex containers and returns the verdict line of each one.
+    Input is written from another thread so a validator filling its output
+    pipe never blocks the batch.
+    """
+    def validate_batch(self, hex_lines: List[str]) -> List[str]:
+        def write():
+            try:
+                self._process.stdin.write(''.join(l + '\n' for l in hex_lines))
+                self._process.stdin.flush()
+            except BrokenPipeError:
+                pass
+        writer = threading.Thread(target=write, daemon=True)
+        writer.start()
+        verdicts = []
+        for _ in hex_lines:
+            line = self._process.stdout.readline()
+            if not line:
+                raise Exception("validator exited unexpectedly: {}".format(' '.join(self.command)))
+            verdicts.append(line.strip())
+        writer.join()
+        return verdicts
+
+    def close(self):
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._process.wait()
+
+class ValidatorPool(object):
+    """
+    Fixed set of processes of the same validator command, each used by one
+    batch at a time.
+    """
+    command: List[str]
+
+    def __init__(self, command: List[str], size: int):
+        self.command = command
+        self._processes = [ValidatorProcess(command) for _ in range(size)]
+        self._free = queue.Queue()
+        for p in self._processes:
+            self._free.put(p)
+
+    def validate_batch(self, hex_lines: List[str]) -> List[str]:
+        p = self._free.get()
+        try:
+            return p.validate_batch(hex_lines)
+        finally:
+            self._free.put(p)
+
+    def close(self):
+        for p in self._processes:
+            p.close()
+
+def is_valid_verdict(line: str) -> bool:
+    return line[:2].lower() == 'ok'
+
+"""
+Reference verdict of a container: it must pass `validate` and, if it was
+generated, have no invalidity types.
+"""
+def reference_verdict(hex_code: str, inv_type: Optional[int]=None) -> bool:
+    from eof.v1 import validate
+    if inv_type is not None and inv_type != 0:
+        return False
+    try:
+        code = bytes.fromhex(hex_code)
+    except ValueError:
+        return False
+    return validate(code)[0] == 0
+
+"""
+Validates a batch on every validator and returns the disagreements found.
+"""
+def check_batch(pools: List[ValidatorPool], batch: List[Entry]) -> List[Dict]:
+    hex_lines = [e[1] for e in batch]
+    results = [pool.validate_batch(hex_lines) for pool in pools]
+    disagreements = []
+    for i, (index, hex_code, inv_type) in enumerate(batch):
+        reference = reference_verdict(hex_code, inv_type)
+        verdicts = [r[i] for r in results]
+        if any(is_valid_verdict(v) != reference for v in verdicts):
+            disagreements.append({
+                "index": index,
+                "code": hex_code,
+                "invalidity_type": inv_type,
+                "reference": reference,
+                "verdicts": {' '.join(pool.command): v for pool, v in zip(pools, verdicts)},
+            })
+    return disagreements
+
+"""
+Groups entries into batches.
+"""
+def batch_entries(entries: Iterable[Entry], batch_size: int=BATCH_SIZE) -> Iterable[List[Entry]]:
+    batch = []
+    for e in entries:
+        batch.append(e)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+"""
+Runs the entries through every validator command, using `jobs` processes of
+each one, and writes each disagreement with the reference as a JSON line
+to `record`.
+Returns the number of entries checked and the number of disagreements.
+"""
+def run_differential(commands: List[str], entries: Iterable[Entry], record: BinaryIO, jobs: int=1) -> Tuple[int, int]:
+    from parallel import resolve_jobs
+    jobs = resolve_jobs(jobs)
+    pools = [ValidatorPool(shlex.split(c), jobs) for c in commands]
+    checked = 0
+    found = 0
+
+    def write(batch_size: int, disagreements: List[Dict]):
+        nonlocal checked, found
+        checked += batch_size
+        found += len(disagreements)
+        for d in disagreements:
+            record.write(json.dumps(d, separators=(',', ':')).encode() + b'\n')
+        if disagreements:
+            record.flush()
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = deque()
+            for batch in batch_entries(entries):
+                pending.append((len(batch), executor.submit(check_batch, pools, batch)))
+                if len(pending) >= 2 * jobs:
+                    n, f = pending.popleft()
+                    write(n, f.result())
+            while pending:
+                n, f = pending.popleft()
+                write(n, f.result())
+    finally:
+        for pool in pools:
+            pool.close()
+    return (checked, found)
+
+def _generate_entries(run, start: int, stop: int) -> List[Entry]:
+    return [(i, c.build().hex(), int(c.inv_type)) for i, c in zip(range(start, stop), run.containers(start, stop))]
+
+"""
+Generates the entries of a fuzzer run over `jobs` processes.
+"""
+def generated_entries(run, count: Optional[int]=None, duration: Optional[float]=None, jobs: int=1) -> Iterable[Entry]:
+    from fuzzer import chunk_ranges, limit_duration
+    from parallel import imap_ordered
+    chunks = limit_duration(chunk_ranges(count), duration)
+    for entries in imap_ordered(_generate_entries, ((run, start, stop) for start, stop in chunks), jobs):
+        yield from entries
+
+"""
+Reads the entries of binary corpus files (see `corpus`), with the invalidity
+types recorded for them.
+"""
+def corpus_entries(paths: Iterable[str]) -> Iterable[Entry]:
+    from corpus import CorpusReader
+    index = 0
+    for path in paths:
+        with CorpusReader(path) as reader:
+            for e in reader:
+                entry = (index, e.code.hex(), e.inv_type)
+                e = None
+                index += 1
+                yield entry
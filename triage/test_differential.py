@@ -0,0 +1,29 @@
+import io
+import json
+import sys
+from fuzzer import FuzzerRun
+from triage.differential import generated_entries, run_differential
+
+# Stand-in validator which accepts every container
+ACCEPT_ALL = '{} -c "import sys\nfor l in sys.stdin: print(\'OK\', flush=True)"'.format(sys.executable)
+
+def test_differential_records_disagreements():
+    run = FuzzerRun(0x1234, inv_type=-1)
+    entries = list(generated_entries(run, count=20))
+    record = io.BytesIO()
+    checked, found = run_differential([ACCEPT_ALL], entries, record, jobs=2)
+    assert checked == 20
+    disagreements = [json.loads(l) for l in record.getvalue().splitlines()]
+    assert found == len(disagreements)
+    assert [d["index"] for d in disagreements] == [e[0] for e in entries if e[2] != 0]
+    for d in disagreements:
+        assert d["reference"] is False
+        assert list(d["verdicts"].values()) == ["OK"]
+
+def test_generated_entries_follow_run():
+    for run in [FuzzerRun(0x1234, inv_type=-1, code_mode='opcodes'), FuzzerRun(0x1234, enumeration=True, shard=1, shards=3)]:
+        entries = list(generated_entries(run, count=70, jobs=2))
+        assert [(e[1], e[2]) for e in entries] == [(c.build().hex(), int(c.inv_type)) for c in run.containers(0, 70)]
+    opcodes = [e[1] for e in generated_entries(FuzzerRun(0x1234, inv_type=0, code_mode='opcodes'), count=10)]
+    random = [e[1] for e in generated_entries(FuzzerRun(0x1234, inv_type=0), count=10)]
+    assert opcodes != random
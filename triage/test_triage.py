@@ -0,0 +1,24 @@
+from corpus import CorpusReader
+from eof.v1 import ContainerV1, InvalidityType, generate_container
+from fuzzer.mutator import Mutator
+from triage import verdict, write_corpus_entries
+
+def test_corpus_validity_matches_verdicts(tmp_path):
+    corpus = [generate_container(seed=seed, code_size=16, data_size=8, inv_type=InvalidityType(0)).build() for seed in range(8)]
+    # Unknown section kind, accepted by the parser
+    entries = [('ef000103000100fe', None)] + [(m.hex(), None) for m in Mutator(corpus, 1).mutants(2000)]
+    path = str(tmp_path / 'corpus.eofc')
+    verdicts = [verdict(i, e)['valid'] for i, (e, _) in enumerate(write_corpus_entries(path, None, entries))]
+    assert verdicts[0] is False
+    assert any(verdicts)
+    with CorpusReader(path) as reader:
+        assert [e.valid for e in reader] == verdicts
+
+def test_verdict_only_parses_valid_containers(monkeypatch):
+    parsed = []
+    parse = ContainerV1.parse
+    monkeypatch.setattr(ContainerV1, 'parse', lambda code: parsed.append(code) or parse(code))
+    assert verdict(0, 'ef000101000100fe') == {"index": 0, "size": 8, "valid": True, "sections": [[1, 1]]}
+    assert verdict(1, 'ef000201000100fe') == {"index": 1, "size": 8, "valid": False, "error": "invalid container: INVALID_VERSION", "offset": 2}
+    assert verdict(2, 'ef00') == {"index": 2, "size": 2, "valid": False, "error": "invalid container: INVALID_VERSION", "offset": 2}
+    assert parsed == [bytes.fromhex('ef000101000100fe')]